@@ -0,0 +1,269 @@
+# Core/cache.py
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from urllib.parse import urlparse, unquote, parse_qsl
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+# Esquemas aceitos em CACHE_URL e o backend do Django correspondente
+BACKENDS = {
+    "sqlite": "Core.cache.SQLiteCache",
+    "locmem": "django.core.cache.backends.locmem.LocMemCache",
+    "file": "django.core.cache.backends.filebased.FileBasedCache",
+    "redis": "django.core.cache.backends.redis.RedisCache",
+    "rediss": "django.core.cache.backends.redis.RedisCache",
+    "memcached": "django.core.cache.backends.memcached.PyMemcacheCache",
+}
+
+
+def _opcao(valor):
+    return int(valor) if valor.isdigit() else valor
+
+
+def config_cache(url, timeout=300):
+    """
+    Converte uma CACHE_URL no dicionário esperado por settings.CACHES.
+
+    Exemplos: sqlite:////var/cache/loja.sqlite3, file:///var/cache/loja,
+    redis://localhost:6379/0, memcached://localhost:11211, locmem://
+    """
+    partes = urlparse(url)
+
+    if partes.scheme not in BACKENDS:
+        raise ValueError(f"Esquema de cache não suportado: '{partes.scheme}'")
+
+    if partes.scheme == "file":
+        location = unquote(partes.path)
+    elif partes.scheme == "sqlite":
+        # Mesma convenção da DATABASE_URL: sqlite:////caminho/absoluto
+        location = unquote(partes.path[1:])
+    elif partes.scheme in ("redis", "rediss"):
+        location = partes._replace(query="").geturl()
+    else:
+        location = partes.netloc
+
+    return {
+        "BACKEND": BACKENDS[partes.scheme],
+        "LOCATION": location,
+        "TIMEOUT": timeout,
+        # Parâmetros da query string (ex: ?MAX_ENTRIES=5000) viram OPTIONS
+        "OPTIONS": {chave: _opcao(valor) for chave, valor in parse_qsl(partes.query)},
+    }
+
+
+class SQLiteCache(BaseCache):
+    """
+    Cache compartilhado entre os processos do gunicorn sem serviço externo:
+    um arquivo SQLite em modo WAL. Inteiros são gravados como INTEGER para
+    que incr() seja um único UPDATE atômico (contadores de versão); os
+    demais valores vão em pickle. O tamanho é limitado por MAX_ENTRIES,
+    descartando primeiro as entradas expiradas e depois as menos acessadas.
+    """
+
+    pickle_protocol = pickle.HIGHEST_PROTOCOL
+
+    # Só regrava o horário de acesso (LRU) se o último tiver mais de N segundos,
+    # para uma leitura não virar uma escrita toda vez.
+    RESOLUCAO_ACESSO = 30
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        self._caminho = location
+        self._local = threading.local()
+        self._escritas = 0
+        # Com poucas entradas o limite é verificado a cada escrita; com muitas,
+        # a cada ~1% de MAX_ENTRIES escritas (o limite é aproximado).
+        self._intervalo_cull = max(1, min(100, self._max_entries // 100))
+
+    def _conexao(self):
+        # Uma conexão por thread e por processo: depois do fork do gunicorn
+        # cada worker abre a sua.
+        conexao = getattr(self._local, "conexao", None)
+        if conexao is not None and self._local.pid == os.getpid():
+            return conexao
+
+        diretorio = os.path.dirname(self._caminho)
+        if diretorio:
+            os.makedirs(diretorio, exist_ok=True)
+
+        conexao = sqlite3.connect(self._caminho, timeout=20, isolation_level=None)
+        conexao.execute("PRAGMA journal_mode=WAL")
+        conexao.execute("PRAGMA synchronous=NORMAL")
+        conexao.execute(
+            "CREATE TABLE IF NOT EXISTS cache ("
+            "chave TEXT PRIMARY KEY, valor BLOB, expira REAL, acesso REAL NOT NULL)"
+        )
+        conexao.execute("CREATE INDEX IF NOT EXISTS cache_acesso ON cache (acesso)")
+        conexao.execute("CREATE INDEX IF NOT EXISTS cache_expira ON cache (expira)")
+
+        self._local.conexao = conexao
+        self._local.pid = os.getpid()
+        return conexao
+
+    def _serializar(self, value):
+        if type(value) is int:
+            return value
+        return pickle.dumps(value, self.pickle_protocol)
+
+    def _desserializar(self, valor):
+        if isinstance(valor, int):
+            return valor
+        return pickle.loads(valor)
+
+    def _expira(self, timeout):
+        return self.get_backend_timeout(timeout)
+
+    def _gravar(self, sql, parametros):
+        cursor = self._conexao().execute(sql, parametros)
+        self._escritas += 1
+        if self._escritas % self._intervalo_cull == 0:
+            self._cull()
+        return cursor
+
+    def _cull(self):
+        conexao = self._conexao()
+        conexao.execute("DELETE FROM cache WHERE expira <= ?", (time.time(),))
+        (total,) = conexao.execute("SELECT COUNT(*) FROM cache").fetchone()
+        if total > self._max_entries:
+            excedente = total - self._max_entries
+            if self._cull_frequency:
+                excedente = max(excedente, total // self._cull_frequency)
+            conexao.execute(
+                "DELETE FROM cache WHERE chave IN "
+                "(SELECT chave FROM cache ORDER BY acesso LIMIT ?)",
+                (excedente,),
+            )
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        agora = time.time()
+        cursor = self._gravar(
+            "INSERT INTO cache (chave, valor, expira, acesso) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT (chave) DO UPDATE SET valor = excluded.valor, "
+            "expira = excluded.expira, acesso = excluded.acesso "
+            "WHERE cache.expira <= excluded.acesso",
+            (key, self._serializar(value), self._expira(timeout), agora),
+        )
+        return cursor.rowcount > 0
+
+    def get(self, key, default=None, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        conexao = self._conexao()
+        agora = time.time()
+        linha = conexao.execute(
+            "SELECT valor, acesso FROM cache "
+            "WHERE chave = ? AND (expira IS NULL OR expira > ?)",
+            (key, agora),
+        ).fetchone()
+        if linha is None:
+            return default
+
+        valor, acesso = linha
+        if agora - acesso > self.RESOLUCAO_ACESSO:
+            conexao.execute("UPDATE cache SET acesso = ? WHERE chave = ?", (agora, key))
+        return self._desserializar(valor)
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        self._gravar(
+            "INSERT OR REPLACE INTO cache (chave, valor, expira, acesso) "
+            "VALUES (?, ?, ?, ?)",
+            (key, self._serializar(value), self._expira(timeout), time.time()),
+        )
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        agora = time.time()
+        cursor = self._conexao().execute(
+            "UPDATE cache SET expira = ?, acesso = ? "
+            "WHERE chave = ? AND (expira IS NULL OR expira > ?)",
+            (self._expira(timeout), agora, key, agora),
+        )
+        return cursor.rowcount > 0
+
+    def delete(self, key, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        cursor = self._conexao().execute("DELETE FROM cache WHERE chave = ?", (key,))
+        return cursor.rowcount > 0
+
+    def has_key(self, key, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        linha = (
+            self._conexao()
+            .execute(
+                "SELECT 1 FROM cache WHERE chave = ? AND (expira IS NULL OR expira > ?)",
+                (key, time.time()),
+            )
+            .fetchone()
+        )
+        return linha is not None
+
+    def incr(self, key, delta=1, version=None):
+        chave = self.make_and_validate_key(key, version=version)
+        linha = (
+            self._conexao()
+            .execute(
+                "UPDATE cache SET valor = valor + ? "
+                "WHERE chave = ? AND typeof(valor) = 'integer' "
+                "AND (expira IS NULL OR expira > ?) RETURNING valor",
+                (delta, chave, time.time()),
+            )
+            .fetchone()
+        )
+        if linha is None:
+            raise ValueError("Key '%s' not found" % key)
+        return linha[0]
+
+    def get_many(self, keys, version=None):
+        chaves = {self.make_and_validate_key(key, version=version): key for key in keys}
+        if not chaves:
+            return {}
+
+        marcadores = ", ".join("?" * len(chaves))
+        linhas = self._conexao().execute(
+            f"SELECT chave, valor FROM cache WHERE chave IN ({marcadores}) "
+            "AND (expira IS NULL OR expira > ?)",
+            (*chaves, time.time()),
+        )
+        return {chaves[chave]: self._desserializar(valor) for chave, valor in linhas}
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        agora = time.time()
+        expira = self._expira(timeout)
+        linhas = [
+            (
+                self.make_and_validate_key(key, version=version),
+                self._serializar(value),
+                expira,
+                agora,
+            )
+            for key, value in data.items()
+        ]
+        conexao = self._conexao()
+        conexao.execute("BEGIN IMMEDIATE")
+        try:
+            conexao.executemany(
+                "INSERT OR REPLACE INTO cache (chave, valor, expira, acesso) "
+                "VALUES (?, ?, ?, ?)",
+                linhas,
+            )
+            conexao.execute("COMMIT")
+        except Exception:
+            conexao.execute("ROLLBACK")
+            raise
+        self._cull()
+        return []
+
+    def delete_many(self, keys, version=None):
+        chaves = [self.make_and_validate_key(key, version=version) for key in keys]
+        if chaves:
+            marcadores = ", ".join("?" * len(chaves))
+            self._conexao().execute(
+                f"DELETE FROM cache WHERE chave IN ({marcadores})", chaves
+            )
+
+    def clear(self):
+        self._conexao().execute("DELETE FROM cache")
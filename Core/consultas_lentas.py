@@ -0,0 +1,167 @@
+# Core/consultas_lentas.py
+#
+# Registro de queries lentas e repetidas. Chamado pela instrumentação para
+# cada query de uma requisição: guarda as que passam de SLOW_QUERY_MS e as
+# que se repetem SLOW_QUERY_REPEAT vezes ou mais na mesma requisição (o
+# sintoma de N+1, como buscar o produto de cada item do carrinho). Cada
+# entrada é agregada pela forma normalizada do SQL, pela view e pela linha
+# do projeto que disparou a query. O relatório sai com
+# "python manage.py consultas_lentas".
+
+import os
+import re
+import sys
+import threading
+import time
+from pathlib import Path
+
+from django.conf import settings
+
+from Core.metricas import gravar_json, ler_json
+
+_RAIZ = str(Path(__file__).resolve().parent.parent) + os.sep
+# Frames que nunca são a origem de uma query: a própria instrumentação
+_IGNORAR = tuple(
+    str(Path(__file__).resolve().parent / nome)
+    for nome in ("consultas_lentas.py", "instrumentacao.py")
+)
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMERO = re.compile(r"\b\d+(?:\.\d+)?\b")
+_LISTA = re.compile(r"\((?:\s*(?:%s|\?)\s*,)+\s*(?:%s|\?)\s*\)")
+_ESPACOS = re.compile(r"\s+")
+
+_lock = threading.Lock()
+_registro = None
+
+
+def normalizar(sql):
+    """Forma da query sem valores: literais viram ? e listas do IN viram (...)."""
+    forma = _STRING.sub("?", sql)
+    forma = _NUMERO.sub("?", forma)
+    forma = _LISTA.sub("(...)", forma)
+    return _ESPACOS.sub(" ", forma).strip()
+
+
+def origem():
+    """Primeira linha de código do projeto (fora de bibliotecas) na pilha."""
+    frame = sys._getframe(1)
+    while frame is not None:
+        arquivo = frame.f_code.co_filename
+        if (
+            arquivo.startswith(_RAIZ)
+            and not arquivo.startswith(_IGNORAR)
+            and "site-packages" not in arquivo
+        ):
+            relativo = arquivo[len(_RAIZ) :]
+            return f"{relativo}:{frame.f_lineno} em {frame.f_code.co_name}"
+        frame = frame.f_back
+    return "desconhecida"
+
+
+class _Registro:
+    def __init__(self):
+        self.pid = os.getpid()
+        self.entradas = {}
+        self.ultima_gravacao = time.monotonic()
+
+
+def _diretorio():
+    return Path(getattr(settings, "METRICS_DIR", ".cache/metricas")) / "consultas"
+
+
+def _atual():
+    global _registro
+    if _registro is None or _registro.pid != os.getpid():
+        _registro = _Registro()
+    return _registro
+
+
+def registrar(medicoes, sql, duracao):
+    forma = normalizar(sql)
+    # [execuções na requisição, tempo, execuções já registradas, tempo registrado]
+    contagem = medicoes.formas.setdefault(forma, [0, 0.0, 0, 0.0])
+    contagem[0] += 1
+    contagem[1] += duracao
+    vezes = contagem[0]
+
+    limite_repeticoes = getattr(settings, "SLOW_QUERY_REPEAT", 10)
+    lenta = duracao * 1000 >= getattr(settings, "SLOW_QUERY_MS", 100)
+    if vezes >= limite_repeticoes:
+        # Ao atingir o limite entram também as execuções anteriores desta
+        # requisição, que até então não tinham sido registradas.
+        execucoes, tempo_registrado = (
+            contagem[0] - contagem[2],
+            contagem[1] - contagem[3],
+        )
+    elif lenta:
+        execucoes, tempo_registrado = 1, duracao
+    else:
+        return
+    contagem[2] += execucoes
+    contagem[3] += tempo_registrado
+
+    chave = (forma, medicoes.view(), origem())
+    with _lock:
+        registro = _atual()
+        entrada = registro.entradas.get(chave)
+        if entrada is None:
+            entrada = registro.entradas[chave] = {
+                "execucoes": 0,
+                "lentas": 0,
+                "tempo_total": 0.0,
+                "tempo_max": 0.0,
+                "max_por_requisicao": 0,
+                "exemplo": sql[:1000],
+            }
+        entrada["execucoes"] += execucoes
+        entrada["lentas"] += int(lenta)
+        entrada["tempo_total"] += tempo_registrado
+        entrada["tempo_max"] = max(entrada["tempo_max"], duracao)
+        entrada["max_por_requisicao"] = max(entrada["max_por_requisicao"], vezes)
+        intervalo = getattr(settings, "METRICS_FLUSH_SECONDS", 1)
+        gravar_agora = time.monotonic() - registro.ultima_gravacao >= intervalo
+
+    if gravar_agora:
+        gravar()
+
+
+def gravar():
+    with _lock:
+        registro = _atual()
+        dados = [
+            {"forma": forma, "view": view, "origem": local, **entrada}
+            for (forma, view, local), entrada in registro.entradas.items()
+        ]
+        registro.ultima_gravacao = time.monotonic()
+    gravar_json(_diretorio() / f"{registro.pid}.json", dados)
+
+
+def relatorio():
+    """Entradas de todos os workers somadas, da que mais custou à que menos."""
+    if _registro is not None and _registro.entradas:
+        gravar()
+    entradas = {}
+    for arquivo in _diretorio().glob("*.json"):
+        for dados in ler_json(arquivo) or []:
+            chave = (dados["forma"], dados["view"], dados["origem"])
+            entrada = entradas.get(chave)
+            if entrada is None:
+                entradas[chave] = dict(dados)
+                continue
+            entrada["execucoes"] += dados["execucoes"]
+            entrada["lentas"] += dados["lentas"]
+            entrada["tempo_total"] += dados["tempo_total"]
+            entrada["tempo_max"] = max(entrada["tempo_max"], dados["tempo_max"])
+            entrada["max_por_requisicao"] = max(
+                entrada["max_por_requisicao"], dados["max_por_requisicao"]
+            )
+    return sorted(entradas.values(), key=lambda e: e["tempo_total"], reverse=True)
+
+
+def limpar():
+    global _registro
+    with _lock:
+        _registro = None
+    for arquivo in _diretorio().glob("*.json"):
+        arquivo.unlink(missing_ok=True)
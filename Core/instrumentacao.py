@@ -0,0 +1,157 @@
+# Core/instrumentacao.py
+#
+# Instrumentação por requisição: tempo total, número e tempo das queries,
+# tempo de renderização dos templates e tempo das chamadas ao Mercado Pago.
+# Os números saem no cabeçalho Server-Timing (aba Network do navegador) e
+# as requisições que estouram PERF_BUDGET_MS ou PERF_BUDGET_QUERIES vão
+# para o log "Core.instrumentacao". O custo é uma soma por query/template,
+# então pode ficar ligado em produção.
+
+import contextvars
+import logging
+import time
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.db import connections
+from django.template.backends.django import DjangoTemplates, Template
+
+from Core import consultas_lentas, metricas
+
+logger = logging.getLogger(__name__)
+
+_medicoes = contextvars.ContextVar("medicoes", default=None)
+
+
+class Medicoes:
+    def __init__(self, request=None):
+        self.request = request
+        self.inicio = time.perf_counter()
+        self.fim = None
+        self.sql_queries = 0
+        self.sql_tempo = 0.0
+        self.template_tempo = 0.0
+        self.mp_chamadas = 0
+        self.mp_tempo = 0.0
+        # Execuções por forma de SQL, para detectar N+1 (Core.consultas_lentas)
+        self.formas = {}
+
+    def view(self):
+        match = getattr(self.request, "resolver_match", None)
+        return (match.view_name if match else None) or "nao_resolvida"
+
+    @property
+    def total(self):
+        return (self.fim or time.perf_counter()) - self.inicio
+
+    def server_timing(self):
+        return ", ".join(
+            [
+                f"total;dur={self.total * 1000:.1f}",
+                f'db;dur={self.sql_tempo * 1000:.1f};desc="{self.sql_queries} queries"',
+                f"tpl;dur={self.template_tempo * 1000:.1f}",
+                f'mp;dur={self.mp_tempo * 1000:.1f};desc="{self.mp_chamadas} chamadas"',
+            ]
+        )
+
+
+def medicoes_atuais():
+    """Medições da requisição em andamento (None fora do middleware)."""
+    return _medicoes.get()
+
+
+@contextmanager
+def medir_mercado_pago():
+    medicoes = _medicoes.get()
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        duracao = time.perf_counter() - inicio
+        metricas.observar("loja_mercadopago_duracao_segundos", duracao)
+        if medicoes is not None:
+            medicoes.mp_chamadas += 1
+            medicoes.mp_tempo += duracao
+
+
+def _medir_sql(execute, sql, params, many, context):
+    medicoes = _medicoes.get()
+    if medicoes is None:
+        return execute(sql, params, many, context)
+
+    inicio = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        duracao = time.perf_counter() - inicio
+        medicoes.sql_queries += 1
+        medicoes.sql_tempo += duracao
+        consultas_lentas.registrar(medicoes, sql, duracao)
+
+
+class _TemplateMedido(Template):
+    def render(self, context=None, request=None):
+        medicoes = _medicoes.get()
+        if medicoes is None:
+            return super().render(context, request)
+
+        inicio = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            medicoes.template_tempo += time.perf_counter() - inicio
+
+
+class DjangoTemplatesMedidos(DjangoTemplates):
+    """
+    Backend de templates do Django que soma o tempo de render() nas
+    medições da requisição. Só o template de nível mais alto é medido, então
+    includes e extends não são contados duas vezes.
+    """
+
+    def from_string(self, template_code):
+        return _TemplateMedido(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        return _TemplateMedido(super().get_template(template_name).template, self)
+
+
+class InstrumentacaoMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        medicoes = Medicoes(request)
+        token = _medicoes.set(medicoes)
+        try:
+            with ExitStack() as pilha:
+                for conexao in connections.all():
+                    pilha.enter_context(conexao.execute_wrapper(_medir_sql))
+                response = self.get_response(request)
+        finally:
+            _medicoes.reset(token)
+        medicoes.fim = time.perf_counter()
+        metricas.registrar_requisicao(request, response, medicoes)
+
+        if getattr(settings, "PERF_SERVER_TIMING", settings.DEBUG):
+            response["Server-Timing"] = medicoes.server_timing()
+
+        orcamento_ms = getattr(settings, "PERF_BUDGET_MS", 500)
+        orcamento_queries = getattr(settings, "PERF_BUDGET_QUERIES", 30)
+        if (
+            medicoes.total * 1000 > orcamento_ms
+            or medicoes.sql_queries > orcamento_queries
+        ):
+            logger.warning(
+                "Requisição acima do orçamento: %s %s total=%.1fms "
+                "queries=%d db=%.1fms tpl=%.1fms mp=%.1fms (%d chamadas)",
+                request.method,
+                request.path,
+                medicoes.total * 1000,
+                medicoes.sql_queries,
+                medicoes.sql_tempo * 1000,
+                medicoes.template_tempo * 1000,
+                medicoes.mp_tempo * 1000,
+                medicoes.mp_chamadas,
+            )
+        return response
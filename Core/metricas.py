@@ -0,0 +1,285 @@
+# Core/metricas.py
+#
+# Métricas no formato texto do Prometheus, servidas em /metrics sem
+# depender de um servidor externo. Cada processo do gunicorn acumula seus
+# contadores e histogramas em memória e os grava periodicamente em
+# METRICS_DIR/<pid>.json; o /metrics soma os arquivos de todos os workers
+# (os de workers que já morreram continuam contando, como num contador
+# Prometheus). O entrypoint limpa o diretório a cada deploy.
+
+import hmac
+import json
+import os
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+METRICAS = {
+    "loja_requisicoes_total": (
+        "counter",
+        "Requisições atendidas por view, método e status.",
+    ),
+    "loja_requisicao_duracao_segundos": (
+        "histogram",
+        "Duração das requisições por view.",
+    ),
+    "loja_db_queries_total": ("counter", "Queries executadas por view."),
+    "loja_webhook_mercadopago_total": (
+        "counter",
+        "Notificações do Mercado Pago processadas, por resultado.",
+    ),
+    "loja_checkout_total": ("counter", "Checkouts por vendedor, por resultado."),
+    "loja_estoque_insuficiente_total": (
+        "counter",
+        "Itens de pedidos aprovados sem estoque para baixar (venda a mais).",
+    ),
+    "loja_mercadopago_duracao_segundos": (
+        "histogram",
+        "Duração das chamadas à API do Mercado Pago.",
+    ),
+}
+
+_lock = threading.Lock()
+_registro = None
+
+
+class _Registro:
+    def __init__(self):
+        self.pid = os.getpid()
+        self.contadores = {}
+        self.histogramas = {}
+        self.ultima_gravacao = time.monotonic()
+        # Se o pid foi reaproveitado de um worker antigo, continua a partir
+        # do que ele deixou gravado para os contadores não voltarem atrás.
+        self._carregar(_arquivo(self.pid))
+
+    def _carregar(self, arquivo):
+        dados = ler_json(arquivo) if arquivo else None
+        if dados:
+            _somar(self.contadores, self.histogramas, dados)
+
+
+def _diretorio():
+    # Fora do Django (ex: apimercadopago usado num script) só acumula em memória
+    if not settings.configured:
+        return None
+    return Path(getattr(settings, "METRICS_DIR", ".cache/metricas"))
+
+
+def _arquivo(pid):
+    diretorio = _diretorio()
+    return diretorio / f"{pid}.json" if diretorio else None
+
+
+def _atual():
+    global _registro
+    # Depois do fork (gunicorn --preload) o filho começa um registro próprio
+    if _registro is None or _registro.pid != os.getpid():
+        _registro = _Registro()
+    return _registro
+
+
+def _chave(nome, labels):
+    return nome, tuple(sorted((chave, str(valor)) for chave, valor in labels.items()))
+
+
+def incrementar(nome, valor=1, **labels):
+    with _lock:
+        registro = _atual()
+        chave = _chave(nome, labels)
+        registro.contadores[chave] = registro.contadores.get(chave, 0) + valor
+    _gravar_se_preciso()
+
+
+def observar(nome, valor, **labels):
+    with _lock:
+        registro = _atual()
+        chave = _chave(nome, labels)
+        histograma = registro.histogramas.get(chave)
+        if histograma is None:
+            histograma = registro.histogramas[chave] = {
+                "buckets": [0] * len(BUCKETS),
+                "soma": 0.0,
+                "total": 0,
+            }
+        # Buckets já acumulados (le=...), então somar arquivos é só somar listas
+        for indice, limite in enumerate(BUCKETS):
+            if valor <= limite:
+                histograma["buckets"][indice] += 1
+        histograma["soma"] += valor
+        histograma["total"] += 1
+    _gravar_se_preciso()
+
+
+def _serializar(registro):
+    return {
+        "contadores": [
+            [nome, list(labels), valor]
+            for (nome, labels), valor in registro.contadores.items()
+        ],
+        "histogramas": [
+            [nome, list(labels), dados]
+            for (nome, labels), dados in registro.histogramas.items()
+        ],
+    }
+
+
+def ler_json(arquivo):
+    try:
+        with open(arquivo) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _somar(contadores, histogramas, dados):
+    for nome, labels, valor in dados["contadores"]:
+        chave = (nome, tuple(tuple(par) for par in labels))
+        contadores[chave] = contadores.get(chave, 0) + valor
+
+    for nome, labels, valores in dados["histogramas"]:
+        chave = (nome, tuple(tuple(par) for par in labels))
+        histograma = histogramas.setdefault(
+            chave, {"buckets": [0] * len(BUCKETS), "soma": 0.0, "total": 0}
+        )
+        histograma["buckets"] = [
+            a + b for a, b in zip(histograma["buckets"], valores["buckets"])
+        ]
+        histograma["soma"] += valores["soma"]
+        histograma["total"] += valores["total"]
+
+
+def gravar():
+    """Grava as métricas deste processo em METRICS_DIR/<pid>.json."""
+    with _lock:
+        registro = _atual()
+        dados = _serializar(registro)
+        registro.ultima_gravacao = time.monotonic()
+
+    arquivo = _arquivo(registro.pid)
+    if arquivo is not None:
+        gravar_json(arquivo, dados)
+
+
+def gravar_json(arquivo, dados):
+    arquivo.parent.mkdir(parents=True, exist_ok=True)
+    # Escreve num temporário e troca de uma vez: quem lê nunca vê meio arquivo
+    fd, temporario = tempfile.mkstemp(dir=arquivo.parent, suffix=".tmp")
+    with os.fdopen(fd, "w") as f:
+        json.dump(dados, f)
+    os.replace(temporario, arquivo)
+
+
+def _gravar_se_preciso():
+    if not settings.configured:
+        return
+    intervalo = getattr(settings, "METRICS_FLUSH_SECONDS", 1)
+    if time.monotonic() - _atual().ultima_gravacao >= intervalo:
+        gravar()
+
+
+def coletar():
+    """Soma as métricas de todos os workers (este processo lido da memória)."""
+    contadores = {}
+    histogramas = {}
+
+    with _lock:
+        registro = _atual()
+        _somar(contadores, histogramas, _serializar(registro))
+
+    diretorio = _diretorio()
+    if diretorio is None:
+        return contadores, histogramas
+
+    for arquivo in diretorio.glob("*.json"):
+        if arquivo.stem == str(registro.pid):
+            continue
+        dados = ler_json(arquivo)
+        if dados:
+            _somar(contadores, histogramas, dados)
+
+    return contadores, histogramas
+
+
+def _escapar(valor):
+    return valor.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(pares):
+    if not pares:
+        return ""
+    return (
+        "{" + ",".join(f'{chave}="{_escapar(valor)}"' for chave, valor in pares) + "}"
+    )
+
+
+def _numero(valor):
+    return repr(float(valor)) if isinstance(valor, float) else str(valor)
+
+
+def exposicao():
+    """Texto no formato de exposição do Prometheus (version 0.0.4)."""
+    contadores, histogramas = coletar()
+    linhas = []
+
+    for nome, (tipo, ajuda) in METRICAS.items():
+        linhas.append(f"# HELP {nome} {ajuda}")
+        linhas.append(f"# TYPE {nome} {tipo}")
+
+        if tipo == "counter":
+            for (metrica, labels), valor in sorted(contadores.items()):
+                if metrica == nome:
+                    linhas.append(f"{nome}{_labels(labels)} {_numero(valor)}")
+            continue
+
+        for (metrica, labels), dados in sorted(histogramas.items()):
+            if metrica != nome:
+                continue
+            for limite, quantidade in zip(BUCKETS, dados["buckets"]):
+                pares = (*labels, ("le", str(limite)))
+                linhas.append(f"{nome}_bucket{_labels(pares)} {quantidade}")
+            pares = (*labels, ("le", "+Inf"))
+            linhas.append(f"{nome}_bucket{_labels(pares)} {dados['total']}")
+            linhas.append(f"{nome}_sum{_labels(labels)} {_numero(dados['soma'])}")
+            linhas.append(f"{nome}_count{_labels(labels)} {dados['total']}")
+
+    return "\n".join(linhas) + "\n"
+
+
+def registrar_requisicao(request, response, medicoes):
+    view = medicoes.view()
+
+    incrementar(
+        "loja_requisicoes_total",
+        view=view,
+        metodo=request.method,
+        status=response.status_code,
+    )
+    observar("loja_requisicao_duracao_segundos", medicoes.total, view=view)
+    if medicoes.sql_queries:
+        incrementar("loja_db_queries_total", medicoes.sql_queries, view=view)
+
+
+def _autorizado(request):
+    """IP na METRICS_ALLOWED_IPS ou token do METRICS_TOKEN no Authorization."""
+    if request.META.get("REMOTE_ADDR") in settings.METRICS_ALLOWED_IPS:
+        return True
+    token = settings.METRICS_TOKEN
+    # Bytes: compare_digest recusa str com caracteres fora do ASCII
+    return bool(token) and hmac.compare_digest(
+        request.headers.get("Authorization", "").encode(), f"Bearer {token}".encode()
+    )
+
+
+def metrics(request):
+    if not _autorizado(request):
+        return HttpResponseForbidden()
+    return HttpResponse(
+        exposicao(), content_type="text/plain; version=0.0.4; charset=utf-8"
+    )
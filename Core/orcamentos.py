@@ -0,0 +1,158 @@
+# Core/orcamentos.py
+#
+# Orçamentos de queries e de tempo para os testes. Uma view que passa do
+# número de queries combinado falha o teste listando as queries executadas,
+# o que deixa um N+1 novo evidente já no CI. A base OrcamentoTestCase
+# popula o banco com um volume parecido com o de produção (200 produtos,
+# 20 categorias, carrinho com 30 itens, pedidos e solicitações).
+
+import time
+from contextlib import contextmanager
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from Store.models import (
+    Carrinho,
+    Categoria,
+    ItemCarrinho,
+    ItemOrder,
+    Order,
+    Produto,
+    Solicitacao_Vendedor,
+    Subcategoria,
+)
+from Usuario.models import Profile
+
+SENHA = "senha-teste"
+
+
+class OrcamentoMixin:
+    @contextmanager
+    def assertOrcamento(self, queries, ms=None, using=DEFAULT_DB_ALIAS):
+        """
+        Falha se o bloco executar mais de `queries` queries ou demorar mais
+        de `ms` milissegundos.
+        """
+        capturadas = CaptureQueriesContext(connections[using])
+        inicio = time.perf_counter()
+        with capturadas:
+            yield capturadas
+        duracao_ms = (time.perf_counter() - inicio) * 1000
+
+        if len(capturadas) > queries:
+            lista = "\n".join(
+                f"{numero}. {query['sql']}"
+                for numero, query in enumerate(capturadas.captured_queries, start=1)
+            )
+            self.fail(
+                f"{len(capturadas)} queries executadas, orçamento de {queries}:\n{lista}"
+            )
+        if ms is not None and duracao_ms > ms:
+            self.fail(f"{duracao_ms:.0f} ms, orçamento de {ms} ms")
+
+
+def _criar_usuarios(prefixo, quantidade, **perfil):
+    usuarios = User.objects.bulk_create(
+        User(username=f"{prefixo}_{i}", first_name=f"{prefixo.title()} {i}")
+        for i in range(quantidade)
+    )
+    # bulk_create não dispara o post_save que cria o perfil
+    Profile.objects.bulk_create(Profile(usuario=u, **perfil) for u in usuarios)
+    return usuarios
+
+
+class OrcamentoTestCase(OrcamentoMixin, TestCase):
+    """TestCase com o banco populado em volume realista."""
+
+    PRODUTOS = 200
+    CATEGORIAS = 20
+    SUBCATEGORIAS_POR_CATEGORIA = 3
+    VENDEDORES = 10
+    ITENS_CARRINHO = 30
+    PEDIDOS = 20
+    ITENS_POR_PEDIDO = 5
+    SOLICITACOES = 15
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.vendedor = User.objects.create_user(
+            username="vendedor", password=SENHA, first_name="Vendedor"
+        )
+        cls.comprador = User.objects.create_user(
+            username="comprador", password=SENHA, first_name="Comprador"
+        )
+        cls.admin = User.objects.create_superuser(
+            username="admin", password=SENHA, first_name="Admin"
+        )
+        Profile.objects.filter(usuario=cls.vendedor).update(
+            vendedor=True, mp_connected=True, mp_access_token="TOKEN_VENDEDOR"
+        )
+        cls.vendedor.refresh_from_db()
+
+        outros_vendedores = _criar_usuarios(
+            "loja",
+            cls.VENDEDORES - 1,
+            vendedor=True,
+            mp_connected=True,
+            mp_access_token="TOKEN_LOJA",
+        )
+        vendedores = [cls.vendedor, *outros_vendedores]
+
+        cls.categorias = Categoria.objects.bulk_create(
+            Categoria(nome=f"Categoria {i}") for i in range(cls.CATEGORIAS)
+        )
+        subcategorias = Subcategoria.objects.bulk_create(
+            Subcategoria(nome=f"Sub {i}-{j}", categoria_pai=categoria)
+            for i, categoria in enumerate(cls.categorias)
+            for j in range(cls.SUBCATEGORIAS_POR_CATEGORIA)
+        )
+        cls.produtos = Produto.objects.bulk_create(
+            Produto(
+                nome=f"Produto {i}",
+                preco=Decimal("10.00") + i,
+                quantidade=1000,
+                subcategoria=subcategorias[i % len(subcategorias)],
+                vendedor=vendedores[i % len(vendedores)],
+                imagem=f"uploads/produtos/produto_{i}.jpg",
+            )
+            for i in range(cls.PRODUTOS)
+        )
+        cls.produto = cls.produtos[0]
+
+        cls.carrinho = Carrinho.objects.create(usuario=cls.comprador)
+        ItemCarrinho.objects.bulk_create(
+            ItemCarrinho(carrinho=cls.carrinho, produto=produto, quantidade=2)
+            for produto in cls.produtos[: cls.ITENS_CARRINHO]
+        )
+
+        compradores = _criar_usuarios("cliente", cls.PEDIDOS)
+        cls.pedidos = Order.objects.bulk_create(
+            Order(vendedor=cls.vendedor, comprador=comprador)
+            for comprador in compradores
+        )
+        produtos_do_vendedor = [p for p in cls.produtos if p.vendedor == cls.vendedor]
+        ItemOrder.objects.bulk_create(
+            ItemOrder(order=pedido, produto=produto, quantidade=1, preco=produto.preco)
+            for pedido in cls.pedidos
+            for produto in produtos_do_vendedor[: cls.ITENS_POR_PEDIDO]
+        )
+        cls.pedido = cls.pedidos[0]
+
+        solicitantes = _criar_usuarios("solicitante", cls.SOLICITACOES)
+        Solicitacao_Vendedor.objects.bulk_create(
+            Solicitacao_Vendedor(
+                usuario=usuario,
+                nome_completo=usuario.first_name,
+                cpf=f"000.000.000-{i:02d}",
+                descricao="Quero vender",
+            )
+            for i, usuario in enumerate(solicitantes)
+        )
+        cls.solicitante = solicitantes[0]
+
+    def logar(self, usuario):
+        self.client.force_login(usuario)
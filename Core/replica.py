@@ -0,0 +1,98 @@
+# Core/replica.py
+#
+# Roteamento leitura/escrita: as views de consulta marcadas com
+# @leitura_replica leem do alias "replica" (configurado por
+# DATABASE_REPLICA_URL) e todo o resto vai para o "default". Depois de
+# qualquer escrita o navegador recebe um cookie que fixa as leituras no
+# primário por REPLICA_STICKY_SECONDS, para o usuário sempre enxergar o
+# que acabou de gravar mesmo que a réplica ainda esteja atrasada.
+
+import contextvars
+from functools import wraps
+
+from django.conf import settings
+from django.db import connections
+
+REPLICA = "replica"
+COOKIE_FIXAR_PRIMARIO = "fixar_primario"
+METODOS_SEGUROS = ("GET", "HEAD", "OPTIONS")
+
+_estado = contextvars.ContextVar("estado_replica", default=None)
+
+
+class _EstadoRequisicao:
+    def __init__(self, fixado):
+        self.fixado = fixado
+        self.ler_replica = False
+        self.escreveu = False
+
+
+def _replica_configurada():
+    if REPLICA not in settings.DATABASES:
+        return False
+    # Nos testes a réplica é um espelho do default (TEST MIRROR): as duas
+    # apontam para o mesmo banco e ler de uma ou de outra dá no mesmo.
+    return (
+        connections[REPLICA].settings_dict["NAME"]
+        != connections["default"].settings_dict["NAME"]
+    )
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        estado = _estado.get()
+        if estado and estado.ler_replica and not estado.fixado:
+            if _replica_configurada():
+                return REPLICA
+        return None
+
+    def db_for_write(self, model, **hints):
+        estado = _estado.get()
+        if estado:
+            estado.escreveu = True
+        return "default"
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # A réplica é uma cópia do default, então objetos dos dois lados
+        # podem se relacionar livremente.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db != REPLICA
+
+
+def leitura_replica(view):
+    @wraps(view)
+    def _view(request, *args, **kwargs):
+        estado = _estado.get()
+        if estado and request.method in METODOS_SEGUROS:
+            estado.ler_replica = True
+        return view(request, *args, **kwargs)
+
+    return _view
+
+
+class ReplicaMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        estado = _EstadoRequisicao(
+            fixado=COOKIE_FIXAR_PRIMARIO in request.COOKIES
+            or request.method not in METODOS_SEGUROS
+        )
+        token = _estado.set(estado)
+        try:
+            response = self.get_response(request)
+        finally:
+            _estado.reset(token)
+
+        if estado.escreveu or request.method not in METODOS_SEGUROS:
+            response.set_cookie(
+                COOKIE_FIXAR_PRIMARIO,
+                "1",
+                max_age=getattr(settings, "REPLICA_STICKY_SECONDS", 10),
+                httponly=True,
+                samesite="Lax",
+            )
+        return response
@@ -0,0 +1,50 @@
+# Core/settings_test.py
+#
+# Perfil dos testes, usado por padrão no "python manage.py test" (ver
+# manage.py). Troca o que deixa a suíte lenta ou presa ao disco: o hash
+# PBKDF2 das senhas (cada create_user/login custa centenas de ms), o SQLite
+# em arquivo, o cache em arquivo e os uploads gravados em media/. Funciona
+# com o runner paralelo: "python manage.py test --parallel".
+
+from Core.settings import *  # noqa: F401,F403
+
+PASSWORD_HASHERS = ["django.contrib.auth.hashers.MD5PasswordHasher"]
+
+# O test runner cria o banco de teste em memória para o SQLite; com
+# --parallel cada processo recebe a sua cópia. Com DATABASE_URL (ex: o job
+# test-postgres do CI) fica o banco escolhido pelo config_banco, para as
+# queries específicas do PostgreSQL rodarem de verdade.
+if not DATABASE_URL:  # noqa: F405
+    DATABASES = {
+        "default": {
+            "ENGINE": "django.db.backends.sqlite3",
+            "NAME": ":memory:",
+        }
+    }
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    }
+}
+
+STORAGES = {
+    "default": {"BACKEND": "django.core.files.storage.InMemoryStorage"},
+    "staticfiles": {"BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"},
+}
+
+# Métricas, consultas lentas e o índice do autocompletar dos testes num
+# diretório próprio, separado do que o servidor usa. Os testes que conferem
+# o conteúdo trocam por um TemporaryDirectory que é apagado no fim.
+METRICS_DIR = str(BASE_DIR / ".cache" / "testes" / "metricas")  # noqa: F405
+AUTOCOMPLETE_DIR = str(BASE_DIR / ".cache" / "testes" / "autocomplete")  # noqa: F405
+
+# Contadores de produtos só vão ao banco quando o teste chama
+# Store.contadores.gravar(); assim as views não ganham queries de repente
+CONTADORES_FLUSH_SECONDS = 3600
+
+# Sem o aviso de orçamento estourado a cada requisição lenta dos testes nem
+# os avisos das respostas de erro e vendas a mais simuladas
+LOGGING["loggers"]["Core"]["level"] = "ERROR"  # noqa: F405
+LOGGING["loggers"]["apimercadopago"]["level"] = "ERROR"  # noqa: F405
+LOGGING["loggers"]["Store"]["level"] = "ERROR"  # noqa: F405
@@ -1,10 +1,11 @@
 from django.contrib import admin
 from django.urls import path, include
-from . import settings
+from . import metricas, settings
 from django.conf.urls.static import static
 
 urlpatterns = [
     path("admin/", admin.site.urls),
+    path("metrics", metricas.metrics, name="metrics"),
     path("", include("Store.urls")),
     path("usuario/", include("Usuario.urls")),
 ] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
@@ -7,6 +7,7 @@ from .models import (
     ItemOrder,
     Carrinho,
     ItemCarrinho,
+    Reserva,
     Solicitacao_Vendedor,
     Subcategoria,
 )
@@ -19,4 +20,5 @@ admin.site.register(Order)
 admin.site.register(ItemOrder)
 admin.site.register(Carrinho)
 admin.site.register(ItemCarrinho)
+admin.site.register(Reserva)
 admin.site.register(Solicitacao_Vendedor)
@@ -0,0 +1,310 @@
+# Store/autocompletar.py
+#
+# Sugestões do campo de busca (/autocomplete?q=) sem ir ao banco: nomes de
+# produtos, categorias, subcategorias e vendedores num índice de prefixos em
+# memória. O índice é um array ordenado de chaves normalizadas (sem acento,
+# minúsculas), uma por palavra do nome a partir dela, então "camiseta az"
+# e "azul" acham "Camiseta Azul". A busca é um bisect até a primeira chave
+# com o prefixo e uma leitura sequencial dali.
+#
+# Os workers compartilham o índice por arquivos em AUTOCOMPLETE_DIR, como o
+# Core.metricas: uma foto (indice.json) e um diário (diario-<geração>.jsonl)
+# com as mudanças depois dela. Os sinais de Produto, Categoria, Subcategoria
+# e Profile acrescentam a mudança ao diário depois do commit; a cada
+# requisição o worker só faz um stat() no diário e aplica as linhas novas.
+# Quando o diário passa de AUTOCOMPLETE_COMPACTAR linhas vira uma foto nova.
+# Escritas no diário são serializadas por um flock; a foto completa vem do
+# banco só no deploy (manage.py indexar_autocomplete) ou se não existir.
+
+import bisect
+import json
+import os
+import tempfile
+import threading
+import unicodedata
+from pathlib import Path
+
+from django.conf import settings
+
+try:
+    import fcntl
+except ImportError:  # Windows: sem trava entre processos (desenvolvimento)
+    fcntl = None
+
+PRODUTO = "produto"
+CATEGORIA = "categoria"
+SUBCATEGORIA = "subcategoria"
+VENDEDOR = "vendedor"
+# Palavras de um nome que viram chave (as primeiras), para o índice não
+# crescer com descrições longas
+MAX_PALAVRAS = 8
+# Marca, no fim de um diário, que existe uma foto mais nova
+NOVA_GERACAO = "geracao"
+
+_lock = threading.Lock()
+_indice = None
+
+
+def normalizar(texto):
+    """Minúsculas, sem acentos e com um espaço só entre as palavras."""
+    decomposto = unicodedata.normalize("NFKD", texto or "")
+    sem_acento = "".join(c for c in decomposto if not unicodedata.combining(c))
+    return " ".join(
+        "".join(c if c.isalnum() else " " for c in sem_acento.casefold()).split()
+    )
+
+
+def _chaves(rotulo):
+    palavras = normalizar(rotulo).split(" ")[:MAX_PALAVRAS]
+    return {" ".join(palavras[inicio:]) for inicio in range(len(palavras))} - {""}
+
+
+class _Indice:
+    def __init__(self, geracao, itens):
+        self.geracao = geracao
+        self.posicao = 0  # bytes do diário já aplicados
+        self.linhas = 0
+        self.rotulos = {}  # {(tipo, id): rótulo}
+        pares = []
+        for tipo, id_, rotulo in itens:
+            dono = (tipo, id_)
+            self.rotulos[dono] = rotulo
+            pares += [(chave, dono) for chave in _chaves(rotulo)]
+        pares.sort()
+        # Duas listas paralelas: o bisect compara só as strings
+        self.chaves = [chave for chave, _ in pares]
+        self.donos = [dono for _, dono in pares]
+
+    def remover(self, dono):
+        rotulo = self.rotulos.pop(dono, None)
+        if rotulo is None:
+            return
+        for chave in _chaves(rotulo):
+            i = bisect.bisect_left(self.chaves, chave)
+            while i < len(self.chaves) and self.chaves[i] == chave:
+                if self.donos[i] == dono:
+                    del self.chaves[i], self.donos[i]
+                    break
+                i += 1
+
+    def gravar(self, dono, rotulo):
+        self.remover(dono)
+        self.rotulos[dono] = rotulo
+        for chave in _chaves(rotulo):
+            i = bisect.bisect_right(self.chaves, chave)
+            self.chaves.insert(i, chave)
+            self.donos.insert(i, dono)
+
+    def muda(self, mudanca):
+        operacao, tipo, id_, *rotulo = mudanca
+        atual = self.rotulos.get((tipo, id_))
+        return atual != rotulo[0] if operacao == "+" else atual is not None
+
+    def aplicar(self, mudanca):
+        operacao, tipo, id_, *rotulo = mudanca
+        if operacao == "+":
+            self.gravar((tipo, id_), rotulo[0])
+        else:
+            self.remover((tipo, id_))
+
+    def buscar(self, prefixo, limite):
+        encontrados = []
+        vistos = set()
+        i = bisect.bisect_left(self.chaves, prefixo)
+        while len(encontrados) < limite and i < len(self.chaves):
+            if not self.chaves[i].startswith(prefixo):
+                break
+            dono = self.donos[i]
+            if dono not in vistos:
+                vistos.add(dono)
+                encontrados.append((*dono, self.rotulos[dono]))
+            i += 1
+        return encontrados
+
+
+def _diretorio():
+    diretorio = Path(settings.AUTOCOMPLETE_DIR)
+    diretorio.mkdir(parents=True, exist_ok=True)
+    return diretorio
+
+
+def _foto():
+    return _diretorio() / "indice.json"
+
+
+def _diario(geracao):
+    return _diretorio() / f"diario-{geracao}.jsonl"
+
+
+class _Trava:
+    """flock exclusivo entre os processos que escrevem no índice."""
+
+    def __enter__(self):
+        self.arquivo = open(_diretorio() / ".trava", "a")
+        if fcntl:
+            fcntl.flock(self.arquivo, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *erro):
+        if fcntl:
+            fcntl.flock(self.arquivo, fcntl.LOCK_UN)
+        self.arquivo.close()
+
+
+def _itens_do_banco():
+    from Usuario.models import Profile
+
+    from .models import Categoria, Produto, Subcategoria
+
+    yield from (
+        (PRODUTO, id_, nome)
+        for id_, nome in Produto.objects.values_list("id", "nome").iterator(
+            chunk_size=5000
+        )
+    )
+    yield from (
+        (CATEGORIA, id_, nome)
+        for id_, nome in Categoria.objects.values_list("id", "nome")
+    )
+    yield from (
+        (SUBCATEGORIA, id_, nome)
+        for id_, nome in Subcategoria.objects.values_list("id", "nome")
+    )
+    yield from (
+        (VENDEDOR, id_, username)
+        for id_, username in Profile.objects.filter(vendedor=True).values_list(
+            "usuario_id", "usuario__username"
+        )
+    )
+
+
+def _gravar_foto(geracao, itens):
+    # Mesmo esquema do Core.metricas: arquivo temporário + os.replace, para
+    # um worker nunca ler a foto pela metade
+    arquivo = _foto()
+    fd, temporario = tempfile.mkstemp(dir=arquivo.parent, suffix=".tmp")
+    with os.fdopen(fd, "w") as saida:
+        json.dump({"geracao": geracao, "itens": itens}, saida)
+    _diario(geracao).touch()
+    os.replace(temporario, arquivo)
+
+
+def _nova_geracao(itens):
+    """Grava uma foto nova e fecha o diário anterior. Chamar com a trava."""
+    anterior = _ler_foto()
+    geracao = anterior["geracao"] + 1 if anterior else 1
+    _gravar_foto(geracao, itens)
+    if anterior:
+        with open(_diario(anterior["geracao"]), "a") as diario:
+            diario.write(json.dumps([NOVA_GERACAO, geracao]) + "\n")
+        # Quem ainda estiver no de duas gerações atrás recarrega a foto
+        _diario(anterior["geracao"] - 1).unlink(missing_ok=True)
+    return geracao
+
+
+def _ler_foto():
+    try:
+        with open(_foto()) as entrada:
+            return json.load(entrada)
+    except FileNotFoundError:
+        return None
+
+
+def _reconstruir():
+    """Foto nova a partir do banco. Chamar com a trava e o _lock."""
+    global _indice
+    itens = [list(item) for item in _itens_do_banco()]
+    _indice = _Indice(_nova_geracao(itens), itens)
+    return len(itens)
+
+
+def reconstruir():
+    """Foto nova a partir do banco; devolve quantos itens foram indexados."""
+    with _Trava(), _lock:
+        return _reconstruir()
+
+
+def _carregar():
+    """Carrega a foto atual; False se ainda não existe nenhuma."""
+    global _indice
+    foto = _ler_foto()
+    if foto is None:
+        return False
+    _indice = _Indice(foto["geracao"], foto["itens"])
+    return True
+
+
+def _sincronizar():
+    """
+    Aplica o que os outros processos escreveram no diário. Chamar com o
+    _lock; False se não há foto para carregar.
+    """
+    if _indice is None and not _carregar():
+        return False
+    while True:
+        diario = _diario(_indice.geracao)
+        try:
+            if diario.stat().st_size <= _indice.posicao:
+                return True
+            with open(diario, "rb") as entrada:
+                entrada.seek(_indice.posicao)
+                novo = entrada.read()
+        except FileNotFoundError:
+            # Ficou parado mais de uma geração: recomeça da foto atual
+            if not _carregar():
+                return False
+            continue
+        # Só linhas completas; uma escrita pela metade fica para a próxima
+        completo = novo[: novo.rfind(b"\n") + 1]
+        for linha in completo.splitlines():
+            mudanca = json.loads(linha)
+            if mudanca[0] == NOVA_GERACAO:
+                _carregar()
+                break
+            _indice.aplicar(mudanca)
+            _indice.linhas += 1
+        else:
+            _indice.posicao += len(completo)
+            return True
+
+
+def publicar(mudancas):
+    """
+    Acrescenta mudanças ao diário compartilhado e ao índice deste processo:
+    ["+", tipo, id, rótulo] grava e ["-", tipo, id] remove.
+    """
+    with _Trava(), _lock:
+        if not _sincronizar():
+            # A foto tirada do banco agora já inclui a mudança
+            _reconstruir()
+            return
+        # O Profile é salvo a cada login: o que não muda nada fica fora do diário
+        mudancas = [mudanca for mudanca in mudancas if _indice.muda(mudanca)]
+        if not mudancas:
+            return
+        linhas = "".join(json.dumps(mudanca) + "\n" for mudanca in mudancas)
+        with open(_diario(_indice.geracao), "a") as diario:
+            diario.write(linhas)
+        _sincronizar()
+        if _indice.linhas >= settings.AUTOCOMPLETE_COMPACTAR:
+            itens = [
+                [tipo, id_, rotulo] for (tipo, id_), rotulo in _indice.rotulos.items()
+            ]
+            _indice.geracao = _nova_geracao(itens)
+            _indice.posicao = _indice.linhas = 0
+
+
+def buscar(termo, limite=None):
+    """Até `limite` itens [(tipo, id, rótulo)] com alguma palavra começando em `termo`."""
+    prefixo = normalizar(termo)
+    if not prefixo:
+        return []
+    limite = limite or settings.AUTOCOMPLETE_LIMITE
+    with _lock:
+        if _sincronizar():
+            return _indice.buscar(prefixo, limite)
+    # Primeira busca sem foto (o deploy não rodou indexar_autocomplete)
+    with _Trava(), _lock:
+        if not _sincronizar():
+            _reconstruir()
+        return _indice.buscar(prefixo, limite)
@@ -0,0 +1,180 @@
+# Store/carrinho_anonimo.py
+#
+# Carrinho de quem ainda não fez login. Fica num cookie assinado, no formato
+# compacto "id:quantidade,id:quantidade" (ex: "12:2,15:1"), então navegar e
+# adicionar produtos sem estar logado não grava nada no banco: só há SELECTs
+# dos produtos. No login o conteúdo é mesclado no Carrinho do usuário numa
+# única transação (ver mesclar) e o cookie é apagado.
+
+from django.conf import settings
+from django.db import transaction
+
+from .models import Carrinho, ItemCarrinho, Produto
+
+COOKIE = "carrinho"
+SALT = "Store.carrinho_anonimo"
+# Cada item ocupa ~10 bytes; 50 itens ficam bem abaixo dos 4 KB de um cookie
+MAX_ITENS = 50
+MAX_AGE = 60 * 60 * 24 * 30
+
+
+def _ler(valor):
+    itens = {}
+    for par in valor.split(","):
+        produto_id, _, quantidade = par.partition(":")
+        try:
+            produto_id, quantidade = int(produto_id), int(quantidade)
+        except ValueError:
+            continue
+        if quantidade > 0:
+            itens[produto_id] = quantidade
+    return itens
+
+
+class CarrinhoAnonimo:
+    def __init__(self, valor=None):
+        self.itens = _ler(valor) if valor else {}
+        self.modificado = False
+
+    @classmethod
+    def da_requisicao(cls, request):
+        return cls(request.get_signed_cookie(COOKIE, default=None, salt=SALT))
+
+    def __len__(self):
+        return len(self.itens)
+
+    def adicionar(self, produto, quantidade):
+        """Soma `quantidade`, limitada ao estoque, como o carrinho do banco."""
+        if produto.id not in self.itens and len(self.itens) >= MAX_ITENS:
+            return False
+        self.itens[produto.id] = min(
+            self.itens.get(produto.id, 0) + quantidade, produto.quantidade
+        )
+        if self.itens[produto.id] <= 0:
+            del self.itens[produto.id]
+        self.modificado = True
+        return True
+
+    def definir(self, produto_id, quantidade):
+        """Troca a quantidade do item; 0 tira o item do carrinho."""
+        if quantidade <= 0:
+            self.excluir(produto_id)
+            return True
+        if produto_id not in self.itens and len(self.itens) >= MAX_ITENS:
+            return False
+        if self.itens.get(produto_id) != quantidade:
+            self.itens[produto_id] = quantidade
+            self.modificado = True
+        return True
+
+    def remover(self, produto_id):
+        if produto_id not in self.itens:
+            return
+        if self.itens[produto_id] > 1:
+            self.itens[produto_id] -= 1
+        else:
+            del self.itens[produto_id]
+        self.modificado = True
+
+    def excluir(self, produto_id):
+        if self.itens.pop(produto_id, None) is not None:
+            self.modificado = True
+
+    def limpar(self):
+        self.itens = {}
+        self.modificado = True
+
+    def valor(self):
+        return ",".join(f"{produto_id}:{qtd}" for produto_id, qtd in self.itens.items())
+
+    def gravar(self, response):
+        if self.itens:
+            response.set_signed_cookie(
+                COOKIE,
+                self.valor(),
+                salt=SALT,
+                max_age=MAX_AGE,
+                httponly=True,
+                samesite="Lax",
+                secure=settings.SESSION_COOKIE_SECURE,
+            )
+        else:
+            response.delete_cookie(COOKIE, samesite="Lax")
+
+    def itens_do_carrinho(self):
+        """
+        ItemCarrinho não salvos, para a página do carrinho ser a mesma dos
+        usuários logados. Produtos que não existem mais são ignorados.
+        """
+        if not self.itens:
+            return []
+        produtos = Produto.objects.select_related("vendedor").in_bulk(self.itens)
+        return [
+            ItemCarrinho(produto=produtos[produto_id], quantidade=quantidade)
+            for produto_id, quantidade in self.itens.items()
+            if produto_id in produtos
+        ]
+
+
+def mesclar(usuario, carrinho_anonimo):
+    """
+    Junta o carrinho anônimo ao Carrinho do usuário numa transação só:
+    um SELECT do estoque, um dos itens existentes e um INSERT ... ON
+    CONFLICT em lote. As quantidades são somadas e limitadas ao estoque.
+    """
+    if not carrinho_anonimo.itens:
+        return
+    with transaction.atomic():
+        carrinho, _ = Carrinho.objects.get_or_create(usuario=usuario)
+        estoque = dict(
+            Produto.objects.filter(id__in=carrinho_anonimo.itens).values_list(
+                "id", "quantidade"
+            )
+        )
+        existentes = {
+            item.produto_id: item
+            for item in carrinho.itens.select_for_update().filter(
+                produto_id__in=estoque
+            )
+        }
+
+        gravar = []
+        for produto_id, quantidade in carrinho_anonimo.itens.items():
+            if produto_id not in estoque:
+                continue
+            item = existentes.get(produto_id)
+            quantidade = min(
+                quantidade + (item.quantidade if item else 0), estoque[produto_id]
+            )
+            if quantidade > 0:
+                gravar.append(
+                    ItemCarrinho(
+                        carrinho=carrinho, produto_id=produto_id, quantidade=quantidade
+                    )
+                )
+
+        if gravar:
+            ItemCarrinho.objects.bulk_create(
+                gravar,
+                update_conflicts=True,
+                unique_fields=["carrinho", "produto"],
+                update_fields=["quantidade", "atualizado_em"],
+            )
+
+
+class CarrinhoAnonimoMiddleware:
+    """
+    Disponibiliza request.carrinho_anonimo e regrava (ou apaga) o cookie
+    quando a view mexeu no carrinho.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        # Cookie adulterado ou de outra SECRET_KEY vira um carrinho vazio
+        request.carrinho_anonimo = CarrinhoAnonimo.da_requisicao(request)
+        response = self.get_response(request)
+        if request.carrinho_anonimo.modificado:
+            request.carrinho_anonimo.gravar(response)
+        return response
@@ -0,0 +1,83 @@
+# Store/carrinho_sql.py
+#
+# Mudanças de quantidade no carrinho em um comando SQL cada, sem ler o
+# produto, o carrinho e a linha antes de escrever. Somar é um
+# INSERT ... SELECT ... ON CONFLICT DO UPDATE sobre a restrição única
+# (carrinho, produto): a linha é criada ou somada atomicamente, limitada ao
+# estoque, e duas requisições simultâneas não criam linhas duplicadas.
+# Funciona no SQLite (3.35+) e no PostgreSQL, os dois bancos do projeto.
+
+from django.db import connections, router
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Carrinho, ItemCarrinho, Produto
+
+
+def _conexao():
+    # Passar pelo router também avisa a réplica de que houve escrita
+    return connections[router.db_for_write(ItemCarrinho)]
+
+
+def _sql_somar(conexao):
+    q = conexao.ops.quote_name
+    item = q(ItemCarrinho._meta.db_table)
+    produto = q(Produto._meta.db_table)
+    carrinho = q(Carrinho._meta.db_table)
+    # MIN(a, b) do SQLite é o LEAST(a, b) do PostgreSQL
+    menor = "MIN" if conexao.vendor == "sqlite" else "LEAST"
+    return f"""
+        INSERT INTO {item} ("carrinho_id", "produto_id", "quantidade", "atualizado_em")
+        SELECT c."id", p."id", {menor}(%s, p."quantidade"), %s
+        FROM {carrinho} c, {produto} p
+        WHERE c."usuario_id" = %s AND p."id" = %s AND p."quantidade" > 0
+        ON CONFLICT ("carrinho_id", "produto_id") DO UPDATE SET
+            "quantidade" = {menor}(
+                {item}."quantidade" + %s,
+                (SELECT "quantidade" FROM {produto} WHERE "id" = excluded."produto_id")
+            ),
+            "atualizado_em" = excluded."atualizado_em"
+        RETURNING "quantidade"
+    """
+
+
+def somar_item(usuario_id, produto_id, quantidade):
+    """
+    Soma `quantidade` ao produto no carrinho do usuário (limitada ao estoque)
+    e devolve a quantidade final, ou 0 se o produto não existe ou está sem
+    estoque. Uma query; duas a mais só no primeiro item, quando o carrinho
+    ainda não existe.
+    """
+    conexao = _conexao()
+    sql = _sql_somar(conexao)
+    agora = conexao.ops.adapt_datetimefield_value(timezone.now())
+    parametros = [quantidade, agora, usuario_id, produto_id, quantidade]
+    with conexao.cursor() as cursor:
+        cursor.execute(sql, parametros)
+        linha = cursor.fetchone()
+        if linha is None:
+            _, criado = Carrinho.objects.get_or_create(usuario_id=usuario_id)
+            if criado:
+                cursor.execute(sql, parametros)
+                linha = cursor.fetchone()
+    return linha[0] if linha else 0
+
+
+def tirar_item(usuario_id, produto_id, quantidade=1):
+    """
+    Tira `quantidade` do produto no carrinho do usuário com um UPDATE
+    condicional; se a linha chegaria a zero, ela é apagada.
+    """
+    linhas = ItemCarrinho.objects.filter(
+        carrinho__usuario_id=usuario_id, produto_id=produto_id
+    )
+    if not linhas.filter(quantidade__gt=quantidade).update(
+        quantidade=F("quantidade") - quantidade, atualizado_em=timezone.now()
+    ):
+        linhas.filter(quantidade__lte=quantidade).delete()
+
+
+def excluir_item(usuario_id, produto_id):
+    ItemCarrinho.objects.filter(
+        carrinho__usuario_id=usuario_id, produto_id=produto_id
+    ).delete()
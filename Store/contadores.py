@@ -0,0 +1,167 @@
+# Store/contadores.py
+#
+# Contadores de popularidade por produto (visualizações da página e adições
+# ao carrinho). Gravar uma linha a cada GET serializaria as requisições no
+# SQLite, então cada processo soma os eventos em memória, como o
+# Core.metricas, e grava tudo de uma vez: a cada CONTADORES_FLUSH_SECONDS ou
+# quando junta CONTADORES_MAX_EVENTOS, num INSERT ... ON CONFLICT DO UPDATE
+# por lote de produtos. Um worker que sai normalmente grava o que tinha (atexit);
+# se ele morrer de repente perde no máximo os eventos de um intervalo.
+
+import atexit
+import logging
+import os
+import threading
+import time
+
+from django.conf import settings
+from django.db import DatabaseError, connections
+
+from .models import ContadorProduto, Produto
+
+logger = logging.getLogger(__name__)
+
+VISUALIZACAO = 0
+ADICAO_CARRINHO = 1
+# Linhas por INSERT (3 parâmetros cada, bem abaixo do limite do SQLite)
+LINHAS_POR_INSERT = 500
+
+_lock = threading.Lock()
+_buffer = None
+
+
+class _Buffer:
+    def __init__(self):
+        self.pid = os.getpid()
+        self.pendentes = {}  # {produto_id: [visualizacoes, adicoes_carrinho]}
+        self.eventos = 0
+        self.ultima_gravacao = time.monotonic()
+
+
+def _atual():
+    global _buffer
+    # Depois do fork (gunicorn --preload) o filho começa um buffer próprio
+    if _buffer is None or _buffer.pid != os.getpid():
+        _buffer = _Buffer()
+    return _buffer
+
+
+def _somar(pendentes, produto_id, visualizacoes, adicoes):
+    contagem = pendentes.setdefault(produto_id, [0, 0])
+    contagem[VISUALIZACAO] += visualizacoes
+    contagem[ADICAO_CARRINHO] += adicoes
+
+
+def _contar(produto_id, indice, quantidade=1):
+    with _lock:
+        buffer = _atual()
+        _somar(
+            buffer.pendentes,
+            produto_id,
+            quantidade if indice == VISUALIZACAO else 0,
+            quantidade if indice == ADICAO_CARRINHO else 0,
+        )
+        buffer.eventos += quantidade
+        gravar_agora = (
+            buffer.eventos >= settings.CONTADORES_MAX_EVENTOS
+            or time.monotonic() - buffer.ultima_gravacao
+            >= settings.CONTADORES_FLUSH_SECONDS
+        )
+    if gravar_agora:
+        gravar()
+
+
+def contar_visualizacao(produto_id):
+    _contar(produto_id, VISUALIZACAO)
+
+
+def contar_adicao(produto_id, quantidade=1):
+    _contar(produto_id, ADICAO_CARRINHO, quantidade)
+
+
+def _sql_somar(conexao, linhas):
+    q = conexao.ops.quote_name
+    tabela = q(ContadorProduto._meta.db_table)
+    valores = ", ".join(["(%s, %s, %s)"] * linhas)
+    return f"""
+        INSERT INTO {tabela} ("produto_id", "visualizacoes", "adicoes_carrinho")
+        VALUES {valores}
+        ON CONFLICT ("produto_id") DO UPDATE SET
+            "visualizacoes" = {tabela}."visualizacoes" + excluded."visualizacoes",
+            "adicoes_carrinho" = {tabela}."adicoes_carrinho" + excluded."adicoes_carrinho"
+    """
+
+
+def gravar():
+    """
+    Grava no banco o que este processo acumulou e zera o buffer. Se o banco
+    recusar (ex: SQLite ocupado), as contagens voltam para o buffer e vão na
+    próxima gravação. Devolve quantos produtos foram gravados.
+    """
+    with _lock:
+        buffer = _atual()
+        pendentes, buffer.pendentes = buffer.pendentes, {}
+        buffer.eventos = 0
+        buffer.ultima_gravacao = time.monotonic()
+    if not pendentes:
+        return 0
+
+    # Direto no default, sem passar pelo router: contar uma visita não é uma
+    # escrita que o usuário precise ler de volta, então não fixa as leituras
+    # dele no primário (Core/replica.py).
+    conexao = connections["default"]
+    try:
+        # Produto apagado desde a visita fica de fora (a FK recusaria a linha)
+        existentes = sorted(
+            Produto.objects.using("default")
+            .filter(id__in=pendentes)
+            .values_list("id", flat=True)
+        )
+        with conexao.cursor() as cursor:
+            for inicio in range(0, len(existentes), LINHAS_POR_INSERT):
+                lote = existentes[inicio : inicio + LINHAS_POR_INSERT]
+                parametros = []
+                for produto_id in lote:
+                    parametros += [produto_id, *pendentes[produto_id]]
+                cursor.execute(_sql_somar(conexao, len(lote)), parametros)
+    except DatabaseError:
+        logger.exception(
+            "Erro ao gravar os contadores de produtos; os eventos voltam ao buffer"
+        )
+        with _lock:
+            buffer = _atual()
+            for produto_id, (visualizacoes, adicoes) in pendentes.items():
+                _somar(buffer.pendentes, produto_id, visualizacoes, adicoes)
+                buffer.eventos += visualizacoes + adicoes
+        return 0
+    return len(existentes)
+
+
+def contagens(produto_ids):
+    """
+    Visualizações e adições ao carrinho de cada produto ({id: (vis, adi)}):
+    o que já está no banco mais o que este processo ainda não gravou.
+    """
+    resultado = {
+        produto_id: [visualizacoes, adicoes]
+        for produto_id, visualizacoes, adicoes in ContadorProduto.objects.filter(
+            produto_id__in=produto_ids
+        ).values_list("produto_id", "visualizacoes", "adicoes_carrinho")
+    }
+    with _lock:
+        pendentes = _atual().pendentes
+        for produto_id in produto_ids:
+            if produto_id in pendentes:
+                visualizacoes, adicoes = pendentes[produto_id]
+                _somar(resultado, produto_id, visualizacoes, adicoes)
+    return {produto_id: tuple(contagem) for produto_id, contagem in resultado.items()}
+
+
+def _gravar_ao_sair():
+    try:
+        gravar()
+    except Exception:  # o processo está saindo; não há o que fazer
+        logger.exception("Erro ao gravar os contadores de produtos na saída")
+
+
+atexit.register(_gravar_ao_sair)
@@ -0,0 +1,180 @@
+# Store/estoque.py
+#
+# Livro-razão do estoque. Produto.quantidade continua sendo o número que as
+# views leem e travam, mas toda mudança nele grava também um MovimentoEstoque
+# (cadastro, venda, reposição, ajuste manual) na mesma transação. As
+# reservas do checkout não entram: elas não mexem em Produto.quantidade e já
+# têm a sua tabela com prazo (Store/reservas.py).
+#
+# Para o saldo do livro não precisar somar a história inteira, a manutenção
+# periódica tira fotos (FotoEstoque) só dos produtos que tiveram movimentos
+# desde a última: saldo = foto + movimentos depois dela, pelo índice
+# (produto, id). A conciliação (manage.py conciliar_estoque) compara esse
+# saldo com Produto.quantidade em lotes, num SELECT só por lote, e aponta o
+# que foi alterado por fora do livro (admin, SQL à mão).
+
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import FotoEstoque, MovimentoEstoque, Produto
+
+Tipo = MovimentoEstoque.Tipo
+
+# Movimentos mais novos que isso ficam para a próxima foto: uma transação que
+# pegou o id antes e ainda não fez commit não pode ser pulada.
+FOLGA_FOTO = timedelta(minutes=1)
+
+
+def registrar(produto_id, tipo, delta):
+    if delta:
+        MovimentoEstoque.objects.create(produto_id=produto_id, tipo=tipo, delta=delta)
+
+
+def registrar_vendas(quantidades):
+    """Saída de cada produto vendido ({id: unidades}) num INSERT só."""
+    MovimentoEstoque.objects.bulk_create(
+        MovimentoEstoque(produto_id=produto_id, tipo=Tipo.VENDA, delta=-quantidade)
+        for produto_id, quantidade in quantidades.items()
+    )
+
+
+def salvar(produto):
+    """
+    Salva o produto e registra a mudança do estoque no livro. Produto novo
+    entra como cadastro; num existente a diferença é reposição se subiu e
+    ajuste se desceu. A linha fica travada até o commit, então uma venda
+    simultânea não some da diferença.
+    """
+    with transaction.atomic():
+        if produto.pk is None:
+            anterior, tipo = 0, Tipo.CADASTRO
+        else:
+            anterior = (
+                Produto.objects.select_for_update()
+                .values_list("quantidade", flat=True)
+                .get(id=produto.pk)
+            )
+            tipo = None
+        produto.save()
+        delta = int(produto.quantidade) - anterior
+        registrar(
+            produto.pk, tipo or (Tipo.REPOSICAO if delta > 0 else Tipo.AJUSTE), delta
+        )
+
+
+def _saldo(ate=None):
+    """
+    Expressão do saldo do livro para anotar em Produto: a foto mais a soma
+    dos movimentos depois dela (e até o movimento `ate`, se dado).
+    """
+    movimentos = MovimentoEstoque.objects.filter(
+        produto=OuterRef("pk"),
+        id__gt=Coalesce(OuterRef("foto_estoque__ultimo_movimento"), Value(0)),
+    )
+    if ate is not None:
+        movimentos = movimentos.filter(id__lte=ate)
+    soma = movimentos.values("produto").annotate(total=Sum("delta")).values("total")
+    return Coalesce("foto_estoque__quantidade", Value(0)) + Coalesce(
+        Subquery(soma), Value(0)
+    )
+
+
+def saldos(produto_ids):
+    """Saldo do livro de cada produto ({id: quantidade})."""
+    return dict(
+        Produto.objects.filter(id__in=produto_ids)
+        .annotate(saldo=_saldo())
+        .values_list("id", "saldo")
+    )
+
+
+def fotografar(lote=1000, agora=None):
+    """
+    Atualiza a foto dos produtos que tiveram movimentos desde a última,
+    em lotes de `lote` produtos. Devolve quantos produtos foram fotografados.
+    """
+    agora = agora or timezone.now()
+    # Lidos de trás para frente pela chave primária: para no primeiro
+    # movimento mais velho que a folga, sem varrer a tabela.
+    ate = (
+        MovimentoEstoque.objects.filter(criado_em__lt=agora - FOLGA_FOTO)
+        .order_by("-id")
+        .values_list("id", flat=True)
+        .first()
+    )
+    desde = (
+        FotoEstoque.objects.order_by("-ultimo_movimento")
+        .values_list("ultimo_movimento", flat=True)
+        .first()
+    ) or 0
+    if ate is None or ate <= desde:
+        return 0
+
+    total = ultimo = 0
+    while True:
+        ids = list(
+            MovimentoEstoque.objects.filter(
+                id__gt=desde, id__lte=ate, produto_id__gt=ultimo
+            )
+            .order_by("produto_id")
+            .values_list("produto_id", flat=True)
+            .distinct()[:lote]
+        )
+        if not ids:
+            return total
+        FotoEstoque.objects.bulk_create(
+            [
+                FotoEstoque(
+                    produto_id=produto_id, quantidade=saldo, ultimo_movimento=ate
+                )
+                for produto_id, saldo in Produto.objects.filter(id__in=ids)
+                .annotate(saldo=_saldo(ate))
+                .values_list("id", "saldo")
+            ],
+            update_conflicts=True,
+            unique_fields=["produto"],
+            update_fields=["quantidade", "ultimo_movimento", "tirada_em"],
+        )
+        total += len(ids)
+        ultimo = ids[-1]
+
+
+def conciliar(lote=1000):
+    """
+    Percorre os produtos em lotes de `lote` ids e, para cada lote, devolve
+    (produtos conferidos, [(id, quantidade, saldo do livro), ...]) com os que
+    divergem. O estoque e o livro são lidos no mesmo SELECT, então uma venda
+    no meio da conciliação não aparece como divergência.
+    """
+    ultimo = 0
+    while True:
+        ids = list(
+            Produto.objects.filter(id__gt=ultimo)
+            .order_by("id")
+            .values_list("id", flat=True)[:lote]
+        )
+        if not ids:
+            return
+        divergentes = list(
+            Produto.objects.filter(id__in=ids)
+            .annotate(saldo=_saldo())
+            .exclude(saldo=F("quantidade"))
+            .order_by("id")
+            .values_list("id", "quantidade", "saldo")
+        )
+        yield len(ids), divergentes
+        ultimo = ids[-1]
+
+
+def corrigir(divergentes):
+    """Lança no livro a diferença de cada divergência, igualando o saldo ao estoque."""
+    MovimentoEstoque.objects.bulk_create(
+        MovimentoEstoque(
+            produto_id=produto_id, tipo=Tipo.CORRECAO, delta=quantidade - saldo
+        )
+        for produto_id, quantidade, saldo in divergentes
+    )
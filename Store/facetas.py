@@ -0,0 +1,158 @@
+# Store/facetas.py
+#
+# Filtros da home e das categorias (?vendedor=, ?faixa=, ?em_estoque=0) e as
+# contagens ao lado de cada opção. Os filtros viram WHERE em Produto, pelos
+# índices (subcategoria, preco) e da FK vendedor. As contagens não fazem um
+# COUNT em Produto por faceta: uma rodada em segundo plano (manage.py
+# atualizar_facetas, que o entrypoint.sh roda junto do gunicorn) agrupa os
+# produtos por subcategoria, vendedor, faixa de preço e estoque na tabela
+# FacetaProdutos, e a página lê as linhas das suas subcategorias numa query
+# só e soma em Python.
+#
+# Cada faceta conta com os outros filtros aplicados e sem o dela, então a
+# contagem de uma opção é quantos produtos a página mostraria ao escolhê-la.
+# Entre duas rodadas as contagens podem estar um pouco atrasadas em relação
+# à lista, que vem direto de Produto.
+
+from django.db import transaction
+from django.db.models import (
+    BooleanField,
+    Case,
+    Count,
+    ExpressionWrapper,
+    Q,
+    Value,
+    When,
+)
+from django.db.models.functions import Coalesce, NullIf
+
+from .models import FacetaProdutos, Produto
+
+# (rótulo, mínimo, máximo): mínimo <= preço < máximo
+FAIXAS_PRECO = (
+    ("Até R$ 50", None, 50),
+    ("R$ 50 a R$ 100", 50, 100),
+    ("R$ 100 a R$ 200", 100, 200),
+    ("R$ 200 a R$ 500", 200, 500),
+    ("Acima de R$ 500", 500, None),
+)
+
+
+def _inteiro(valor):
+    try:
+        return int(valor)
+    except (TypeError, ValueError):
+        return None
+
+
+def filtros(parametros):
+    """
+    Filtros válidos da query string; o que não for reconhecido é ignorado.
+    Sem ?em_estoque=0 a lista mostra só produtos em estoque, como sempre.
+    """
+    faixa = _inteiro(parametros.get("faixa"))
+    return {
+        "vendedor": _inteiro(parametros.get("vendedor")),
+        "faixa": faixa if faixa in range(len(FAIXAS_PRECO)) else None,
+        "em_estoque": parametros.get("em_estoque") != "0",
+    }
+
+
+def filtrar(produtos, filtros):
+    if filtros["vendedor"] is not None:
+        produtos = produtos.filter(vendedor_id=filtros["vendedor"])
+    if filtros["faixa"] is not None:
+        _, minimo, maximo = FAIXAS_PRECO[filtros["faixa"]]
+        if minimo is not None:
+            produtos = produtos.filter(preco__gte=minimo)
+        if maximo is not None:
+            produtos = produtos.filter(preco__lt=maximo)
+    if filtros["em_estoque"]:
+        produtos = produtos.filter(quantidade__gt=0)
+    return produtos
+
+
+def _faixa():
+    """Expressão com o índice da faixa de preço do produto em FAIXAS_PRECO."""
+    return Case(
+        *(
+            When(preco__lt=maximo, then=Value(indice))
+            for indice, (_, _, maximo) in enumerate(FAIXAS_PRECO)
+            if maximo is not None
+        ),
+        default=Value(len(FAIXAS_PRECO) - 1),
+    )
+
+
+def atualizar(lote=1000):
+    """
+    Refaz a tabela FacetaProdutos com um GROUP BY em Produto. A troca é numa
+    transação só, então a página nunca lê a tabela pela metade. Devolve
+    quantas linhas foram gravadas.
+    """
+    grupos = (
+        Produto.objects.annotate(
+            faixa=_faixa(),
+            estoque=ExpressionWrapper(Q(quantidade__gt=0), BooleanField()),
+            nome_vendedor=Coalesce(
+                NullIf("vendedor__first_name", Value("")), "vendedor__username"
+            ),
+        )
+        .values("subcategoria_id", "vendedor_id", "nome_vendedor", "faixa", "estoque")
+        .annotate(total=Count("id"))
+        .order_by()
+    )
+    linhas = [
+        FacetaProdutos(
+            subcategoria_id=grupo["subcategoria_id"],
+            vendedor_id=grupo["vendedor_id"],
+            vendedor_nome=grupo["nome_vendedor"],
+            faixa_preco=grupo["faixa"],
+            em_estoque=grupo["estoque"],
+            produtos=grupo["total"],
+        )
+        for grupo in grupos.iterator(chunk_size=lote)
+    ]
+    with transaction.atomic():
+        FacetaProdutos.objects.all().delete()
+        FacetaProdutos.objects.bulk_create(linhas, batch_size=lote)
+    return len(linhas)
+
+
+def contar(subcategoria_ids, filtros):
+    """
+    Contagens de cada faceta nas subcategorias dadas (None: a loja toda):
+    {"vendedores": [(id, nome, n)], "faixas": [n por faixa],
+    "estoque": {True: n, False: n}}. Uma query na tabela pré-calculada.
+    """
+    linhas = FacetaProdutos.objects.all()
+    if subcategoria_ids is not None:
+        linhas = linhas.filter(subcategoria_id__in=subcategoria_ids)
+
+    vendedores = {}
+    faixas = [0] * len(FAIXAS_PRECO)
+    estoque = {True: 0, False: 0}
+    for vendedor_id, nome, faixa, em_estoque, total in linhas.values_list(
+        "vendedor_id", "vendedor_nome", "faixa_preco", "em_estoque", "produtos"
+    ):
+        do_vendedor = filtros["vendedor"] in (None, vendedor_id)
+        da_faixa = filtros["faixa"] in (None, faixa)
+        no_estoque = em_estoque or not filtros["em_estoque"]
+        if da_faixa and no_estoque:
+            vendedores.setdefault(vendedor_id, [nome, 0])[1] += total
+        if do_vendedor and no_estoque and faixa < len(faixas):
+            faixas[faixa] += total
+        if do_vendedor and da_faixa:
+            estoque[em_estoque] += total
+
+    return {
+        "vendedores": sorted(
+            (
+                (vendedor_id, nome, total)
+                for vendedor_id, (nome, total) in vendedores.items()
+            ),
+            key=lambda vendedor: (-vendedor[2], vendedor[1]),
+        ),
+        "faixas": faixas,
+        "estoque": estoque,
+    }
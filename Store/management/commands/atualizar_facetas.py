@@ -0,0 +1,39 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from Store import facetas
+
+
+class Command(BaseCommand):
+    help = (
+        "Recalcula as contagens dos filtros da home e das categorias (produtos "
+        "por subcategoria, vendedor, faixa de preço e estoque). Com --intervalo "
+        "roda sem parar (o entrypoint.sh sobe assim junto do gunicorn)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--lote",
+            type=int,
+            default=1000,
+            help="Linhas por INSERT.",
+        )
+        parser.add_argument(
+            "--intervalo",
+            type=float,
+            default=0,
+            help="Segundos entre duas rodadas; 0 roda uma vez e sai.",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            inicio = time.perf_counter()
+            total = facetas.atualizar(lote=options["lote"])
+            if not options["intervalo"]:
+                duracao = time.perf_counter() - inicio
+                self.stdout.write(
+                    f"{total} linha(s) de facetas gravada(s) em {duracao:.1f}s"
+                )
+                return
+            time.sleep(options["intervalo"])
@@ -0,0 +1,41 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from Store import popularidade
+
+
+class Command(BaseCommand):
+    help = (
+        "Recalcula os rankings de popularidade (mais vendidos em 7 e 30 dias e "
+        "em alta pelas visualizações) dos produtos que podem ter mudado. Com "
+        "--intervalo roda sem parar (o entrypoint.sh sobe assim junto do "
+        "gunicorn)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--lote",
+            type=int,
+            default=1000,
+            help="Produtos por INSERT ... ON CONFLICT.",
+        )
+        parser.add_argument(
+            "--intervalo",
+            type=float,
+            default=0,
+            help="Segundos entre duas rodadas; 0 roda uma vez e sai.",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            inicio = time.perf_counter()
+            total = popularidade.atualizar(lote=options["lote"])
+            if total or not options["intervalo"]:
+                duracao = time.perf_counter() - inicio
+                self.stdout.write(
+                    f"Popularidade de {total} produto(s) atualizada em {duracao:.1f}s"
+                )
+            if not options["intervalo"]:
+                return
+            time.sleep(options["intervalo"])
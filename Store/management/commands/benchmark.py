@@ -0,0 +1,30 @@
+import subprocess
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from benchmarks import jornada
+from benchmarks.comum import BASE_DIR
+
+
+class Command(BaseCommand):
+    help = (
+        "Teste de carga da jornada de compra (home → categoria → produto → "
+        "carrinho → checkout → webhook) contra um banco populado e o stub do "
+        "Mercado Pago. Imprime vazão e latências p50/p95/p99 por etapa em JSON."
+    )
+
+    def add_arguments(self, parser):
+        jornada.argumentos(parser)
+
+    def handle(self, *args, **options):
+        # Roda em outro processo: o harness cria o próprio banco e aponta o
+        # Django para ele, o que não dá para fazer com o settings já carregado.
+        resultado = subprocess.run(
+            [sys.executable, "-m", "benchmarks.jornada", *jornada.argv_de(options)],
+            cwd=BASE_DIR,
+        )
+        if resultado.returncode:
+            raise CommandError(
+                f"O benchmark terminou com código {resultado.returncode}."
+            )
@@ -0,0 +1,52 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from Store import recomendacoes
+
+
+class Command(BaseCommand):
+    help = (
+        "Recalcula os 'comprados juntos' de cada produto a partir dos pedidos "
+        "aprovados recentes e grava os K melhores vizinhos na tabela "
+        "Recomendacao. Com --intervalo roda sem parar (o entrypoint.sh sobe "
+        "assim junto do gunicorn)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--k", type=int, help="Padrão: RECOMENDACOES_K.")
+        parser.add_argument("--dias", type=int, help="Padrão: RECOMENDACOES_DIAS.")
+        parser.add_argument(
+            "--minimo",
+            type=int,
+            default=recomendacoes.MIN_PEDIDOS_JUNTOS,
+            help="Pedidos em comum para um par virar recomendação.",
+        )
+        parser.add_argument(
+            "--lote", type=int, default=1000, help="Produtos por transação."
+        )
+        parser.add_argument(
+            "--intervalo",
+            type=float,
+            default=0,
+            help="Segundos entre duas rodadas; 0 roda uma vez e sai.",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            inicio = time.perf_counter()
+            produtos, linhas = recomendacoes.calcular(
+                dias=options["dias"] or settings.RECOMENDACOES_DIAS,
+                k=options["k"] or settings.RECOMENDACOES_K,
+                minimo=options["minimo"],
+                lote=options["lote"],
+            )
+            duracao = time.perf_counter() - inicio
+            self.stdout.write(
+                f"Recomendações de {produtos} produto(s) ({linhas} linhas) "
+                f"calculadas em {duracao:.1f}s"
+            )
+            if not options["intervalo"]:
+                return
+            time.sleep(options["intervalo"])
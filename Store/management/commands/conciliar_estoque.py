@@ -0,0 +1,53 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from Store import estoque
+
+
+class Command(BaseCommand):
+    help = (
+        "Compara o estoque de cada produto (Produto.quantidade) com o saldo do "
+        "livro-razão (última foto + movimentos depois dela), em lotes, e lista "
+        "as divergências. Com --corrigir lança um movimento de correção para "
+        "cada uma."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--lote", type=int, default=1000, help="Produtos por SELECT."
+        )
+        parser.add_argument(
+            "--limite", type=int, default=20, help="Quantas divergências mostrar."
+        )
+        parser.add_argument(
+            "--corrigir",
+            action="store_true",
+            help="Iguala o livro ao estoque com movimentos de correção.",
+        )
+
+    def handle(self, *args, **options):
+        inicio = time.perf_counter()
+        conferidos = divergentes = 0
+        for total, lote in estoque.conciliar(options["lote"]):
+            conferidos += total
+            for produto_id, quantidade, saldo in lote:
+                if divergentes < options["limite"]:
+                    self.stdout.write(
+                        self.style.WARNING(
+                            f"Produto {produto_id}: estoque {quantidade}, "
+                            f"livro {saldo} ({quantidade - saldo:+d})"
+                        )
+                    )
+                divergentes += 1
+            if options["corrigir"] and lote:
+                estoque.corrigir(lote)
+
+        duracao = time.perf_counter() - inicio
+        resumo = (
+            f"{conferidos} produtos conferidos em {duracao:.1f}s, "
+            f"{divergentes} divergente(s)"
+        )
+        if options["corrigir"] and divergentes:
+            resumo += ", corrigidos no livro"
+        self.stdout.write(self.style.SUCCESS(resumo) if not divergentes else resumo)
@@ -0,0 +1,58 @@
+from django.core.management.base import BaseCommand
+
+from Core import consultas_lentas
+
+
+class Command(BaseCommand):
+    help = (
+        "Mostra as queries lentas e repetidas (N+1) registradas pelos workers, "
+        "agrupadas por forma do SQL, view e linha de origem."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--limite", type=int, default=20, help="Quantas entradas mostrar."
+        )
+        parser.add_argument(
+            "--ordem",
+            choices=("tempo", "execucoes", "repeticoes"),
+            default="tempo",
+            help="Ordena por tempo total, execuções ou máximo por requisição.",
+        )
+        parser.add_argument(
+            "--limpar",
+            action="store_true",
+            help="Apaga o registro depois de mostrar o relatório.",
+        )
+
+    def handle(self, *args, **options):
+        chaves = {
+            "tempo": "tempo_total",
+            "execucoes": "execucoes",
+            "repeticoes": "max_por_requisicao",
+        }
+        entradas = sorted(
+            consultas_lentas.relatorio(),
+            key=lambda entrada: entrada[chaves[options["ordem"]]],
+            reverse=True,
+        )
+
+        if not entradas:
+            self.stdout.write("Nenhuma query lenta ou repetida registrada.")
+        for posicao, entrada in enumerate(entradas[: options["limite"]], start=1):
+            self.stdout.write(
+                self.style.WARNING(
+                    f"#{posicao} {entrada['tempo_total'] * 1000:.1f} ms no total, "
+                    f"{entrada['execucoes']} execuções "
+                    f"({entrada['lentas']} lentas, até {entrada['max_por_requisicao']} "
+                    f"por requisição, máx. {entrada['tempo_max'] * 1000:.1f} ms)"
+                )
+            )
+            self.stdout.write(f"   view:   {entrada['view']}")
+            self.stdout.write(f"   origem: {entrada['origem']}")
+            self.stdout.write(f"   sql:    {entrada['forma']}")
+            self.stdout.write("")
+
+        if options["limpar"]:
+            consultas_lentas.limpar()
+            self.stdout.write(self.style.SUCCESS("Registro de queries apagado."))
@@ -0,0 +1,65 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from Store import manutencao
+
+
+class Command(BaseCommand):
+    help = (
+        "Limpa as tabelas quentes da loja em lotes curtos: expira pedidos "
+        "pendentes abandonados (devolvendo o estoque reservado), apaga os "
+        "expirados antigos, as linhas de carrinho abandonadas e as reservas "
+        "vencidas. Com --intervalo roda sem parar (o entrypoint.sh sobe assim "
+        "junto do gunicorn)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--lote", type=int, default=1000, help="Linhas por UPDATE/DELETE."
+        )
+        parser.add_argument(
+            "--pedido-ttl-horas",
+            type=int,
+            help="Padrão: PEDIDO_PENDENTE_TTL_HORAS.",
+        )
+        parser.add_argument(
+            "--em-pagamento-ttl-dias",
+            type=int,
+            help="Padrão: PEDIDO_EM_PAGAMENTO_TTL_DIAS.",
+        )
+        parser.add_argument(
+            "--retencao-dias",
+            type=int,
+            help="Padrão: PEDIDO_EXPIRADO_RETENCAO_DIAS.",
+        )
+        parser.add_argument(
+            "--carrinho-dias", type=int, help="Padrão: CARRINHO_ABANDONADO_DIAS."
+        )
+        parser.add_argument(
+            "--intervalo",
+            type=float,
+            default=0,
+            help="Segundos entre duas rodadas; 0 roda uma vez e sai.",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            inicio = time.perf_counter()
+            contagens = manutencao.executar(
+                lote=options["lote"],
+                pedido_ttl_horas=options["pedido_ttl_horas"],
+                em_pagamento_ttl_dias=options["em_pagamento_ttl_dias"],
+                retencao_dias=options["retencao_dias"],
+                carrinho_dias=options["carrinho_dias"],
+            )
+            # No modo contínuo só reporta as rodadas que fizeram alguma coisa
+            if any(contagens.values()) or not options["intervalo"]:
+                resumo = ", ".join(
+                    f"{nome}={total}" for nome, total in contagens.items()
+                )
+                duracao = time.perf_counter() - inicio
+                self.stdout.write(f"Manutenção em {duracao:.1f}s: {resumo}")
+            if not options["intervalo"]:
+                return
+            time.sleep(options["intervalo"])
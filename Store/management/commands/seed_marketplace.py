@@ -0,0 +1,357 @@
+import random
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import timedelta
+from decimal import Decimal
+from itertools import islice
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import reset_queries
+from django.utils import timezone
+
+from Store import autocompletar
+from Store.models import (
+    Carrinho,
+    Categoria,
+    ItemCarrinho,
+    ItemOrder,
+    MovimentoEstoque,
+    Order,
+    Produto,
+    Subcategoria,
+)
+from Usuario.models import Profile
+
+CATEGORIAS = [
+    "Eletrônicos",
+    "Livros",
+    "Roupas",
+    "Casa",
+    "Esportes",
+    "Beleza",
+    "Brinquedos",
+    "Informática",
+    "Papelaria",
+    "Alimentos",
+]
+SUBSTANTIVOS = [
+    "Caderno",
+    "Fone",
+    "Camiseta",
+    "Caneca",
+    "Mochila",
+    "Luminária",
+    "Tênis",
+    "Livro",
+    "Teclado",
+    "Garrafa",
+    "Relógio",
+    "Estojo",
+]
+ADJETIVOS = [
+    "Azul",
+    "Clássico",
+    "Compacto",
+    "Premium",
+    "Básico",
+    "Esportivo",
+    "Universitário",
+    "Sem Fio",
+    "Reciclado",
+    "Térmico",
+]
+STATUS_PEDIDO = ["approved"] * 7 + ["pendente"] * 2 + ["rejected"]
+
+
+def _lotes(objetos, tamanho):
+    """Quebra um gerador em listas de até `tamanho` itens, sem materializá-lo."""
+    objetos = iter(objetos)
+    while lote := list(islice(objetos, tamanho)):
+        yield lote
+        # Com DEBUG=True o Django guarda o SQL de cada query (aqui, INSERTs
+        # com milhares de linhas), o que faria a memória crescer a cada lote.
+        reset_queries()
+
+
+@contextmanager
+def _sem_auto_now_add(model, campo):
+    # Os pedidos são históricos: a data vem do gerador, não do relógio
+    field = model._meta.get_field(campo)
+    field.auto_now_add = False
+    try:
+        yield
+    finally:
+        field.auto_now_add = True
+
+
+def _preco(indice):
+    # Determinístico a partir do índice, para o pedido saber o preço do
+    # produto sem consultar o banco.
+    return Decimal(499 + (indice * 7919) % 49500) / 100
+
+
+class Command(BaseCommand):
+    help = (
+        "Gera um marketplace sintético para testes de escala: compradores, "
+        "vendedores com perfil, categorias, produtos, carrinhos e histórico de "
+        "pedidos. Insere em lotes com bulk_create e usa memória constante, "
+        "qualquer que seja o número de linhas. Com a mesma --semente os dados "
+        "gerados são os mesmos."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--compradores", type=int, default=10_000)
+        parser.add_argument("--vendedores", type=int, default=500)
+        parser.add_argument("--categorias", type=int, default=10)
+        parser.add_argument(
+            "--subcategorias", type=int, default=5, help="Por categoria."
+        )
+        parser.add_argument("--produtos", type=int, default=100_000)
+        parser.add_argument("--carrinhos", type=int, default=2_000)
+        parser.add_argument("--itens-carrinho", type=int, default=5)
+        parser.add_argument("--pedidos", type=int, default=50_000)
+        parser.add_argument("--itens-pedido", type=int, default=3)
+        parser.add_argument(
+            "--dias", type=int, default=365, help="Período do histórico de pedidos."
+        )
+        parser.add_argument("--lote", type=int, default=5_000)
+        parser.add_argument("--semente", type=int, default=42)
+        parser.add_argument(
+            "--prefixo",
+            default="seed",
+            help="Prefixo dos usernames (permite rodar mais de uma vez).",
+        )
+        parser.add_argument(
+            "--senha", default="seed123", help="Senha de todos os usuários gerados."
+        )
+
+    def handle(self, *args, **options):
+        self.opcoes = options
+        self.lote = options["lote"]
+        self.sorteio = random.Random(options["semente"])
+        prefixo = options["prefixo"]
+
+        if options["carrinhos"] > options["compradores"]:
+            raise CommandError("--carrinhos não pode passar de --compradores.")
+        if User.objects.filter(username__startswith=f"{prefixo}_").exists():
+            raise CommandError(
+                f'Já existem usuários com o prefixo "{prefixo}"; use outro --prefixo.'
+            )
+
+        # Um hash só para todos: calcular o PBKDF2 por usuário levaria horas
+        self.senha = make_password(options["senha"])
+
+        self.vendedores = self._criar_usuarios(
+            "vendedor",
+            options["vendedores"],
+            vendedor=True,
+            mp_connected=True,
+            mp_access_token="SEED-SELLER-TOKEN",
+        )
+        self.compradores = self._criar_usuarios("comprador", options["compradores"])
+        self.subcategorias = self._criar_categorias()
+        self.produtos = self._criar_produtos()
+        self._criar_carrinhos()
+        self._criar_pedidos()
+        # bulk_create não dispara os sinais que atualizam o autocompletar
+        self.stdout.write(f"Autocompletar: {autocompletar.reconstruir()} itens")
+
+    # Cada tabela grande é inserida em lotes a partir de um gerador. Os ids
+    # de cada lote são conferidos para garantir que formam uma faixa
+    # contínua; assim um produto/usuário é referenciado por índice
+    # (primeiro_id + i) sem guardar os objetos em memória.
+
+    def _inserir(self, model, objetos, total, depois=None, rotulo=None):
+        inicio = time.perf_counter()
+        primeiro = esperado = None
+        for lote in _lotes(objetos, self.lote):
+            model.objects.bulk_create(lote)
+            if primeiro is None:
+                if lote[0].pk is None:
+                    raise CommandError(
+                        "O banco não devolveu os ids do bulk_create "
+                        "(é preciso SQLite 3.35+ ou PostgreSQL)."
+                    )
+                primeiro = esperado = lote[0].pk
+            if lote[0].pk != esperado or lote[-1].pk != esperado + len(lote) - 1:
+                raise CommandError(
+                    f"Ids de {model.__name__} fora de sequência; rode o comando "
+                    "sem outras escritas simultâneas no banco."
+                )
+            esperado += len(lote)
+            if depois:
+                depois(lote)
+        self._progresso(rotulo or model.__name__, total, inicio)
+        return primeiro
+
+    def _progresso(self, rotulo, total, inicio):
+        duracao = time.perf_counter() - inicio
+        self.stdout.write(
+            f"{rotulo}: {total} linhas em {duracao:.1f}s "
+            f"({total / duracao if duracao else 0:.0f}/s)"
+        )
+
+    def _criar_usuarios(self, tipo, quantidade, **perfil):
+        prefixo = self.opcoes["prefixo"]
+
+        def criar_perfis(usuarios):
+            # bulk_create não dispara o post_save que cria o perfil
+            Profile.objects.bulk_create(Profile(usuario=u, **perfil) for u in usuarios)
+
+        primeiro = self._inserir(
+            User,
+            (
+                User(
+                    username=f"{prefixo}_{tipo}_{i}",
+                    first_name=f"{tipo.title()} {i}",
+                    email=f"{prefixo}_{tipo}_{i}@exemplo.com",
+                    password=self.senha,
+                )
+                for i in range(quantidade)
+            ),
+            quantidade,
+            depois=criar_perfis,
+            rotulo=f"User ({tipo}s)",
+        )
+        return range(primeiro, primeiro + quantidade) if quantidade else range(0)
+
+    def _criar_categorias(self):
+        categorias = Categoria.objects.bulk_create(
+            Categoria(
+                nome=CATEGORIAS[i % len(CATEGORIAS)]
+                + (f" {i // len(CATEGORIAS) + 1}" if i >= len(CATEGORIAS) else "")
+            )
+            for i in range(self.opcoes["categorias"])
+        )
+        subcategorias = Subcategoria.objects.bulk_create(
+            Subcategoria(nome=f"{categoria.nome} {j + 1}", categoria_pai=categoria)
+            for categoria in categorias
+            for j in range(self.opcoes["subcategorias"])
+        )
+        return [subcategoria.id for subcategoria in subcategorias]
+
+    def _criar_produtos(self):
+        total = self.opcoes["produtos"]
+        if total and not (self.vendedores and self.subcategorias):
+            raise CommandError("Produtos precisam de vendedores e subcategorias.")
+        sorteio = self.sorteio
+        vendedores = self.vendedores
+
+        def abrir_livro(produtos):
+            # O estoque inicial entra no livro, senão a conciliação acusa tudo
+            MovimentoEstoque.objects.bulk_create(
+                MovimentoEstoque(
+                    produto=p, tipo=MovimentoEstoque.Tipo.CADASTRO, delta=p.quantidade
+                )
+                for p in produtos
+                if p.quantidade
+            )
+
+        primeiro = self._inserir(
+            Produto,
+            (
+                Produto(
+                    nome=f"{sorteio.choice(SUBSTANTIVOS)} {sorteio.choice(ADJETIVOS)} {i}",
+                    descricao="Produto gerado pelo seed_marketplace.",
+                    preco=_preco(i),
+                    quantidade=sorteio.randint(0, 500),
+                    subcategoria_id=sorteio.choice(self.subcategorias),
+                    # O vendedor do produto i é o i-ésimo módulo o número de
+                    # vendedores: os pedidos acham os produtos de um vendedor
+                    # sem consultar o banco.
+                    vendedor_id=vendedores[i % len(vendedores)],
+                    imagem="uploads/produtos/seed.jpg",
+                )
+                for i in range(total)
+            ),
+            total,
+            depois=abrir_livro,
+        )
+        return range(primeiro, primeiro + total) if total else range(0)
+
+    def _sortear_produtos(self, quantidade, vendedor=None):
+        """Índices distintos de produtos, opcionalmente de um vendedor só."""
+        if vendedor is None:
+            candidatos = range(len(self.produtos))
+        else:
+            candidatos = range(vendedor, len(self.produtos), len(self.vendedores))
+        return self.sorteio.sample(candidatos, min(quantidade, len(candidatos)))
+
+    def _criar_carrinhos(self):
+        if not self.produtos:
+            return
+        compradores = self.compradores
+        primeiro = self._inserir(
+            Carrinho,
+            (
+                Carrinho(usuario_id=compradores[i])
+                for i in range(self.opcoes["carrinhos"])
+            ),
+            self.opcoes["carrinhos"],
+        )
+        inicio = time.perf_counter()
+        total = 0
+        for lote in _lotes(
+            (
+                ItemCarrinho(
+                    carrinho_id=primeiro + i,
+                    produto_id=self.produtos[indice],
+                    quantidade=self.sorteio.randint(1, 3),
+                )
+                for i in range(self.opcoes["carrinhos"])
+                for indice in self._sortear_produtos(self.opcoes["itens_carrinho"])
+            ),
+            self.lote,
+        ):
+            ItemCarrinho.objects.bulk_create(lote)
+            total += len(lote)
+        self._progresso("ItemCarrinho", total, inicio)
+
+    def _criar_pedidos(self):
+        if not (self.produtos and self.compradores):
+            return
+        sorteio = self.sorteio
+        prefixo = self.opcoes["prefixo"]
+        agora = timezone.now()
+        periodo = timedelta(days=self.opcoes["dias"]).total_seconds()
+        inicio = time.perf_counter()
+        total_itens = 0
+
+        with _sem_auto_now_add(Order, "data"):
+            for lote in _lotes(range(self.opcoes["pedidos"]), self.lote):
+                pedidos = []
+                itens = []
+                for numero in lote:
+                    vendedor = sorteio.randrange(len(self.vendedores))
+                    pedido = Order(
+                        # Determinístico, mas diferente para cada --prefixo
+                        id=uuid.uuid5(uuid.NAMESPACE_URL, f"seed/{prefixo}/{numero}"),
+                        vendedor_id=self.vendedores[vendedor],
+                        comprador_id=sorteio.choice(self.compradores),
+                        status_pagamento=sorteio.choice(STATUS_PEDIDO),
+                        data=agora - timedelta(seconds=sorteio.random() * periodo),
+                    )
+                    valor_total = Decimal("0.00")
+                    for indice in self._sortear_produtos(
+                        sorteio.randint(1, self.opcoes["itens_pedido"]), vendedor
+                    ):
+                        item = ItemOrder(
+                            order=pedido,
+                            produto_id=self.produtos[indice],
+                            quantidade=sorteio.randint(1, 3),
+                            preco=_preco(indice),
+                        )
+                        valor_total += item.subtotal
+                        itens.append(item)
+                    pedido.valor_total_pedido = valor_total
+                    pedidos.append(pedido)
+
+                Order.objects.bulk_create(pedidos)
+                ItemOrder.objects.bulk_create(itens)
+                total_itens += len(itens)
+
+        self._progresso("Order", self.opcoes["pedidos"], inicio)
+        self.stdout.write(f"ItemOrder: {total_itens} linhas")
@@ -0,0 +1,129 @@
+# Store/manutencao.py
+#
+# Limpeza periódica das tabelas quentes da loja (manage.py manutencao):
+#
+# - pedidos que ficaram pendentes por mais de PEDIDO_PENDENTE_TTL_HORAS sem
+#   nenhum pagamento no Mercado Pago (o comprador abandonou o checkout)
+#   passam a "expirado" e devolvem o estoque reservado;
+# - pedidos com um pagamento ainda em aberto no Mercado Pago ("pending" ou
+#   "in_process": boleto, PIX em análise) só expiram depois de
+#   PEDIDO_EM_PAGAMENTO_TTL_DIAS, porque esses pagamentos costumam levar dias;
+# - pedidos expirados são apagados quando passam PEDIDO_EXPIRADO_RETENCAO_DIAS
+#   além do prazo de expiração mais longo;
+# - linhas de carrinho paradas há mais de CARRINHO_ABANDONADO_DIAS são
+#   apagadas;
+# - reservas de estoque vencidas são apagadas (Store/reservas.py);
+# - os produtos com movimentos novos no livro do estoque ganham uma foto
+#   nova do saldo (Store/estoque.py).
+#
+# Tudo em lotes: cada lote é um SELECT dos ids pelo índice e um UPDATE/DELETE
+# curto na sua própria transação, então a limpeza não segura o banco nem
+# disputa as linhas com as requisições por muito tempo.
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from . import estoque, reservas
+from .models import ItemCarrinho, Order, Reserva
+
+# Status em que o pedido ainda espera o pagamento: o inicial, antes de o
+# Mercado Pago avisar de qualquer pagamento, e os de um pagamento em aberto
+# (só chegam pelo webhook, então o pedido já tem um pagamento no MP)
+STATUS_SEM_PAGAMENTO = ("pendente",)
+STATUS_EM_PAGAMENTO = ("pending", "in_process")
+STATUS_PENDENTES = STATUS_SEM_PAGAMENTO + STATUS_EM_PAGAMENTO
+EXPIRADO = "expirado"
+
+
+def _em_lotes(queryset, lote, acao):
+    """
+    Chama acao(ids) com lotes de até `lote` ids do queryset até ele ficar
+    vazio e soma o que acao devolve. A acao precisa tirar os ids do
+    queryset (apagando ou mudando o status), senão o laço não termina.
+    """
+    total = 0
+    while True:
+        ids = list(queryset.values_list("id", flat=True)[:lote])
+        if not ids:
+            return total
+        with transaction.atomic():
+            total += acao(ids)
+
+
+def expirar_pedidos(horas, lote, agora, status=STATUS_SEM_PAGAMENTO):
+    """Expira os pedidos em `status` criados há mais de `horas`."""
+
+    def expirar(ids):
+        Reserva.objects.filter(order_id__in=ids).delete()
+        # O status entra no filtro de novo: um webhook que aprovou o pedido
+        # depois do SELECT não é desfeito.
+        return Order.objects.filter(id__in=ids, status_pagamento__in=status).update(
+            status_pagamento=EXPIRADO
+        )
+
+    return _em_lotes(
+        Order.objects.filter(
+            status_pagamento__in=status,
+            data__lt=agora - timedelta(hours=horas),
+        ),
+        lote,
+        expirar,
+    )
+
+
+def apagar_pedidos_expirados(dias, lote, agora):
+    return _em_lotes(
+        Order.objects.filter(
+            status_pagamento=EXPIRADO, data__lt=agora - timedelta(days=dias)
+        ),
+        lote,
+        lambda ids: Order.objects.filter(id__in=ids).delete()[1].get("Store.Order", 0),
+    )
+
+
+def limpar_carrinhos(dias, lote, agora):
+    return _em_lotes(
+        ItemCarrinho.objects.filter(atualizado_em__lt=agora - timedelta(days=dias)),
+        lote,
+        lambda ids: ItemCarrinho.objects.filter(id__in=ids).delete()[0],
+    )
+
+
+def executar(
+    lote=1000,
+    pedido_ttl_horas=None,
+    em_pagamento_ttl_dias=None,
+    retencao_dias=None,
+    carrinho_dias=None,
+    agora=None,
+):
+    """Roda todas as limpezas e devolve quantas linhas cada uma tratou."""
+    agora = agora or timezone.now()
+    em_pagamento_ttl_dias = (
+        em_pagamento_ttl_dias or settings.PEDIDO_EM_PAGAMENTO_TTL_DIAS
+    )
+    return {
+        "pedidos_expirados": expirar_pedidos(
+            pedido_ttl_horas or settings.PEDIDO_PENDENTE_TTL_HORAS, lote, agora
+        ),
+        "pagamentos_em_aberto_expirados": expirar_pedidos(
+            24 * em_pagamento_ttl_dias, lote, agora, STATUS_EM_PAGAMENTO
+        ),
+        # A retenção conta da data do pedido: somar o prazo mais longo de
+        # expiração garante que um pedido que acabou de expirar ainda fique
+        # a retenção inteira (um webhook atrasado ainda o encontra)
+        "pedidos_apagados": apagar_pedidos_expirados(
+            (retencao_dias or settings.PEDIDO_EXPIRADO_RETENCAO_DIAS)
+            + em_pagamento_ttl_dias,
+            lote,
+            agora,
+        ),
+        "itens_carrinho_apagados": limpar_carrinhos(
+            carrinho_dias or settings.CARRINHO_ABANDONADO_DIAS, lote, agora
+        ),
+        "reservas_vencidas_apagadas": reservas.expirar(lote=lote, agora=agora),
+        "produtos_fotografados": estoque.fotografar(lote=lote, agora=agora),
+    }
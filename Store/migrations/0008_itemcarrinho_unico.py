@@ -0,0 +1,38 @@
+# Generated by Django 5.2.1 on 2026-10-19 12:48
+
+from django.db import migrations, models
+from django.db.models import Count, Min, Sum
+
+
+def juntar_linhas_duplicadas(apps, schema_editor):
+    # O get_or_create sem restrição podia criar duas linhas para o mesmo
+    # produto em requisições simultâneas: soma as quantidades na primeira.
+    ItemCarrinho = apps.get_model("Store", "ItemCarrinho")
+    duplicadas = (
+        ItemCarrinho.objects.values("carrinho_id", "produto_id")
+        .annotate(linhas=Count("id"), primeira=Min("id"), total=Sum("quantidade"))
+        .filter(linhas__gt=1)
+    )
+    for grupo in duplicadas:
+        linhas = ItemCarrinho.objects.filter(
+            carrinho_id=grupo["carrinho_id"], produto_id=grupo["produto_id"]
+        )
+        linhas.exclude(id=grupo["primeira"]).delete()
+        linhas.update(quantidade=grupo["total"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("Store", "0007_remove_produto_categoria_produto_subcategoria"),
+    ]
+
+    operations = [
+        migrations.RunPython(juntar_linhas_duplicadas, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name="itemcarrinho",
+            constraint=models.UniqueConstraint(
+                fields=("carrinho", "produto"), name="item_carrinho_unico"
+            ),
+        ),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 5.2.1 on 2026-10-19 12:51
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("Store", "0008_itemcarrinho_unico"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Reserva",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("quantidade", models.PositiveIntegerField()),
+                ("expira_em", models.DateTimeField()),
+                (
+                    "order",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="reservas",
+                        to="Store.order",
+                    ),
+                ),
+                (
+                    "produto",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="reservas",
+                        to="Store.produto",
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["produto", "expira_em"], name="reserva_produto_expira"
+                    ),
+                    models.Index(fields=["expira_em"], name="reserva_expira"),
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.1 on 2026-10-19 12:54
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("Store", "0009_reserva"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="itemcarrinho",
+            name="atualizado_em",
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddIndex(
+            model_name="itemcarrinho",
+            index=models.Index(
+                fields=["atualizado_em"], name="itemcarrinho_atualizado"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="order",
+            index=models.Index(
+                fields=["status_pagamento", "data"], name="order_status_data"
+            ),
+        ),
+    ]
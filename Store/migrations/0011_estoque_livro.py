@@ -0,0 +1,94 @@
+# Generated by Django 5.2.1 on 2026-10-19 12:57
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+CADASTRO = 1
+
+
+def abrir_livro(apps, schema_editor):
+    # O estoque que já existe entra no livro como o movimento de cadastro de
+    # cada produto, em lotes para não carregar a tabela inteira.
+    Produto = apps.get_model("Store", "Produto")
+    MovimentoEstoque = apps.get_model("Store", "MovimentoEstoque")
+    lote = []
+    for produto_id, quantidade in (
+        Produto.objects.order_by("id").values_list("id", "quantidade").iterator(2000)
+    ):
+        lote.append(
+            MovimentoEstoque(produto_id=produto_id, tipo=CADASTRO, delta=quantidade)
+        )
+        if len(lote) == 2000:
+            MovimentoEstoque.objects.bulk_create(lote)
+            lote = []
+    MovimentoEstoque.objects.bulk_create(lote)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("Store", "0010_manutencao"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="FotoEstoque",
+            fields=[
+                (
+                    "produto",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="foto_estoque",
+                        serialize=False,
+                        to="Store.produto",
+                    ),
+                ),
+                ("quantidade", models.IntegerField()),
+                ("ultimo_movimento", models.BigIntegerField(db_index=True)),
+                ("tirada_em", models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name="MovimentoEstoque",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "tipo",
+                    models.PositiveSmallIntegerField(
+                        choices=[
+                            (1, "Cadastro"),
+                            (2, "Venda"),
+                            (3, "Reposição"),
+                            (4, "Ajuste manual"),
+                            (5, "Correção da conciliação"),
+                        ]
+                    ),
+                ),
+                ("delta", models.IntegerField()),
+                ("criado_em", models.DateTimeField(auto_now_add=True)),
+                (
+                    "produto",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="movimentos",
+                        to="Store.produto",
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(fields=["produto", "id"], name="movimento_produto_id")
+                ],
+            },
+        ),
+        migrations.RunPython(abrir_livro, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.1 on 2026-10-19 13:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("Store", "0011_estoque_livro"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ContadorProduto",
+            fields=[
+                (
+                    "produto",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="contador",
+                        serialize=False,
+                        to="Store.produto",
+                    ),
+                ),
+                ("visualizacoes", models.PositiveBigIntegerField(default=0)),
+                ("adicoes_carrinho", models.PositiveBigIntegerField(default=0)),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["-visualizacoes"], name="contador_visualizacoes"
+                    ),
+                    models.Index(fields=["-adicoes_carrinho"], name="contador_adicoes"),
+                ],
+            },
+        ),
+    ]
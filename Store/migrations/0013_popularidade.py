@@ -0,0 +1,43 @@
+# Generated by Django 5.2.1 on 2026-10-19 13:02
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("Store", "0012_contador_produto"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Popularidade",
+            fields=[
+                (
+                    "produto",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="popularidade",
+                        serialize=False,
+                        to="Store.produto",
+                    ),
+                ),
+                ("vendas_7d", models.PositiveIntegerField(default=0)),
+                ("vendas_30d", models.PositiveIntegerField(default=0)),
+                ("em_alta", models.FloatField(default=0)),
+                ("visualizacoes_vistas", models.PositiveBigIntegerField(default=0)),
+                ("atualizado_em", models.DateTimeField()),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["-vendas_30d"], name="popularidade_vendas_30d"
+                    ),
+                    models.Index(fields=["-vendas_7d"], name="popularidade_vendas_7d"),
+                    models.Index(fields=["-em_alta"], name="popularidade_em_alta"),
+                ],
+            },
+        ),
+    ]
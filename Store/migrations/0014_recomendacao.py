@@ -0,0 +1,57 @@
+# Generated by Django 5.2.1 on 2026-10-19 13:04
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("Store", "0013_popularidade"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Recomendacao",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("posicao", models.PositiveSmallIntegerField()),
+                ("pontuacao", models.FloatField()),
+                ("gerada_em", models.DateTimeField()),
+                (
+                    "produto",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="recomendacoes",
+                        to="Store.produto",
+                    ),
+                ),
+                (
+                    "recomendado",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="recomendado_em",
+                        to="Store.produto",
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(fields=["gerada_em"], name="recomendacao_gerada_em")
+                ],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("produto", "posicao"), name="recomendacao_posicao_unica"
+                    )
+                ],
+            },
+        ),
+    ]
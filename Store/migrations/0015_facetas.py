@@ -0,0 +1,82 @@
+# Generated by Django 5.2.1 on 2026-10-19 13:08
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("Store", "0014_recomendacao"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="FacetaProdutos",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("vendedor_nome", models.CharField(max_length=150)),
+                ("faixa_preco", models.PositiveSmallIntegerField()),
+                ("em_estoque", models.BooleanField()),
+                ("produtos", models.PositiveIntegerField()),
+            ],
+        ),
+        migrations.AddField(
+            model_name="produto",
+            name="criado_em",
+            field=models.DateTimeField(
+                auto_now_add=True, default=django.utils.timezone.now
+            ),
+            preserve_default=False,
+        ),
+        migrations.AddIndex(
+            model_name="produto",
+            index=models.Index(
+                fields=["subcategoria", "preco"], name="produto_subcategoria_preco"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="produto",
+            index=models.Index(
+                fields=["subcategoria", "-criado_em"],
+                name="produto_subcategoria_criado",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="produto",
+            index=models.Index(fields=["preco"], name="produto_preco"),
+        ),
+        migrations.AddIndex(
+            model_name="produto",
+            index=models.Index(fields=["-criado_em"], name="produto_criado_em"),
+        ),
+        migrations.AddField(
+            model_name="facetaprodutos",
+            name="subcategoria",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="facetas",
+                to="Store.subcategoria",
+            ),
+        ),
+        migrations.AddField(
+            model_name="facetaprodutos",
+            name="vendedor",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="+",
+                to=settings.AUTH_USER_MODEL,
+            ),
+        ),
+    ]
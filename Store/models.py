@@ -31,6 +31,22 @@ class Produto(models.Model):
     vendedor = models.ForeignKey(
         User, related_name="produtos", on_delete=models.CASCADE
     )
+    criado_em = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            # Filtros e ordenações da home e das categorias (Store/facetas.py).
+            # O filtro por vendedor usa o índice que o Django já cria na FK.
+            models.Index(
+                fields=["subcategoria", "preco"], name="produto_subcategoria_preco"
+            ),
+            models.Index(
+                fields=["subcategoria", "-criado_em"],
+                name="produto_subcategoria_criado",
+            ),
+            models.Index(fields=["preco"], name="produto_preco"),
+            models.Index(fields=["-criado_em"], name="produto_criado_em"),
+        ]
 
     def __str__(self):
         return self.nome
@@ -51,6 +67,21 @@ class ItemCarrinho(models.Model):
     )
     produto = models.ForeignKey(Produto, on_delete=models.CASCADE)
     quantidade = models.PositiveIntegerField(default=0)
+    # Última mudança na linha; a manutenção apaga as paradas há muito tempo
+    atualizado_em = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["atualizado_em"], name="itemcarrinho_atualizado"),
+        ]
+        constraints = [
+            # Uma linha por produto: é o alvo do INSERT ... ON CONFLICT que
+            # soma quantidades (ver Store/carrinho_sql.py). O índice único
+            # também atende as buscas por (carrinho, produto).
+            models.UniqueConstraint(
+                fields=["carrinho", "produto"], name="item_carrinho_unico"
+            ),
+        ]
 
     def subtotal(self):
         return self.produto.preco * self.quantidade
@@ -70,6 +101,12 @@ class Order(models.Model):
     status_pagamento = models.CharField(max_length=50, default="pendente")
     data = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # Manutenção: pedidos num status e mais antigos que uma data
+            models.Index(fields=["status_pagamento", "data"], name="order_status_data"),
+        ]
+
     def __str__(self):
         return f"Pedido {str(self.id)} - {self.comprador.username}"
 
@@ -95,6 +132,167 @@ class ItemOrder(models.Model):
         return f"{self.produto.nome} - {self.quantidade} unidades"
 
 
+class Reserva(models.Model):
+    # Unidades seguradas por um pedido entre o checkout e a aprovação do
+    # pagamento (ver Store/reservas.py). Depois de expira_em a reserva deixa
+    # de contar e é apagada pela limpeza periódica.
+    order = models.ForeignKey(Order, related_name="reservas", on_delete=models.CASCADE)
+    produto = models.ForeignKey(
+        Produto, related_name="reservas", on_delete=models.CASCADE
+    )
+    quantidade = models.PositiveIntegerField()
+    expira_em = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            # Soma das reservas ativas de um produto: produto = X AND expira_em > agora
+            models.Index(
+                fields=["produto", "expira_em"], name="reserva_produto_expira"
+            ),
+            # Limpeza das vencidas: expira_em <= agora
+            models.Index(fields=["expira_em"], name="reserva_expira"),
+        ]
+
+    def __str__(self):
+        return f"{self.quantidade}x {self.produto_id} até {self.expira_em}"
+
+
+class MovimentoEstoque(models.Model):
+    # Livro-razão do estoque (ver Store/estoque.py): cada mudança em
+    # Produto.quantidade vira uma linha nova, nunca alterada. Linhas enxutas
+    # (tipo num smallint, sem texto) porque a tabela cresce com cada venda.
+    class Tipo(models.IntegerChoices):
+        CADASTRO = 1, "Cadastro"
+        VENDA = 2, "Venda"
+        REPOSICAO = 3, "Reposição"
+        AJUSTE = 4, "Ajuste manual"
+        CORRECAO = 5, "Correção da conciliação"
+
+    produto = models.ForeignKey(
+        Produto, related_name="movimentos", on_delete=models.CASCADE
+    )
+    tipo = models.PositiveSmallIntegerField(choices=Tipo.choices)
+    delta = models.IntegerField()
+    criado_em = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            # Saldo de um produto: produto = X AND id > último da foto
+            models.Index(fields=["produto", "id"], name="movimento_produto_id"),
+        ]
+
+    def __str__(self):
+        return f"{self.get_tipo_display()} {self.delta:+d} ({self.produto_id})"
+
+
+class FotoEstoque(models.Model):
+    # Saldo do livro-razão de um produto somando os movimentos até
+    # ultimo_movimento; o saldo atual é a foto mais os movimentos depois dela.
+    produto = models.OneToOneField(
+        Produto, related_name="foto_estoque", on_delete=models.CASCADE, primary_key=True
+    )
+    quantidade = models.IntegerField()
+    # Indexado: a próxima foto começa depois do maior ultimo_movimento
+    ultimo_movimento = models.BigIntegerField(db_index=True)
+    tirada_em = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.produto_id}: {self.quantidade} até o movimento {self.ultimo_movimento}"
+
+
+class ContadorProduto(models.Model):
+    # Visualizações da página e adições ao carrinho de cada produto, somadas
+    # em memória pelos workers e gravadas em lote (ver Store/contadores.py).
+    produto = models.OneToOneField(
+        Produto, related_name="contador", on_delete=models.CASCADE, primary_key=True
+    )
+    visualizacoes = models.PositiveBigIntegerField(default=0)
+    adicoes_carrinho = models.PositiveBigIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            # Ordenar por popularidade: ORDER BY ... DESC LIMIT n
+            models.Index(fields=["-visualizacoes"], name="contador_visualizacoes"),
+            models.Index(fields=["-adicoes_carrinho"], name="contador_adicoes"),
+        ]
+
+    def __str__(self):
+        return f"{self.produto_id}: {self.visualizacoes} visualizações, {self.adicoes_carrinho} adições"
+
+
+class Popularidade(models.Model):
+    # Rankings pré-calculados de cada produto (ver Store/popularidade.py):
+    # unidades vendidas nas janelas de 7 e 30 dias e "em alta", as
+    # visualizações recentes com decaimento exponencial. A home e as
+    # categorias ordenam por aqui em vez de somar ItemOrder a cada requisição.
+    produto = models.OneToOneField(
+        Produto, related_name="popularidade", on_delete=models.CASCADE, primary_key=True
+    )
+    vendas_7d = models.PositiveIntegerField(default=0)
+    vendas_30d = models.PositiveIntegerField(default=0)
+    em_alta = models.FloatField(default=0)
+    # ContadorProduto.visualizacoes na última rodada: o que passar disso é novo
+    visualizacoes_vistas = models.PositiveBigIntegerField(default=0)
+    atualizado_em = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["-vendas_30d"], name="popularidade_vendas_30d"),
+            models.Index(fields=["-vendas_7d"], name="popularidade_vendas_7d"),
+            models.Index(fields=["-em_alta"], name="popularidade_em_alta"),
+        ]
+
+    def __str__(self):
+        return f"{self.produto_id}: {self.vendas_30d} vendas em 30 dias, em alta {self.em_alta:.1f}"
+
+
+class Recomendacao(models.Model):
+    # "Comprados juntos": os K produtos que mais aparecem nos mesmos pedidos
+    # que `produto`, na ordem de `posicao` (ver Store/recomendacoes.py).
+    produto = models.ForeignKey(
+        Produto, related_name="recomendacoes", on_delete=models.CASCADE
+    )
+    recomendado = models.ForeignKey(
+        Produto, related_name="recomendado_em", on_delete=models.CASCADE
+    )
+    posicao = models.PositiveSmallIntegerField()
+    pontuacao = models.FloatField()
+    gerada_em = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            # Também é o índice da página do produto: produto = X ORDER BY posicao
+            models.UniqueConstraint(
+                fields=["produto", "posicao"], name="recomendacao_posicao_unica"
+            ),
+        ]
+        indexes = [
+            # Limpeza das recomendações de uma rodada antiga
+            models.Index(fields=["gerada_em"], name="recomendacao_gerada_em"),
+        ]
+
+    def __str__(self):
+        return f"{self.produto_id} -> {self.recomendado_id} ({self.pontuacao:.2f})"
+
+
+class FacetaProdutos(models.Model):
+    # Quantos produtos há em cada combinação de subcategoria, vendedor, faixa
+    # de preço e estoque, recalculado em segundo plano (ver
+    # Store/facetas.py). As contagens dos filtros da home e das categorias
+    # saem daqui, sem um COUNT em Produto por faceta.
+    subcategoria = models.ForeignKey(
+        Subcategoria, related_name="facetas", on_delete=models.CASCADE
+    )
+    vendedor = models.ForeignKey(User, related_name="+", on_delete=models.CASCADE)
+    vendedor_nome = models.CharField(max_length=150)
+    faixa_preco = models.PositiveSmallIntegerField()
+    em_estoque = models.BooleanField()
+    produtos = models.PositiveIntegerField()
+
+    def __str__(self):
+        return f"{self.subcategoria_id}/{self.vendedor_id}/{self.faixa_preco}/{self.em_estoque}: {self.produtos}"
+
+
 class Solicitacao_Vendedor(models.Model):
     usuario = models.ForeignKey(
         User, related_name="solicitacao_vendedor", on_delete=models.CASCADE
@@ -0,0 +1,115 @@
+# Store/popularidade.py
+#
+# Rankings de popularidade pré-calculados (manage.py atualizar_popularidade,
+# que o entrypoint.sh roda em segundo plano). Para cada produto a tabela
+# Popularidade guarda:
+#
+# - vendas_7d / vendas_30d: unidades em pedidos aprovados nas janelas
+#   deslizantes de 7 e 30 dias;
+# - em_alta: visualizações da página (Store/contadores.py) com decaimento
+#   exponencial; cada visualização conta pela metade a cada
+#   POPULARIDADE_MEIA_VIDA_HORAS, então o valor mede a velocidade recente.
+#
+# A rodada é incremental: soma só os pedidos dentro da janela (pelo índice
+# (status_pagamento, data) do Order) e recalcula só os produtos com vendas
+# na janela, com visualizações novas desde a rodada anterior ou com
+# pontuação ainda acima de zero. O resto da tabela não é tocado.
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import F, Q, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import ContadorProduto, ItemOrder, Popularidade
+
+JANELA_SEMANA = timedelta(days=7)
+JANELA_MES = timedelta(days=30)
+# Abaixo disso o "em alta" vira zero e o produto sai das próximas rodadas
+EM_ALTA_MINIMO = 0.01
+
+
+def _vendas(agora):
+    """Unidades aprovadas por produto nas duas janelas ({id: (7d, 30d)})."""
+    return {
+        produto_id: (semana, mes)
+        for produto_id, semana, mes in ItemOrder.objects.filter(
+            order__status_pagamento="approved", order__data__gte=agora - JANELA_MES
+        )
+        .values("produto")
+        .annotate(
+            semana=Coalesce(
+                Sum("quantidade", filter=Q(order__data__gte=agora - JANELA_SEMANA)),
+                Value(0),
+            ),
+            mes=Sum("quantidade"),
+        )
+        .order_by()
+        .values_list("produto", "semana", "mes")
+    }
+
+
+def _visualizacoes_novas():
+    """Contadores que mudaram desde a última rodada ({id: visualizações})."""
+    return dict(
+        ContadorProduto.objects.filter(
+            Q(produto__popularidade__isnull=True)
+            | Q(visualizacoes__gt=F("produto__popularidade__visualizacoes_vistas"))
+        ).values_list("produto_id", "visualizacoes")
+    )
+
+
+def _em_alta(anterior, visualizacoes, agora):
+    if anterior is None:
+        return float(visualizacoes)
+    segundos = max((agora - anterior.atualizado_em).total_seconds(), 0)
+    decaimento = 0.5 ** (segundos / (settings.POPULARIDADE_MEIA_VIDA_HORAS * 3600))
+    novas = max(visualizacoes - anterior.visualizacoes_vistas, 0)
+    em_alta = anterior.em_alta * decaimento + novas
+    return em_alta if em_alta >= EM_ALTA_MINIMO else 0.0
+
+
+def atualizar(lote=1000, agora=None):
+    """Recalcula os rankings que podem ter mudado; devolve quantos produtos."""
+    agora = agora or timezone.now()
+    vendas = _vendas(agora)
+    visualizacoes = _visualizacoes_novas()
+    ativos = Popularidade.objects.filter(
+        Q(vendas_30d__gt=0) | Q(em_alta__gt=0)
+    ).values_list("produto_id", flat=True)
+    ids = sorted(set(vendas) | set(visualizacoes) | set(ativos))
+
+    for inicio in range(0, len(ids), lote):
+        ids_lote = ids[inicio : inicio + lote]
+        anteriores = Popularidade.objects.in_bulk(ids_lote)
+        linhas = []
+        for produto_id in ids_lote:
+            anterior = anteriores.get(produto_id)
+            vistas = visualizacoes.get(
+                produto_id, anterior.visualizacoes_vistas if anterior else 0
+            )
+            semana, mes = vendas.get(produto_id, (0, 0))
+            linhas.append(
+                Popularidade(
+                    produto_id=produto_id,
+                    vendas_7d=semana,
+                    vendas_30d=mes,
+                    em_alta=_em_alta(anterior, vistas, agora),
+                    visualizacoes_vistas=vistas,
+                    atualizado_em=agora,
+                )
+            )
+        Popularidade.objects.bulk_create(
+            linhas,
+            update_conflicts=True,
+            unique_fields=["produto"],
+            update_fields=[
+                "vendas_7d",
+                "vendas_30d",
+                "em_alta",
+                "visualizacoes_vistas",
+                "atualizado_em",
+            ],
+        )
+    return len(ids)
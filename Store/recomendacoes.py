@@ -0,0 +1,132 @@
+# Store/recomendacoes.py
+#
+# "Comprados juntos" da página do produto, calculados fora da requisição
+# (manage.py calcular_recomendacoes, que o entrypoint.sh roda em segundo
+# plano). Os pedidos aprovados dos últimos RECOMENDACOES_DIAS são lidos em
+# streaming, ordenados por pedido, e viram uma matriz esparsa de
+# co-ocorrência: juntos[a][b] = pedidos que levaram a e b. Cada linha é um
+# Counter atualizado com a cesta inteira de uma vez (a contagem roda em C),
+# sem montar a matriz densa produtos x produtos.
+#
+# A pontuação é a similaridade do cosseno, juntos[a][b] / sqrt(n[a] * n[b]),
+# para que um produto que aparece em todo pedido não vire a recomendação de
+# todos. Os RECOMENDACOES_K melhores vizinhos de cada produto vão para a
+# tabela Recomendacao, e a página lê só eles numa query pelo índice
+# (produto, posicao).
+
+import heapq
+import math
+from collections import Counter, defaultdict
+from datetime import timedelta
+from itertools import groupby
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import ItemOrder, Recomendacao
+
+# Pedidos com mais produtos que isso ficam de fora: são compras de atacado,
+# dizem pouco sobre afinidade e custam O(n²) pares.
+MAX_ITENS_POR_PEDIDO = 50
+# Um par só vira recomendação depois de aparecer junto em tantos pedidos
+MIN_PEDIDOS_JUNTOS = 2
+
+
+def cestas(desde):
+    """Conjunto de produtos de cada pedido aprovado desde `desde`."""
+    linhas = (
+        ItemOrder.objects.filter(
+            order__status_pagamento="approved", order__data__gte=desde
+        )
+        .order_by("order_id")
+        .values_list("order_id", "produto_id")
+        .iterator(chunk_size=5000)
+    )
+    for _, itens in groupby(linhas, key=lambda linha: linha[0]):
+        cesta = {produto_id for _, produto_id in itens}
+        if len(cesta) <= MAX_ITENS_POR_PEDIDO:
+            yield cesta
+
+
+def co_ocorrencias(cestas):
+    """
+    Matriz esparsa {a: Counter({b: pedidos com a e b})} e em quantos pedidos
+    cada produto aparece (Counter).
+    """
+    juntos = defaultdict(Counter)
+    pedidos = Counter()
+    for cesta in cestas:
+        pedidos.update(cesta)
+        if len(cesta) > 1:
+            for produto_id in cesta:
+                juntos[produto_id].update(cesta)
+    # A cesta inclui o próprio produto; a diagonal não é recomendação
+    for produto_id, linha in juntos.items():
+        del linha[produto_id]
+    return juntos, pedidos
+
+
+def vizinhos(juntos, pedidos, k, minimo=MIN_PEDIDOS_JUNTOS):
+    """Os k vizinhos de maior cosseno de cada produto ({a: [(b, pontuação)]})."""
+    resultado = {}
+    for produto_id, linha in juntos.items():
+        candidatos = (
+            (vezes / math.sqrt(pedidos[produto_id] * pedidos[outro]), vezes, -outro)
+            for outro, vezes in linha.items()
+            if vezes >= minimo
+        )
+        # Empates: mais pedidos juntos e depois o menor id, sempre na mesma ordem
+        melhores = heapq.nlargest(k, candidatos)
+        if melhores:
+            resultado[produto_id] = [
+                (-outro, pontuacao) for pontuacao, _, outro in melhores
+            ]
+    return resultado
+
+
+def gravar(recomendacoes, lote=1000, agora=None):
+    """
+    Troca as recomendações dos produtos calculados, `lote` produtos por
+    transação, e apaga as que sobraram de rodadas anteriores (produtos que
+    não têm mais nenhum par). Devolve quantas linhas foram gravadas.
+    """
+    agora = agora or timezone.now()
+    ids = sorted(recomendacoes)
+    total = 0
+    for inicio in range(0, len(ids), lote):
+        ids_lote = ids[inicio : inicio + lote]
+        linhas = [
+            Recomendacao(
+                produto_id=produto_id,
+                recomendado_id=recomendado_id,
+                posicao=posicao,
+                pontuacao=pontuacao,
+                gerada_em=agora,
+            )
+            for produto_id in ids_lote
+            for posicao, (recomendado_id, pontuacao) in enumerate(
+                recomendacoes[produto_id]
+            )
+        ]
+        with transaction.atomic():
+            Recomendacao.objects.filter(produto_id__in=ids_lote).delete()
+            Recomendacao.objects.bulk_create(linhas)
+        total += len(linhas)
+
+    while True:
+        antigas = list(
+            Recomendacao.objects.filter(gerada_em__lt=agora).values_list(
+                "id", flat=True
+            )[:lote]
+        )
+        if not antigas:
+            return total
+        Recomendacao.objects.filter(id__in=antigas).delete()
+
+
+def calcular(dias, k, minimo=MIN_PEDIDOS_JUNTOS, lote=1000, agora=None):
+    """Rodada completa; devolve (produtos com recomendações, linhas gravadas)."""
+    agora = agora or timezone.now()
+    juntos, pedidos = co_ocorrencias(cestas(agora - timedelta(days=dias)))
+    recomendacoes = vizinhos(juntos, pedidos, k, minimo)
+    return len(recomendacoes), gravar(recomendacoes, lote, agora)
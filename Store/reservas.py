@@ -0,0 +1,197 @@
+# Store/reservas.py
+#
+# Reservas de estoque com prazo. O estoque (Produto.quantidade) só baixa
+# quando o Mercado Pago aprova o pagamento; até lá o checkout segura as
+# unidades do pedido numa Reserva que vale por RESERVA_TTL_MINUTES. O
+# disponível para venda é o estoque menos as reservas ainda válidas, somadas
+# pelo índice (produto, expira_em). Assim dois compradores não conseguem
+# pagar a mesma última unidade.
+#
+# Consistência entre workers: reservar e confirmar travam as linhas dos
+# produtos (SELECT ... FOR UPDATE, sempre na ordem dos ids) antes de ler as
+# reservas. No PostgreSQL isso serializa os checkouts do mesmo produto; no
+# SQLite o banco inteiro aceita um escritor por vez (com SQLITE_TUNED a
+# transação já começa com BEGIN IMMEDIATE).
+
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Sum, Value, When
+from django.utils import timezone
+
+from Core import metricas
+
+from . import estoque
+from .models import ItemOrder, Order, Produto, Reserva
+
+logger = logging.getLogger(__name__)
+
+# Status do Mercado Pago em que o pagamento não vai mais acontecer
+STATUS_QUE_LIBERAM = ("rejected", "cancelled", "refunded", "charged_back")
+APROVADO = "approved"
+# Pagamento aprovado de um pedido cujo estoque já tinha ido para outro
+# comprador (a reserva venceu ou o pedido expirou antes da aprovação): o
+# vendedor precisa repor ou devolver o dinheiro
+APROVADO_SEM_ESTOQUE = "aprovado_sem_estoque"
+
+
+class EstoqueInsuficiente(Exception):
+    def __init__(self, produto, disponivel):
+        self.produto = produto
+        self.disponivel = disponivel
+        super().__init__(
+            f"Estoque insuficiente para '{produto.nome}': "
+            f"{max(disponivel, 0)} unidade(s) disponível(is)."
+        )
+
+
+def reservados(produto_ids, agora=None, exceto_pedido=None):
+    """
+    Unidades em reservas válidas de cada produto ({id: quantidade}), sem
+    contar as do pedido `exceto_pedido`.
+    """
+    agora = agora or timezone.now()
+    validas = Reserva.objects.filter(produto_id__in=produto_ids, expira_em__gt=agora)
+    if exceto_pedido is not None:
+        validas = validas.exclude(order_id=exceto_pedido)
+    return dict(
+        validas.values("produto_id")
+        .annotate(total=Sum("quantidade"))
+        .order_by()
+        .values_list("produto_id", "total")
+    )
+
+
+def disponivel(produto):
+    """Disponível para venda: estoque menos as reservas válidas."""
+    return max(produto.quantidade - reservados([produto.id]).get(produto.id, 0), 0)
+
+
+def travar_disponiveis(produto_ids, exceto_pedido=None):
+    """
+    Disponível de cada produto ({id: quantidade}), travando as linhas dos
+    produtos até o fim da transação; as reservas de `exceto_pedido` não são
+    descontadas. Precisa ser chamada dentro de transaction.atomic().
+    """
+    estoque = dict(
+        Produto.objects.select_for_update()
+        .filter(id__in=produto_ids)
+        .order_by("id")
+        .values_list("id", "quantidade")
+    )
+    em_reserva = reservados(estoque, exceto_pedido=exceto_pedido)
+    return {
+        produto_id: quantidade - em_reserva.get(produto_id, 0)
+        for produto_id, quantidade in estoque.items()
+    }
+
+
+def conferir(itens, disponivel):
+    """Levanta EstoqueInsuficiente no primeiro item que não cabe no disponível."""
+    for item in itens:
+        if item.quantidade > disponivel.get(item.produto_id, 0):
+            raise EstoqueInsuficiente(item.produto, disponivel.get(item.produto_id, 0))
+
+
+def novas_reservas(order, itens, agora=None):
+    """Reservas (não salvas) para os itens de um pedido, com o prazo padrão."""
+    expira_em = (agora or timezone.now()) + timedelta(
+        minutes=settings.RESERVA_TTL_MINUTES
+    )
+    return [
+        Reserva(
+            order=order,
+            produto_id=item.produto_id,
+            quantidade=item.quantidade,
+            expira_em=expira_em,
+        )
+        for item in itens
+    ]
+
+
+def confirmar(order_id):
+    """
+    Pagamento aprovado: marca o pedido como aprovado, baixa o estoque dos
+    itens (com os movimentos de venda no livro) e apaga as reservas, tudo
+    numa transação. Só o primeiro webhook de
+    aprovação de um pedido baixa o estoque, mesmo que dois cheguem ao mesmo
+    tempo em workers diferentes. Se algum item não cabe mais no disponível
+    (a reserva venceu, ou o pedido já tinha expirado, e outro comprador
+    levou as unidades) o pedido fica APROVADO_SEM_ESTOQUE, com aviso no log.
+    Devolve os ids dos produtos do pedido, ou None se ele já estava aprovado.
+    """
+    with transaction.atomic():
+        # O UPDATE condicional é a trava contra dois webhooks simultâneos
+        aprovou = (
+            Order.objects.filter(id=order_id)
+            .exclude(status_pagamento__in=(APROVADO, APROVADO_SEM_ESTOQUE))
+            .update(status_pagamento=APROVADO)
+        )
+        if not aprovou:
+            return None
+
+        quantidades = dict(
+            ItemOrder.objects.filter(order_id=order_id).values_list(
+                "produto_id", "quantidade"
+            )
+        )
+        # As unidades que outros pedidos ainda seguram não são deste: com a
+        # própria reserva vencida (ou apagada ao expirar o pedido) só conta
+        # o que ninguém reservou.
+        disponiveis = travar_disponiveis(quantidades, exceto_pedido=order_id)
+        baixar = {}
+        for produto_id, quantidade in quantidades.items():
+            if disponiveis.get(produto_id, 0) >= quantidade:
+                baixar[produto_id] = quantidade
+            else:
+                logger.warning(
+                    "Estoque insuficiente para o produto %s no pedido %s",
+                    produto_id,
+                    order_id,
+                )
+                metricas.incrementar("loja_estoque_insuficiente_total")
+        if len(baixar) < len(quantidades):
+            Order.objects.filter(id=order_id).update(
+                status_pagamento=APROVADO_SEM_ESTOQUE
+            )
+        if baixar:
+            # Um UPDATE só para todos os produtos do pedido
+            Produto.objects.filter(id__in=baixar).update(
+                quantidade=F("quantidade")
+                - Case(
+                    *(
+                        When(id=produto_id, then=Value(quantidade))
+                        for produto_id, quantidade in baixar.items()
+                    ),
+                    output_field=IntegerField(),
+                )
+            )
+            estoque.registrar_vendas(baixar)
+        Reserva.objects.filter(order_id=order_id).delete()
+    return list(quantidades)
+
+
+def liberar(order_ids):
+    """Apaga as reservas de pedidos que não vão mais ser pagos."""
+    return Reserva.objects.filter(order_id__in=order_ids).delete()[0]
+
+
+def expirar(lote=1000, agora=None):
+    """
+    Apaga as reservas vencidas em lotes de `lote` linhas (cada DELETE é
+    curto e não segura o banco). As vencidas já não contam no disponível;
+    apagá-las só mantém a tabela pequena. Devolve quantas foram apagadas.
+    """
+    agora = agora or timezone.now()
+    total = 0
+    while True:
+        ids = list(
+            Reserva.objects.filter(expira_em__lte=agora).values_list("id", flat=True)[
+                :lote
+            ]
+        )
+        if not ids:
+            return total
+        total += Reserva.objects.filter(id__in=ids).delete()[0]
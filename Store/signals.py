@@ -0,0 +1,83 @@
+import logging
+
+from django.contrib.auth.signals import user_logged_in
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from Store import autocompletar
+from Store.carrinho_anonimo import mesclar
+from Store.models import Categoria, Produto, Subcategoria
+from Usuario.models import Profile
+
+logger = logging.getLogger(__name__)
+
+
+@receiver(user_logged_in)
+def mesclar_carrinho_anonimo(sender, request, user, **kwargs):
+    # force_login/client.login disparam o sinal com uma requisição sem o
+    # middleware, então o carrinho anônimo pode não existir.
+    carrinho_anonimo = getattr(request, "carrinho_anonimo", None)
+    if carrinho_anonimo:
+        mesclar(user, carrinho_anonimo)
+        carrinho_anonimo.limpar()
+
+
+# Índice do autocompletar (Store/autocompletar.py): a mudança vai para o
+# diário compartilhado só depois do commit, para um rollback não deixar
+# sugestões de algo que não existe.
+
+
+def _publicar(*mudancas):
+    def publicar():
+        try:
+            autocompletar.publicar(list(mudancas))
+        except OSError:
+            logger.exception("Erro ao atualizar o índice do autocompletar")
+
+    transaction.on_commit(publicar)
+
+
+@receiver(post_save, sender=Produto)
+def indexar_produto(sender, instance, **kwargs):
+    _publicar(["+", autocompletar.PRODUTO, instance.id, instance.nome])
+
+
+@receiver(post_save, sender=Categoria)
+def indexar_categoria(sender, instance, **kwargs):
+    _publicar(["+", autocompletar.CATEGORIA, instance.id, instance.nome])
+
+
+@receiver(post_save, sender=Subcategoria)
+def indexar_subcategoria(sender, instance, **kwargs):
+    _publicar(["+", autocompletar.SUBCATEGORIA, instance.id, instance.nome])
+
+
+@receiver(post_save, sender=Profile)
+def indexar_vendedor(sender, instance, **kwargs):
+    if instance.vendedor:
+        _publicar(
+            [
+                "+",
+                autocompletar.VENDEDOR,
+                instance.usuario_id,
+                instance.usuario.username,
+            ]
+        )
+    else:
+        _publicar(["-", autocompletar.VENDEDOR, instance.usuario_id])
+
+
+@receiver(post_delete, sender=Produto)
+@receiver(post_delete, sender=Categoria)
+@receiver(post_delete, sender=Subcategoria)
+@receiver(post_delete, sender=Profile)
+def desindexar(sender, instance, **kwargs):
+    tipo = {
+        Produto: autocompletar.PRODUTO,
+        Categoria: autocompletar.CATEGORIA,
+        Subcategoria: autocompletar.SUBCATEGORIA,
+        Profile: autocompletar.VENDEDOR,
+    }[sender]
+    id_ = instance.usuario_id if sender is Profile else instance.id
+    _publicar(["-", tipo, id_])
@@ -1,17 +1,28 @@
 # Store/tests.py
 
+import asyncio
+import copy
 import decimal
+import math
+import tempfile
 from unittest import mock
-from django.test import TestCase, Client
+from django.test import TestCase, Client, override_settings
 from django.contrib.auth.models import User
 from django.urls import reverse
 from .models import (
     Categoria,
     Produto,
     Carrinho,
+    ContadorProduto,
+    FacetaProdutos,
+    Popularidade,
+    Recomendacao,
     ItemCarrinho,
     Order,
     ItemOrder,
+    FotoEstoque,
+    MovimentoEstoque,
+    Reserva,
     Subcategoria,
 )
 from Usuario.models import Profile  # Importação do seu modelo Profile
@@ -21,33 +32,112 @@ from django.contrib.messages import get_messages
 from django.http import JsonResponse
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.db.models import Q  # Importar Q para os filtros da view categoria
+from django.db import DatabaseError, IntegrityError, connection
+from django.test.utils import CaptureQueriesContext
+from datetime import timedelta
+
+from django.conf import settings
+from django.core import signing
+from django.utils import timezone
+from django.utils.text import slugify
+from django.core.management import CommandError, call_command
+from io import StringIO
+
+from Core.orcamentos import OrcamentoTestCase
+from Store import (
+    autocompletar,
+    contadores,
+    estoque,
+    facetas,
+    manutencao,
+    popularidade,
+    recomendacoes,
+    reservas,
+)
+from Store.views import ORDENACOES
+from Store.carrinho_sql import excluir_item, somar_item, tirar_item
+from Store.carrinho_anonimo import (
+    COOKIE as COOKIE_CARRINHO,
+    MAX_ITENS,
+    SALT,
+    CarrinhoAnonimo,
+)
+
+
+def _itens_do_cookie(client):
+    """Conteúdo do carrinho anônimo gravado no cookie do client de teste."""
+    # Cookie apagado pela resposta fica no client com valor vazio
+    if not getattr(client.cookies.get(COOKIE_CARRINHO), "value", ""):
+        return {}
+    valor = signing.get_cookie_signer(salt=COOKIE_CARRINHO + SALT).unsign(
+        client.cookies[COOKIE_CARRINHO].value
+    )
+    return CarrinhoAnonimo(valor).itens
+
+
+def _catalogo(prefixo, n, salvar=Produto.save, **produto_kwargs):
+    """
+    `n` produtos de teste gravados um a um por `salvar`. Sem `vendedor` cria
+    o usuário vendedor_<prefixo>; sem `subcategoria`, uma subcategoria
+    <prefixo> na categoria de mesmo nome. Os demais campos de Produto
+    sobrescrevem os padrões, e um valor chamável recebe o índice do produto.
+    Devolve (vendedor, subcategoria, produtos).
+    """
+    slug = slugify(prefixo).replace("-", "_")
+    if "vendedor" not in produto_kwargs:
+        produto_kwargs["vendedor"] = User.objects.create_user(
+            username=f"vendedor_{slug}"
+        )
+    if "subcategoria" not in produto_kwargs:
+        produto_kwargs["subcategoria"] = Subcategoria.objects.create(
+            nome=prefixo, categoria_pai=Categoria.objects.create(nome=prefixo)
+        )
+    campos = {
+        "nome": lambda i: f"Produto {prefixo} {i}",
+        "preco": decimal.Decimal("10.00"),
+        "quantidade": 5,
+        "imagem": f"uploads/produtos/{slug}.jpg",
+        **produto_kwargs,
+    }
+    produtos = []
+    for i in range(n):
+        produto = Produto(
+            **{
+                campo: valor(i) if callable(valor) else valor
+                for campo, valor in campos.items()
+            }
+        )
+        salvar(produto)
+        produtos.append(produto)
+    return produto_kwargs["vendedor"], produto_kwargs["subcategoria"], produtos
 
 
 class StoreModelsTest(TestCase):
     """Testa os modelos do app Store."""
 
-    def setUp(self):
-        self.vendedor = User.objects.create_user(
+    @classmethod
+    def setUpTestData(cls):
+        cls.vendedor = User.objects.create_user(
             username="vendedor_test", password="123"
         )
-        self.comprador = User.objects.create_user(
+        cls.comprador = User.objects.create_user(
             username="comprador_test", password="123"
         )
-        self.categoria = Categoria.objects.create(nome="Eletrônicos")
-        self.subcategoria = Subcategoria.objects.create(
-            nome="Teclados", categoria_pai=self.categoria
+        cls.categoria = Categoria.objects.create(nome="Eletrônicos")
+        cls.subcategoria = Subcategoria.objects.create(
+            nome="Teclados", categoria_pai=cls.categoria
         )
 
-        self.produto1 = Produto.objects.create(
-            vendedor=self.vendedor,
-            subcategoria=self.subcategoria,
+        cls.produto1 = Produto.objects.create(
+            vendedor=cls.vendedor,
+            subcategoria=cls.subcategoria,
             nome="Teclado",
             preco=decimal.Decimal("150.75"),
             quantidade=10,
         )
-        self.produto2 = Produto.objects.create(
-            vendedor=self.vendedor,
-            subcategoria=self.subcategoria,
+        cls.produto2 = Produto.objects.create(
+            vendedor=cls.vendedor,
+            subcategoria=cls.subcategoria,
             nome="Mouse",
             preco=decimal.Decimal("50.00"),
             quantidade=5,
@@ -82,37 +172,37 @@ class StoreModelsTest(TestCase):
 class StoreViewsTest(TestCase):
     """Testa as views do app Store."""
 
-    def setUp(self):
-        self.client = Client()
-        self.vendedor = User.objects.create_user(
+    @classmethod
+    def setUpTestData(cls):
+        cls.vendedor = User.objects.create_user(
             username="vendedor_view", password="123"
         )
-        self.comprador = User.objects.create_user(
+        cls.comprador = User.objects.create_user(
             username="comprador_view", password="123"
         )
         # ACESSA E ATUALIZA OS PERFIS JÁ CRIADOS PELO SIGNAL
-        self.vendedor.perfil.mp_access_token = "TEST_ACCESS_TOKEN_FOR_SELLER"
-        self.vendedor.perfil.mp_connected = True  # ✨ LINHA FALTANTE ADICIONADA AQUI
-        self.vendedor.perfil.save()
+        cls.vendedor.perfil.mp_access_token = "TEST_ACCESS_TOKEN_FOR_SELLER"
+        cls.vendedor.perfil.mp_connected = True  # ✨ LINHA FALTANTE ADICIONADA AQUI
+        cls.vendedor.perfil.save()
 
         # É uma boa prática fazer o mesmo para o comprador, caso ele precise no futuro
-        self.comprador.perfil.mp_access_token = "TEST_ACCESS_TOKEN_FOR_BUYER"
-        self.comprador.perfil.mp_connected = True
-        self.comprador.perfil.save()
+        cls.comprador.perfil.mp_access_token = "TEST_ACCESS_TOKEN_FOR_BUYER"
+        cls.comprador.perfil.mp_connected = True
+        cls.comprador.perfil.save()
 
         # ... o resto da sua função setUp continua igual ...
-        self.categoria = Categoria.objects.create(nome="View Tests")
-        self.subcategoria = Subcategoria.objects.create(
-            nome="Monitores", categoria_pai=self.categoria
+        cls.categoria = Categoria.objects.create(nome="View Tests")
+        cls.subcategoria = Subcategoria.objects.create(
+            nome="Monitores", categoria_pai=cls.categoria
         )
 
         image_file = SimpleUploadedFile(
             "test.jpg", b"fake_image_data", content_type="image/jpeg"
         )
 
-        self.produto = Produto.objects.create(
-            vendedor=self.vendedor,
-            subcategoria=self.subcategoria,
+        cls.produto = Produto.objects.create(
+            vendedor=cls.vendedor,
+            subcategoria=cls.subcategoria,
             nome="Monitor Gamer",
             preco=1200.00,
             quantidade=3,
@@ -122,22 +212,22 @@ class StoreViewsTest(TestCase):
         image_file_2 = SimpleUploadedFile(
             "test2.jpg", b"fake_image_data", content_type="image/jpeg"
         )
-        self.produto_webhook = Produto.objects.create(
-            vendedor=self.vendedor,
-            subcategoria=self.subcategoria,
+        cls.produto_webhook = Produto.objects.create(
+            vendedor=cls.vendedor,
+            subcategoria=cls.subcategoria,
             nome="Headset",
             preco=300.00,
             quantidade=10,
             imagem=image_file_2,
         )
-        self.order = Order.objects.create(
-            vendedor=self.vendedor, comprador=self.comprador, status_pagamento="pending"
+        cls.order = Order.objects.create(
+            vendedor=cls.vendedor, comprador=cls.comprador, status_pagamento="pending"
         )
-        Carrinho.objects.get_or_create(usuario=self.comprador)
-        self.item = ItemOrder.objects.create(
-            order=self.order, produto=self.produto_webhook, quantidade=2, preco=300.00
+        Carrinho.objects.get_or_create(usuario=cls.comprador)
+        cls.item = ItemOrder.objects.create(
+            order=cls.order, produto=cls.produto_webhook, quantidade=2, preco=300.00
         )
-        self.order_id = str(self.order.id)
+        cls.order_id = str(cls.order.id)
 
     def test_add_remover_excluir_carrinho(self):
         """Testa o fluxo completo de manipulação do carrinho via views."""
@@ -158,7 +248,7 @@ class StoreViewsTest(TestCase):
         self.client.get(reverse("excluir_carrinho", args=[self.produto.id]))
         self.assertEqual(carrinho.itens.count(), 0)
 
-    @mock.patch("Store.views.realizar_pagamento")
+    @mock.patch("Store.views.realizar_pagamento_async")
     def test_view_pagamento_cria_order_corretamente(self, mock_pagamento):
         mock_pagamento.return_value = reverse("compra_success")
         self.client.login(username="comprador_view", password="123")
@@ -188,10 +278,9 @@ class StoreViewsTest(TestCase):
             response, reverse("compra_success"), fetch_redirect_response=False
         )
 
-    @mock.patch("Store.views.mercadopago.SDK")
-    def test_webhook_success_approved(self, mock_sdk_class):
-        mock_sdk = mock_sdk_class.return_value
-        mock_sdk.payment().get.return_value = {
+    @mock.patch("Store.views.consultar_pagamento_async")
+    def test_webhook_success_approved(self, mock_consulta):
+        mock_consulta.return_value = {
             "status": 200,
             "response": {"status": "approved", "external_reference": self.order_id},
         }
@@ -219,15 +308,14 @@ class StoreViewsTest(TestCase):
             {"status": "error", "message": "ID de pagamento não encontrado"},
         )
 
-    @mock.patch("Store.views.mercadopago.SDK")
-    def test_webhook_payment_not_found_mp(self, mock_sdk_class):
+    @mock.patch("Store.views.consultar_pagamento_async")
+    def test_webhook_payment_not_found_mp(self, mock_consulta):
         """
         Testa o comportamento do webhook quando o Mercado Pago retorna
         um status diferente de 200 (ex: 404) para a requisição de pagamento.
         """
-        mock_sdk = mock_sdk_class.return_value
         # Simula o Mercado Pago retornando que o pagamento não foi encontrado (status 404)
-        mock_sdk.payment().get.return_value = {
+        mock_consulta.return_value = {
             "status": 404,  # Status que indica "não encontrado" ou outro erro
             "response": {},  # Resposta vazia ou com informações mínimas
         }
@@ -281,9 +369,13 @@ class StoreViewsTest(TestCase):
         self.assertEqual(item.quantidade, 2)
 
     def test_produto_view_post_nao_autenticado(self):
+        itens_antes = ItemCarrinho.objects.count()
         url = reverse("pagina_produto", args=[self.produto.id])
         response = self.client.post(url, {"quantidade": 1})
-        self.assertRedirects(response, reverse("logar"))
+        self.assertEqual(response.status_code, 200)
+        # Sem login o item vai para o cookie, não para o banco
+        self.assertEqual(_itens_do_cookie(self.client), {self.produto.id: 1})
+        self.assertEqual(ItemCarrinho.objects.count(), itens_antes)
 
     def test_carrinho_view_autenticado(self):
         self.client.login(username="comprador_view", password="123")
@@ -362,27 +454,19 @@ class StoreViewsTest(TestCase):
 
     def test_carrinho_view_nao_autenticado(self):
         """
-        Testa se a view carrinho redireciona para a página de login
-        e adiciona uma mensagem de erro se o usuário não estiver autenticado.
+        Testa se a view carrinho mostra o carrinho do cookie quando o
+        usuário não está autenticado, pedindo login só para pagar.
         """
-        # Garante que o cliente não esteja logado
         self.client.logout()
+        self.client.get(reverse("adicionar_carrinho", args=[self.produto.id, 2]))
 
-        url = reverse("carrinho")
-        response = self.client.get(
-            url, follow=True
-        )  # follow=True para seguir o redirecionamento
-
-        # 1. Verifica se houve um redirecionamento para a página de login
-        self.assertRedirects(response, reverse("logar"))
+        response = self.client.get(reverse("carrinho"))
 
-        # 2. Verifica se a mensagem de erro foi adicionada
-        messages = list(response.context["messages"])
-        self.assertEqual(len(messages), 1)
-        self.assertEqual(
-            str(messages[0]), "Você deve estar logado para acessar o carrinho"
-        )
-        self.assertEqual(messages[0].tags, "error")
+        self.assertEqual(response.status_code, 200)
+        self.assertTemplateUsed(response, "carrinho.html")
+        self.assertEqual(response.context["total_carrinho"], self.produto.preco * 2)
+        self.assertContains(response, reverse("logar"))
+        self.assertNotContains(response, reverse("pagamento", args=[self.vendedor.id]))
 
     def test_home_view(self):
         """Testa se a view home retorna status 200, usa o template correto e lista os produtos."""
@@ -552,27 +636,27 @@ class StoreViewsTest(TestCase):
 
 
 class WebhookTestCase(TestCase):
-    def setUp(self):
-        self.client = Client()
-        self.vendedor = User.objects.create_user(
+    @classmethod
+    def setUpTestData(cls):
+        cls.vendedor = User.objects.create_user(
             username="vendedor_webhook", password="123"
         )
-        self.comprador = User.objects.create_user(
+        cls.comprador = User.objects.create_user(
             username="comprador_webhook", password="123"
         )
         # ACESSA E ATUALIZA OS PERFIS JÁ CRIADOS PELO SIGNAL
-        self.vendedor.perfil.mp_access_token = "TEST_ACCESS_TOKEN_FOR_SELLER_WEBHOOK"
-        self.vendedor.perfil.save()
-        self.comprador.perfil.mp_access_token = "TEST_ACCESS_TOKEN_FOR_BUYER_WEBHOOK"
-        self.comprador.perfil.save()
-
-        self.categoria = Categoria.objects.create(nome="Webhook Test Category")
-        self.subcategoria = Subcategoria.objects.create(
-            nome="Webhook Subcategory", categoria_pai=self.categoria
+        cls.vendedor.perfil.mp_access_token = "TEST_ACCESS_TOKEN_FOR_SELLER_WEBHOOK"
+        cls.vendedor.perfil.save()
+        cls.comprador.perfil.mp_access_token = "TEST_ACCESS_TOKEN_FOR_BUYER_WEBHOOK"
+        cls.comprador.perfil.save()
+
+        cls.categoria = Categoria.objects.create(nome="Webhook Test Category")
+        cls.subcategoria = Subcategoria.objects.create(
+            nome="Webhook Subcategory", categoria_pai=cls.categoria
         )
-        self.produto_webhook = Produto.objects.create(
-            vendedor=self.vendedor,
-            subcategoria=self.subcategoria,
+        cls.produto_webhook = Produto.objects.create(
+            vendedor=cls.vendedor,
+            subcategoria=cls.subcategoria,
             nome="Produto Webhook",
             preco=100.00,
             quantidade=5,
@@ -580,20 +664,19 @@ class WebhookTestCase(TestCase):
                 "webhook_test.jpg", b"fake_data", content_type="image/jpeg"
             ),
         )
-        self.order = Order.objects.create(
-            vendedor=self.vendedor, comprador=self.comprador, status_pagamento="pending"
+        cls.order = Order.objects.create(
+            vendedor=cls.vendedor, comprador=cls.comprador, status_pagamento="pending"
         )
-        Carrinho.objects.get_or_create(usuario=self.comprador)
+        Carrinho.objects.get_or_create(usuario=cls.comprador)
         ItemOrder.objects.create(
-            order=self.order, produto=self.produto_webhook, quantidade=2, preco=100.00
+            order=cls.order, produto=cls.produto_webhook, quantidade=2, preco=100.00
         )
-        self.order_id = str(self.order.id)
+        cls.order_id = str(cls.order.id)
 
-    @mock.patch("Store.views.mercadopago.SDK")
-    def test_webhook_sem_external_reference(self, mock_sdk_class):
+    @mock.patch("Store.views.consultar_pagamento_async")
+    def test_webhook_sem_external_reference(self, mock_consulta):
         """Garante que a ausência de external_reference é tratada corretamente."""
-        mock_sdk = mock_sdk_class.return_value
-        mock_sdk.payment().get.return_value = {
+        mock_consulta.return_value = {
             "status": 200,
             "response": {
                 "status": "approved",
@@ -612,15 +695,14 @@ class WebhookTestCase(TestCase):
             {"status": "error", "message": "Referência externa não encontrada"},
         )
 
-    @mock.patch("Store.views.mercadopago.SDK")
-    def test_webhook_status_update_non_approved(self, mock_sdk_class):
+    @mock.patch("Store.views.consultar_pagamento_async")
+    def test_webhook_status_update_non_approved(self, mock_consulta):
         """
         Testa a atualização do status do pedido quando o status do pagamento
         no Mercado Pago é diferente do status atual do pedido e não é 'approved'.
         """
-        mock_sdk = mock_sdk_class.return_value
         # Simula um pagamento 'in_process' no Mercado Pago
-        mock_sdk.payment().get.return_value = {
+        mock_consulta.return_value = {
             "status": 200,
             "response": {"status": "in_process", "external_reference": self.order_id},
         }
@@ -643,18 +725,17 @@ class WebhookTestCase(TestCase):
         self.assertEqual(self.order.status_pagamento, "in_process")
         self.assertJSONEqual(response.content, {"status": "ok"})
 
-    @mock.patch("Store.views.mercadopago.SDK")
-    def test_webhook_order_does_not_exist(self, mock_sdk_class):
+    @mock.patch("Store.views.consultar_pagamento_async")
+    def test_webhook_order_does_not_exist(self, mock_consulta):
         """
         Testa o comportamento do webhook quando o Order (pedido)
         com o external_reference não é encontrado.
         """
-        mock_sdk = mock_sdk_class.return_value
         # Simula um pagamento aprovado, mas com um external_reference inválido
         invalid_order_id = (
             "99999999-9999-9999-9999-999999999999"  # Um UUID que não existe
         )
-        mock_sdk.payment().get.return_value = {
+        mock_consulta.return_value = {
             "status": 200,
             "response": {"status": "approved", "external_reference": invalid_order_id},
         }
@@ -676,23 +757,1667 @@ class WebhookTestCase(TestCase):
             },
         )
 
-    @mock.patch("Store.views.mercadopago.SDK")
-    def test_webhook_general_exception_handling(self, mock_sdk_class):
+    @mock.patch("Store.views.consultar_pagamento_async")
+    def test_webhook_general_exception_handling(self, mock_consulta):
         """
         Testa o tratamento de exceções genéricas dentro do webhook.
         """
-        mock_sdk = mock_sdk_class.return_value
         # Simula uma exceção genérica ao tentar obter o pagamento
-        mock_sdk.payment().get.side_effect = Exception("Erro simulado do Mercado Pago")
+        mock_consulta.side_effect = Exception("Erro simulado do Mercado Pago")
 
-        response = self.client.post(
-            reverse("mercadopago_webhook"),
-            data=json.dumps({"data": {"id": "any_payment_id"}, "type": "payment"}),
-            content_type="application/json",
-        )
+        with self.assertLogs("Store.views", "ERROR") as logs:
+            response = self.client.post(
+                reverse("mercadopago_webhook"),
+                data=json.dumps({"data": {"id": "any_payment_id"}, "type": "payment"}),
+                content_type="application/json",
+            )
 
         self.assertEqual(response.status_code, 500)
+        self.assertIn("Erro simulado do Mercado Pago", logs.output[0])
         self.assertJSONEqual(
             response.content,
             {"status": "error", "message": "Erro interno do servidor"},
         )
+
+
+CACHE_TESTE = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+
+SESSION_ENGINES = {
+    "db": "django.contrib.sessions.backends.db",
+    "cached_db": "django.contrib.sessions.backends.cached_db",
+    "signed_cookies": "django.contrib.sessions.backends.signed_cookies",
+}
+
+
+class PagamentoTodosViewTest(TestCase):
+    """Testa o checkout de todos os vendedores do carrinho numa requisição."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.comprador = User.objects.create_user(username="comprador", password="123")
+        categoria = Categoria.objects.create(nome="Multi")
+        subcategoria = Subcategoria.objects.create(nome="Loja", categoria_pai=categoria)
+        carrinho = Carrinho.objects.create(usuario=cls.comprador)
+
+        cls.vendedores = []
+        for i in range(3):
+            vendedor = User.objects.create_user(
+                username=f"vendedor_{i}", first_name=f"Vendedor {i}"
+            )
+            vendedor.perfil.mp_access_token = f"TOKEN_{i}"
+            vendedor.perfil.mp_connected = True
+            vendedor.perfil.save()
+            produto = Produto.objects.create(
+                vendedor=vendedor,
+                subcategoria=subcategoria,
+                nome=f"Produto {i}",
+                preco=decimal.Decimal("100.00"),
+                quantidade=10,
+            )
+            ItemCarrinho.objects.create(
+                carrinho=carrinho, produto=produto, quantidade=2
+            )
+            cls.vendedores.append(vendedor)
+
+    def setUp(self):
+        self.client.login(username="comprador", password="123")
+
+    @mock.patch("Store.views.realizar_pagamento_async")
+    def test_cria_um_pedido_por_vendedor_em_paralelo(self, mock_pagamento):
+        em_andamento = []
+        todas_em_andamento = asyncio.Event()
+
+        async def preferencia(token, items, external_reference, fee):
+            # Só responde quando as três chamadas estiverem abertas ao mesmo
+            # tempo; feitas uma depois da outra, a primeira esgota o prazo
+            em_andamento.append(external_reference)
+            if len(em_andamento) == 3:
+                todas_em_andamento.set()
+            await asyncio.wait_for(todas_em_andamento.wait(), timeout=5)
+            return f"https://mp.test/checkout/{external_reference}"
+
+        mock_pagamento.side_effect = preferencia
+
+        response = self.client.get(reverse("pagamento_todos"))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(mock_pagamento.call_count, 3)
+
+        pedidos = Order.objects.filter(comprador=self.comprador)
+        self.assertEqual(pedidos.count(), 3)
+        for pedido in pedidos:
+            self.assertEqual(pedido.valor_total_pedido, decimal.Decimal("200.00"))
+            self.assertEqual(pedido.itens.count(), 1)
+            self.assertContains(response, f"https://mp.test/checkout/{pedido.id}")
+
+        fees = {chamada.args[3] for chamada in mock_pagamento.call_args_list}
+        self.assertEqual(fees, {decimal.Decimal("20.00")})
+        self.assertFalse(ItemCarrinho.objects.filter(carrinho__usuario=self.comprador))
+
+    @mock.patch("Store.views.realizar_pagamento_async")
+    def test_falha_de_um_vendedor_mantem_itens_dele(self, mock_pagamento):
+        async def preferencia(token, items, external_reference, fee):
+            if token == "TOKEN_1":
+                raise Exception("API fora do ar")
+            return f"https://mp.test/checkout/{external_reference}"
+
+        mock_pagamento.side_effect = preferencia
+
+        with self.assertLogs("Store.views", "ERROR") as logs:
+            response = self.client.get(reverse("pagamento_todos"))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("API fora do ar", logs.output[0])
+        self.assertEqual(
+            set(Order.objects.values_list("vendedor_id", flat=True)),
+            {self.vendedores[0].id, self.vendedores[2].id},
+        )
+        restantes = ItemCarrinho.objects.filter(carrinho__usuario=self.comprador)
+        self.assertEqual(
+            [item.produto.vendedor_id for item in restantes], [self.vendedores[1].id]
+        )
+        mensagens = [str(m) for m in get_messages(response.wsgi_request)]
+        self.assertTrue(any("Vendedor 1" in m for m in mensagens))
+
+    @mock.patch("Store.views.realizar_pagamento_async")
+    def test_ignora_vendedor_sem_conta_conectada(self, mock_pagamento):
+        mock_pagamento.return_value = "https://mp.test/checkout"
+        perfil = self.vendedores[2].perfil
+        perfil.mp_connected = False
+        perfil.save()
+
+        self.client.get(reverse("pagamento_todos"))
+
+        self.assertEqual(mock_pagamento.call_count, 2)
+        self.assertFalse(Order.objects.filter(vendedor=self.vendedores[2]).exists())
+
+    def test_carrinho_vazio_redireciona(self):
+        ItemCarrinho.objects.all().delete()
+        response = self.client.get(reverse("pagamento_todos"))
+        self.assertRedirects(response, reverse("carrinho"))
+        self.assertFalse(Order.objects.exists())
+
+
+class SessaoEmCacheQueryCountTest(TestCase):
+    """
+    Compara as queries por requisição entre os backends de sessão: com a
+    sessão no cache ou em cookie assinado, o SELECT em django_session some.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.vendedor = User.objects.create_user(
+            username="vendedor_sessao", password="123"
+        )
+        cls.comprador = User.objects.create_user(
+            username="comprador_sessao", password="123"
+        )
+        cls.categoria = Categoria.objects.create(nome="Sessão")
+        cls.subcategoria = Subcategoria.objects.create(
+            nome="Cache", categoria_pai=cls.categoria
+        )
+        cls.produto = Produto.objects.create(
+            vendedor=cls.vendedor,
+            subcategoria=cls.subcategoria,
+            nome="Teclado",
+            preco=decimal.Decimal("99.90"),
+            quantidade=5,
+            imagem=SimpleUploadedFile(
+                "sessao.jpg", b"fake_image_data", content_type="image/jpeg"
+            ),
+        )
+        carrinho = Carrinho.objects.create(usuario=cls.comprador)
+        ItemCarrinho.objects.create(
+            carrinho=carrinho, produto=cls.produto, quantidade=2
+        )
+
+    def _contar_queries_por_backend(self, url):
+        contagem = {}
+        for nome, engine in SESSION_ENGINES.items():
+            with self.settings(SESSION_ENGINE=engine, CACHES=CACHE_TESTE):
+                client = Client()
+                client.login(username="comprador_sessao", password="123")
+                # Primeira requisição aquece o cache da sessão (cached_db)
+                client.get(url)
+
+                with CaptureQueriesContext(connection) as queries:
+                    response = client.get(url)
+
+                self.assertEqual(response.status_code, 200)
+                contagem[nome] = len(queries)
+        return contagem
+
+    def test_carrinho_com_sessao_em_cache(self):
+        contagem = self._contar_queries_por_backend(reverse("carrinho"))
+
+        self.assertEqual(contagem["cached_db"], contagem["db"] - 1)
+        self.assertEqual(contagem["signed_cookies"], contagem["db"] - 1)
+
+    def test_produto_com_sessao_em_cache(self):
+        contagem = self._contar_queries_por_backend(
+            reverse("pagina_produto", args=[self.produto.id])
+        )
+
+        self.assertEqual(contagem["cached_db"], contagem["db"] - 1)
+        self.assertEqual(contagem["signed_cookies"], contagem["db"] - 1)
+
+
+# Orçamentos medidos com o volume do OrcamentoTestCase. Se uma mudança
+# aumentar um destes números, confira a lista de queries do erro antes de
+# subir o limite: quase sempre é um select_related/prefetch_related faltando.
+Q_HOME = 4
+Q_HOME_LOGADO = 7
+Q_CATEGORIA = 4
+# A página soma as reservas ativas do produto para mostrar o disponível e lê
+# os "comprados juntos" pré-calculados
+Q_PRODUTO = 7
+Q_PRODUTO_POST = 8
+Q_CARRINHO = 5
+Q_ADICIONAR = 3
+# O UPDATE condicional, e o DELETE quando a linha chegaria a zero
+Q_REMOVER = 4
+Q_EXCLUIR = 3
+# Lote de alterações no carrinho pela API JSON, qualquer que seja o tamanho
+Q_CARRINHO_API = 10
+# Os checkouts travam os produtos, somam as reservas ativas e gravam as novas
+# numa transação (o SAVEPOINT e o RELEASE também contam nos testes)
+Q_PAGAMENTO = 13
+Q_PAGAMENTO_TODOS = 13
+# A aprovação grava as vendas no livro do estoque num INSERT só e confere o
+# disponível (reservas dos outros pedidos) antes de baixar
+Q_WEBHOOK = 11
+Q_RETORNO = 3
+# Folgado para o CI; o mesmo valor do PERF_BUDGET_MS padrão
+MS_PAGINA = 500
+# O autocompletar responde do índice em memória, sem ir ao banco
+Q_AUTOCOMPLETE = 0
+MS_AUTOCOMPLETE = 50
+
+
+class StoreOrcamentoTest(OrcamentoTestCase):
+    """Limites de queries e de tempo das views do Store com volume realista."""
+
+    def test_home(self):
+        with self.assertOrcamento(Q_HOME, ms=MS_PAGINA):
+            response = self.client.get(reverse("home"))
+        self.assertContains(response, "Produto 199")
+
+    def test_home_logado(self):
+        self.logar(self.comprador)
+        with self.assertOrcamento(Q_HOME_LOGADO, ms=MS_PAGINA):
+            self.client.get(reverse("home"))
+
+    def test_categoria_pai(self):
+        with self.assertOrcamento(Q_CATEGORIA, ms=MS_PAGINA):
+            response = self.client.get(reverse("categoria", args=["Categoria 1"]))
+        self.assertEqual(response.status_code, 200)
+
+    def test_subcategoria(self):
+        with self.assertOrcamento(Q_CATEGORIA, ms=MS_PAGINA):
+            response = self.client.get(reverse("categoria", args=["Sub 1-1"]))
+        self.assertEqual(response.status_code, 200)
+
+    def test_categoria_com_filtros_e_ordenacoes(self):
+        facetas.atualizar()
+        filtros = [
+            {},
+            {"faixa": 0},
+            {"vendedor": self.vendedor.id, "em_estoque": 0},
+        ]
+        for ordem in ORDENACOES:
+            for filtro in filtros:
+                with self.subTest(ordem=ordem, **filtro), self.assertOrcamento(
+                    Q_CATEGORIA, ms=MS_PAGINA
+                ):
+                    response = self.client.get(
+                        reverse("categoria", args=["Categoria 1"]),
+                        {"ordem": ordem, **filtro},
+                    )
+                self.assertEqual(response.context["ordem"], ordem)
+
+    def test_autocomplete(self):
+        diretorio = tempfile.TemporaryDirectory()
+        self.addCleanup(diretorio.cleanup)
+        with self.settings(AUTOCOMPLETE_DIR=diretorio.name), mock.patch.object(
+            autocompletar, "_indice", None
+        ):
+            autocompletar.reconstruir()
+            with self.assertOrcamento(Q_AUTOCOMPLETE, ms=MS_AUTOCOMPLETE):
+                response = self.client.get(reverse("autocomplete"), {"q": "produto 19"})
+        self.assertEqual(len(response.json()["resultados"]), 10)
+
+    def test_produto(self):
+        self.logar(self.comprador)
+        with self.assertOrcamento(Q_PRODUTO, ms=MS_PAGINA):
+            self.client.get(reverse("pagina_produto", args=[self.produto.id]))
+
+    def test_produto_adiciona_ao_carrinho(self):
+        self.logar(self.comprador)
+        with self.assertOrcamento(Q_PRODUTO_POST, ms=MS_PAGINA):
+            self.client.post(
+                reverse("pagina_produto", args=[self.produtos[100].id]),
+                {"quantidade": 1},
+            )
+
+    def test_carrinho_com_30_itens(self):
+        self.logar(self.comprador)
+        with self.assertOrcamento(Q_CARRINHO, ms=MS_PAGINA):
+            response = self.client.get(reverse("carrinho"))
+        self.assertEqual(len(response.context["itens_por_vendedor"]), 10)
+
+    def test_adicionar_remover_excluir(self):
+        self.logar(self.comprador)
+        with self.assertOrcamento(Q_ADICIONAR):
+            self.client.get(reverse("adicionar_carrinho", args=[self.produto.id, 1]))
+        with self.assertOrcamento(Q_REMOVER):
+            self.client.get(reverse("remover_carrinho", args=[self.produto.id]))
+        with self.assertOrcamento(Q_EXCLUIR):
+            self.client.get(reverse("excluir_carrinho", args=[self.produto.id]))
+
+    def test_carrinho_api_lote(self):
+        self.logar(self.comprador)
+        alteracoes = [
+            {"produto": produto.id, "acao": acao, "quantidade": 1}
+            for produto, acao in zip(
+                self.produtos[:40], ["adicionar", "remover", "definir", "excluir"] * 10
+            )
+        ] + [{"produto": produto.id} for produto in self.produtos[100:110]]
+        with self.assertOrcamento(Q_CARRINHO_API, ms=MS_PAGINA):
+            response = self.client.post(
+                reverse("carrinho_api"),
+                {"alteracoes": alteracoes},
+                content_type="application/json",
+            )
+        self.assertEqual(len(response.json()["itens"]), 50)
+
+    @mock.patch("Store.views.realizar_pagamento_async")
+    def test_pagamento(self, mock_pagamento):
+        mock_pagamento.return_value = "https://mp.test/checkout"
+        self.logar(self.comprador)
+        with self.assertOrcamento(Q_PAGAMENTO):
+            self.client.get(reverse("pagamento", args=[self.vendedor.id]))
+        mock_pagamento.assert_called_once()
+
+    @mock.patch("Store.views.realizar_pagamento_async")
+    def test_pagamento_todos(self, mock_pagamento):
+        mock_pagamento.return_value = "https://mp.test/checkout"
+        self.logar(self.comprador)
+        with self.assertOrcamento(Q_PAGAMENTO_TODOS):
+            self.client.get(reverse("pagamento_todos"))
+        self.assertEqual(mock_pagamento.call_count, 10)
+
+    @mock.patch("Store.views.consultar_pagamento_async")
+    def test_webhook_aprovado(self, mock_consulta):
+        mock_consulta.return_value = {
+            "status": 200,
+            "response": {
+                "status": "approved",
+                "external_reference": str(self.pedido.id),
+            },
+        }
+        with self.assertOrcamento(Q_WEBHOOK):
+            self.client.post(
+                reverse("mercadopago_webhook"),
+                data=json.dumps({"type": "payment", "data": {"id": "1"}}),
+                content_type="application/json",
+            )
+
+    def test_paginas_de_retorno_do_checkout(self):
+        self.logar(self.comprador)
+        for nome in ("compra_success", "compra_failure", "compra_pending"):
+            with self.subTest(nome), self.assertOrcamento(Q_RETORNO, ms=MS_PAGINA):
+                self.client.get(reverse(nome))
+
+
+class SeedMarketplaceTest(TestCase):
+    """Testa o comando seed_marketplace com volumes pequenos e lotes menores que as tabelas."""
+
+    def _seed(self, prefixo="seed", **opcoes):
+        argumentos = {
+            "compradores": 30,
+            "vendedores": 4,
+            "categorias": 3,
+            "subcategorias": 2,
+            "produtos": 50,
+            "carrinhos": 10,
+            "itens_carrinho": 3,
+            "pedidos": 25,
+            "itens_pedido": 3,
+            "lote": 7,
+            **opcoes,
+        }
+        call_command(
+            "seed_marketplace", prefixo=prefixo, stdout=StringIO(), **argumentos
+        )
+
+    def test_gera_as_quantidades_pedidas(self):
+        self._seed()
+
+        self.assertEqual(User.objects.count(), 34)
+        self.assertEqual(Profile.objects.count(), 34)
+        self.assertEqual(Profile.objects.filter(vendedor=True).count(), 4)
+        self.assertEqual(Subcategoria.objects.count(), 6)
+        self.assertEqual(Produto.objects.count(), 50)
+        self.assertEqual(Carrinho.objects.count(), 10)
+        self.assertEqual(ItemCarrinho.objects.count(), 30)
+        self.assertEqual(Order.objects.count(), 25)
+        self.assertTrue(
+            self.client.login(username="seed_comprador_0", password="seed123")
+        )
+
+    def test_pedidos_consistentes_e_historicos(self):
+        self._seed(dias=30)
+
+        for pedido in Order.objects.prefetch_related("itens__produto"):
+            itens = list(pedido.itens.all())
+            self.assertTrue(itens)
+            self.assertEqual(pedido.valor_total_pedido, pedido.calcular_valor_total)
+            for item in itens:
+                self.assertEqual(item.produto.vendedor_id, pedido.vendedor_id)
+                self.assertEqual(item.preco, item.produto.preco)
+        datas = Order.objects.values_list("data", flat=True)
+        self.assertGreater(len(set(d.date() for d in datas)), 1)
+        # auto_now_add volta ao normal depois do comando
+        self.assertTrue(Order._meta.get_field("data").auto_now_add)
+
+    def test_mesma_semente_gera_os_mesmos_dados(self):
+        self._seed(prefixo="a")
+        self._seed(prefixo="b")
+
+        produtos = list(
+            Produto.objects.order_by("id").values_list(
+                "nome", "preco", "quantidade", "subcategoria__nome"
+            )
+        )
+        self.assertEqual(produtos[:50], produtos[50:])
+
+    def test_prefixo_repetido(self):
+        self._seed()
+        with self.assertRaises(CommandError):
+            self._seed()
+
+
+class CarrinhoAnonimoTest(TestCase):
+    """Carrinho em cookie para quem não fez login e mescla no login."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.comprador = User.objects.create_user(
+            username="comprador_cookie", password="123"
+        )
+        cls.vendedor, _, cls.produtos = _catalogo("Cookies", 3)
+
+    def adicionar(self, produto, quantidade=1):
+        return self.client.get(
+            reverse("adicionar_carrinho", args=[produto.id, quantidade])
+        )
+
+    def logar(self):
+        return self.client.post(
+            reverse("logar"), {"usuario": "comprador_cookie", "senha": "123"}
+        )
+
+    def test_navegar_e_adicionar_sem_login_nao_grava_no_banco(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse("home"))
+            self.client.get(reverse("pagina_produto", args=[self.produtos[0].id]))
+            self.client.post(
+                reverse("pagina_produto", args=[self.produtos[0].id]),
+                {"quantidade": 2},
+            )
+            self.adicionar(self.produtos[1])
+            self.adicionar(self.produtos[2])
+            self.client.get(reverse("remover_carrinho", args=[self.produtos[0].id]))
+            self.client.get(reverse("excluir_carrinho", args=[self.produtos[2].id]))
+            self.client.get(reverse("carrinho"))
+
+        escritas = [
+            query["sql"]
+            for query in queries.captured_queries
+            if not query["sql"].lstrip().upper().startswith("SELECT")
+        ]
+        self.assertEqual(escritas, [])
+        self.assertEqual(
+            _itens_do_cookie(self.client),
+            {self.produtos[0].id: 1, self.produtos[1].id: 1},
+        )
+
+    def test_quantidade_limitada_ao_estoque(self):
+        self.adicionar(self.produtos[0], 4)
+        self.adicionar(self.produtos[0], 4)
+        self.assertEqual(_itens_do_cookie(self.client), {self.produtos[0].id: 5})
+
+    def test_cookie_adulterado_vira_carrinho_vazio(self):
+        self.client.cookies[COOKIE_CARRINHO] = f"{self.produtos[0].id}:3"
+        response = self.client.get(reverse("carrinho"))
+        self.assertEqual(response.context["itens_por_vendedor"], {})
+
+    def test_limite_de_itens(self):
+        carrinho = CarrinhoAnonimo(",".join(f"{1000 + i}:1" for i in range(MAX_ITENS)))
+        self.assertFalse(carrinho.adicionar(self.produtos[0], 1))
+        self.assertEqual(len(carrinho), MAX_ITENS)
+
+    def test_login_mescla_no_carrinho_e_apaga_o_cookie(self):
+        carrinho = Carrinho.objects.create(usuario=self.comprador)
+        ItemCarrinho.objects.create(
+            carrinho=carrinho, produto=self.produtos[0], quantidade=4
+        )
+        self.adicionar(self.produtos[0], 3)
+        self.adicionar(self.produtos[1], 2)
+
+        response = self.logar()
+
+        self.assertRedirects(response, reverse("home"))
+        self.assertEqual(
+            dict(carrinho.itens.values_list("produto_id", "quantidade")),
+            # 4 + 3 passa do estoque (5)
+            {self.produtos[0].id: 5, self.produtos[1].id: 2},
+        )
+        self.assertEqual(response.cookies[COOKIE_CARRINHO].value, "")
+        self.assertEqual(_itens_do_cookie(self.client), {})
+
+    def test_login_cria_o_carrinho_quando_nao_existe(self):
+        self.adicionar(self.produtos[2], 1)
+        self.logar()
+        self.assertEqual(
+            list(self.comprador.carrinho.itens.values_list("produto_id", "quantidade")),
+            [(self.produtos[2].id, 1)],
+        )
+
+    def test_login_sem_carrinho_anonimo_nao_escreve_no_carrinho(self):
+        self.logar()
+        self.assertFalse(Carrinho.objects.filter(usuario=self.comprador).exists())
+
+
+class CarrinhoApiTest(TestCase):
+    """API JSON do carrinho: alterações em lote e resposta parcial."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.vendedores = [
+            User.objects.create_user(username=f"vendedor_api_{i}") for i in range(2)
+        ]
+        cls.comprador = User.objects.create_user(username="comprador_api")
+        _, _, cls.produtos = _catalogo(
+            "API",
+            3,
+            preco=lambda i: decimal.Decimal("10.00") * (i + 1),
+            vendedor=lambda i: cls.vendedores[i % 2],
+        )
+        cls.carrinho = Carrinho.objects.create(usuario=cls.comprador)
+        ItemCarrinho.objects.create(
+            carrinho=cls.carrinho, produto=cls.produtos[0], quantidade=2
+        )
+
+    def alterar(self, *alteracoes):
+        return self.client.post(
+            reverse("carrinho_api"),
+            {"alteracoes": list(alteracoes)},
+            content_type="application/json",
+        )
+
+    def quantidades(self):
+        return dict(self.carrinho.itens.values_list("produto_id", "quantidade"))
+
+    def test_lote_de_alteracoes_responde_so_o_que_mudou(self):
+        self.client.force_login(self.comprador)
+        p0, p1, p2 = self.produtos
+
+        response = self.alterar(
+            {"produto": p0.id, "acao": "adicionar", "quantidade": 10},
+            {"produto": p1.id, "acao": "definir", "quantidade": 3},
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.json(),
+            {
+                "itens": [
+                    # 2 + 10 passa do estoque (5)
+                    {"produto": p0.id, "quantidade": 5, "subtotal": "50.00"},
+                    {"produto": p1.id, "quantidade": 3, "subtotal": "60.00"},
+                ],
+                "vendedores": [
+                    {"vendedor": self.vendedores[0].id, "subtotal": "50.00"},
+                    {"vendedor": self.vendedores[1].id, "subtotal": "60.00"},
+                ],
+                "total": "110.00",
+            },
+        )
+        self.assertEqual(self.quantidades(), {p0.id: 5, p1.id: 3})
+
+    def test_remover_e_excluir(self):
+        self.client.force_login(self.comprador)
+        p0, p1, _ = self.produtos
+        ItemCarrinho.objects.create(carrinho=self.carrinho, produto=p1, quantidade=1)
+
+        response = self.alterar(
+            {"produto": p0.id, "acao": "remover"}, {"produto": p1.id, "acao": "excluir"}
+        )
+
+        dados = response.json()
+        self.assertEqual(
+            [(item["produto"], item["quantidade"]) for item in dados["itens"]],
+            [(p0.id, 1), (p1.id, 0)],
+        )
+        self.assertEqual(dados["total"], "10.00")
+        self.assertEqual(self.quantidades(), {p0.id: 1})
+
+    def test_mesmo_produto_varias_vezes_no_lote(self):
+        self.client.force_login(self.comprador)
+        p2 = self.produtos[2]
+        self.alterar(
+            {"produto": p2.id, "acao": "adicionar", "quantidade": 2},
+            {"produto": p2.id, "acao": "adicionar", "quantidade": 2},
+            {"produto": p2.id, "acao": "remover"},
+        )
+        self.assertEqual(self.quantidades()[p2.id], 3)
+
+    def test_sem_login_usa_o_cookie(self):
+        p0, p1, _ = self.produtos
+        self.alterar({"produto": p0.id, "quantidade": 2})
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.alterar({"produto": p1.id})
+
+        self.assertEqual(response.json()["total"], "40.00")
+        self.assertEqual(_itens_do_cookie(self.client), {p0.id: 2, p1.id: 1})
+        self.assertEqual(len(queries), 1)
+        self.assertEqual(self.quantidades(), {p0.id: 2})
+
+    def test_entrada_invalida(self):
+        self.client.force_login(self.comprador)
+        for corpo in (
+            "nao é json",
+            {"alteracoes": []},
+            {"alteracoes": [{"acao": "adicionar"}]},
+            {"alteracoes": [{"produto": self.produtos[0].id, "acao": "voar"}]},
+            {"alteracoes": [{"produto": self.produtos[0].id, "quantidade": -1}]},
+        ):
+            with self.subTest(corpo=corpo):
+                response = self.client.post(
+                    reverse("carrinho_api"), corpo, content_type="application/json"
+                )
+                self.assertEqual(response.status_code, 400)
+                self.assertIn("erro", response.json())
+
+    def test_produto_inexistente_nao_altera_nada(self):
+        self.client.force_login(self.comprador)
+        response = self.alterar(
+            {"produto": self.produtos[1].id}, {"produto": 999_999, "acao": "adicionar"}
+        )
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(self.quantidades(), {self.produtos[0].id: 2})
+
+    def test_so_aceita_post(self):
+        response = self.client.get(reverse("carrinho_api"))
+        self.assertEqual(response.status_code, 405)
+
+
+class CarrinhoSqlTest(TestCase):
+    """Soma e retirada de itens do carrinho em um comando SQL."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.comprador = User.objects.create_user(username="comprador_sql")
+        cls.vendedor, _, (cls.produto, cls.esgotado) = _catalogo(
+            "SQL",
+            2,
+            nome=lambda i: ("Produto", "Esgotado")[i],
+            quantidade=lambda i: (5, 0)[i],
+        )
+
+    def quantidades(self):
+        return dict(
+            ItemCarrinho.objects.filter(carrinho__usuario=self.comprador).values_list(
+                "produto_id", "quantidade"
+            )
+        )
+
+    def test_somar_cria_o_carrinho_e_a_linha(self):
+        self.assertEqual(somar_item(self.comprador.id, self.produto.id, 2), 2)
+        self.assertEqual(self.quantidades(), {self.produto.id: 2})
+
+    def test_somar_numa_linha_existente_e_uma_query(self):
+        somar_item(self.comprador.id, self.produto.id, 2)
+        with self.assertNumQueries(1):
+            quantidade = somar_item(self.comprador.id, self.produto.id, 10)
+        # 2 + 10 passa do estoque (5)
+        self.assertEqual(quantidade, 5)
+        self.assertEqual(self.quantidades(), {self.produto.id: 5})
+
+    def test_somar_sem_estoque_ou_produto_inexistente(self):
+        Carrinho.objects.create(usuario=self.comprador)
+        self.assertEqual(somar_item(self.comprador.id, self.esgotado.id, 1), 0)
+        self.assertEqual(somar_item(self.comprador.id, 999_999, 1), 0)
+        self.assertEqual(self.quantidades(), {})
+
+    def test_tirar_e_excluir(self):
+        somar_item(self.comprador.id, self.produto.id, 2)
+        tirar_item(self.comprador.id, self.produto.id)
+        self.assertEqual(self.quantidades(), {self.produto.id: 1})
+        tirar_item(self.comprador.id, self.produto.id)
+        self.assertEqual(self.quantidades(), {})
+
+        somar_item(self.comprador.id, self.produto.id, 3)
+        excluir_item(self.comprador.id, self.produto.id)
+        self.assertEqual(self.quantidades(), {})
+
+    def test_linha_duplicada_e_recusada_pelo_banco(self):
+        carrinho = Carrinho.objects.create(usuario=self.comprador)
+        ItemCarrinho.objects.create(carrinho=carrinho, produto=self.produto)
+        with self.assertRaises(IntegrityError):
+            ItemCarrinho.objects.create(carrinho=carrinho, produto=self.produto)
+
+
+class ReservaEstoqueTest(TestCase):
+    """Reservas de estoque entre o checkout e a aprovação do pagamento."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.vendedor, _, (cls.produto,) = _catalogo(
+            "Reserva",
+            1,
+            nome="Última unidade",
+            preco=decimal.Decimal("50.00"),
+            quantidade=1,
+        )
+        Profile.objects.filter(usuario=cls.vendedor).update(
+            mp_access_token="TOKEN", mp_connected=True
+        )
+        cls.compradores = [
+            User.objects.create_user(username=f"comprador_reserva_{i}")
+            for i in range(2)
+        ]
+        for comprador in cls.compradores:
+            ItemCarrinho.objects.create(
+                carrinho=Carrinho.objects.create(usuario=comprador),
+                produto=cls.produto,
+                quantidade=1,
+            )
+
+    def checkout(self, comprador):
+        self.client.force_login(comprador)
+        return self.client.get(reverse("pagamento", args=[self.vendedor.id]))
+
+    def webhook(self, pedido, status):
+        with mock.patch("Store.views.consultar_pagamento_async") as consulta:
+            consulta.return_value = {
+                "status": 200,
+                "response": {"status": status, "external_reference": str(pedido.id)},
+            }
+            return self.client.post(
+                reverse("mercadopago_webhook"),
+                {"type": "payment", "data": {"id": "1"}},
+                content_type="application/json",
+            )
+
+    @mock.patch("Store.views.realizar_pagamento_async")
+    def test_checkout_reserva_e_segundo_comprador_nao_leva_a_mesma_unidade(
+        self, mock_pagamento
+    ):
+        mock_pagamento.return_value = "https://mp.test/checkout"
+
+        self.checkout(self.compradores[0])
+        reserva = Reserva.objects.get()
+        self.assertEqual(reserva.quantidade, 1)
+        self.assertAlmostEqual(
+            (reserva.expira_em - timezone.now()).total_seconds(),
+            settings.RESERVA_TTL_MINUTES * 60,
+            delta=60,
+        )
+
+        response = self.checkout(self.compradores[1])
+
+        self.assertRedirects(
+            response, reverse("carrinho"), fetch_redirect_response=False
+        )
+        self.assertEqual(Order.objects.filter(comprador=self.compradores[1]).count(), 0)
+        self.assertIn(
+            "Estoque insuficiente", str(list(get_messages(response.wsgi_request))[0])
+        )
+        mock_pagamento.assert_called_once()
+        # O carrinho do segundo comprador continua lá para tentar de novo
+        self.assertTrue(
+            ItemCarrinho.objects.filter(carrinho__usuario=self.compradores[1]).exists()
+        )
+
+    @mock.patch("Store.views.realizar_pagamento_async")
+    def test_reserva_vencida_nao_conta(self, mock_pagamento):
+        mock_pagamento.return_value = "https://mp.test/checkout"
+        self.checkout(self.compradores[0])
+        Reserva.objects.update(expira_em=timezone.now() - timedelta(seconds=1))
+
+        self.checkout(self.compradores[1])
+
+        self.assertEqual(Order.objects.filter(comprador=self.compradores[1]).count(), 1)
+        self.assertEqual(reservas.disponivel(self.produto), 0)
+
+    @mock.patch("Store.views.realizar_pagamento_async")
+    def test_aprovacao_baixa_o_estoque_uma_vez_e_apaga_a_reserva(self, mock_pagamento):
+        mock_pagamento.return_value = "https://mp.test/checkout"
+        self.checkout(self.compradores[0])
+        pedido = Order.objects.get()
+
+        self.webhook(pedido, "approved")
+        self.assertEqual(reservas.confirmar(pedido.id), None)
+
+        self.produto.refresh_from_db()
+        self.assertEqual(self.produto.quantidade, 0)
+        self.assertFalse(Reserva.objects.exists())
+
+    @mock.patch("Store.views.realizar_pagamento_async")
+    def test_aprovacao_sem_estoque_avisa_no_log(self, mock_pagamento):
+        mock_pagamento.return_value = "https://mp.test/checkout"
+        self.checkout(self.compradores[0])
+        pedido = Order.objects.get()
+        # A reserva venceu e a unidade foi vendida por fora
+        Produto.objects.filter(id=self.produto.id).update(quantidade=0)
+
+        with mock.patch.object(reservas.metricas, "incrementar") as incrementar:
+            with self.assertLogs("Store.reservas", "WARNING") as logs:
+                reservas.confirmar(pedido.id)
+
+        self.assertIn(f"produto {self.produto.id}", logs.output[0])
+        incrementar.assert_called_once_with("loja_estoque_insuficiente_total")
+        self.produto.refresh_from_db()
+        self.assertEqual(self.produto.quantidade, 0)
+        pedido.refresh_from_db()
+        self.assertEqual(pedido.status_pagamento, reservas.APROVADO_SEM_ESTOQUE)
+
+    @mock.patch("Store.views.realizar_pagamento_async")
+    def test_aprovacao_atrasada_de_pedido_expirado(self, mock_pagamento):
+        mock_pagamento.return_value = "https://mp.test/checkout"
+        self.checkout(self.compradores[0])
+        expirado = Order.objects.get()
+        Order.objects.filter(id=expirado.id).update(
+            data=timezone.now() - timedelta(days=3)
+        )
+        manutencao.executar()
+        # Com a reserva apagada, o segundo comprador leva a última unidade
+        self.checkout(self.compradores[1])
+        segundo = Order.objects.exclude(id=expirado.id).get()
+
+        with self.assertLogs("Store.reservas", "WARNING"):
+            self.webhook(expirado, "approved")
+        repetido = self.webhook(expirado, "approved")
+
+        expirado.refresh_from_db()
+        self.assertEqual(expirado.status_pagamento, reservas.APROVADO_SEM_ESTOQUE)
+        self.assertEqual(repetido.json(), {"status": "ok"})
+        self.produto.refresh_from_db()
+        self.assertEqual(self.produto.quantidade, 1)
+        # A reserva do segundo comprador continua valendo
+        self.assertTrue(Reserva.objects.filter(order=segundo).exists())
+
+        self.webhook(segundo, "approved")
+        segundo.refresh_from_db()
+        self.assertEqual(segundo.status_pagamento, reservas.APROVADO)
+        self.produto.refresh_from_db()
+        self.assertEqual(self.produto.quantidade, 0)
+
+    @mock.patch("Store.views.realizar_pagamento_async")
+    def test_pedido_expirado_aprovado_com_estoque_livre(self, mock_pagamento):
+        mock_pagamento.return_value = "https://mp.test/checkout"
+        self.checkout(self.compradores[0])
+        pedido = Order.objects.get()
+        Order.objects.filter(id=pedido.id).update(
+            data=timezone.now() - timedelta(days=3)
+        )
+        manutencao.executar()
+
+        self.webhook(pedido, "approved")
+
+        pedido.refresh_from_db()
+        self.assertEqual(pedido.status_pagamento, reservas.APROVADO)
+        self.produto.refresh_from_db()
+        self.assertEqual(self.produto.quantidade, 0)
+
+    @mock.patch("Store.views.realizar_pagamento_async")
+    def test_pagamento_recusado_libera_a_reserva(self, mock_pagamento):
+        mock_pagamento.return_value = "https://mp.test/checkout"
+        self.checkout(self.compradores[0])
+
+        self.webhook(Order.objects.get(), "rejected")
+
+        self.assertFalse(Reserva.objects.exists())
+        self.assertEqual(reservas.disponivel(self.produto), 1)
+
+    @mock.patch("Store.views.realizar_pagamento_async")
+    def test_falha_no_mercado_pago_libera_a_reserva(self, mock_pagamento):
+        mock_pagamento.side_effect = Exception("API fora do ar")
+        with self.assertLogs("Store.views", "ERROR") as logs:
+            self.checkout(self.compradores[0])
+        self.assertIn("API fora do ar", logs.output[0])
+        self.assertFalse(Reserva.objects.exists())
+        # Sem link o pedido não fica pendente para sempre
+        self.assertFalse(Order.objects.exists())
+        self.assertTrue(
+            ItemCarrinho.objects.filter(carrinho__usuario=self.compradores[0]).exists()
+        )
+
+    def test_pagina_do_produto_mostra_o_disponivel(self):
+        pedido = Order.objects.create(
+            vendedor=self.vendedor, comprador=self.compradores[0]
+        )
+        Reserva.objects.create(
+            order=pedido,
+            produto=self.produto,
+            quantidade=1,
+            expira_em=timezone.now() + timedelta(minutes=5),
+        )
+        response = self.client.get(reverse("pagina_produto", args=[self.produto.id]))
+        self.assertEqual(response.context["disponivel"], 0)
+
+    def test_expirar_apaga_so_as_vencidas_em_lotes(self):
+        pedido = Order.objects.create(
+            vendedor=self.vendedor, comprador=self.compradores[0]
+        )
+        agora = timezone.now()
+        Reserva.objects.bulk_create(
+            Reserva(
+                order=pedido,
+                produto=self.produto,
+                quantidade=1,
+                expira_em=agora + timedelta(minutes=minutos),
+            )
+            for minutos in [-10] * 5 + [10] * 2
+        )
+
+        with self.assertNumQueries(3 * 2 + 1):
+            apagadas = reservas.expirar(lote=2)
+
+        self.assertEqual(apagadas, 5)
+        self.assertEqual(Reserva.objects.count(), 2)
+
+
+class ManutencaoTest(TestCase):
+    """Limpeza em lotes de pedidos pendentes, carrinhos e reservas."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario, _, cls.produtos = _catalogo("Manutenção", 3)
+
+    def pedido(self, status, horas_atras):
+        pedido = Order.objects.create(
+            vendedor=self.usuario,
+            comprador=self.usuario,
+            valor_total_pedido=10,
+            status_pagamento=status,
+        )
+        # data é auto_now_add; só um UPDATE consegue voltar no tempo
+        Order.objects.filter(id=pedido.id).update(
+            data=timezone.now() - timedelta(hours=horas_atras)
+        )
+        return pedido
+
+    def test_expira_pendentes_antigos_e_devolve_a_reserva(self):
+        antigos = [self.pedido("pendente", 72) for _ in range(3)]
+        recente = self.pedido("pendente", 1)
+        aprovado = self.pedido("approved", 72)
+        for pedido in antigos + [recente]:
+            Reserva.objects.create(
+                order=pedido,
+                produto=self.produtos[0],
+                quantidade=1,
+                expira_em=timezone.now() + timedelta(minutes=10),
+            )
+
+        # Lotes de 2: dois lotes cheios (SELECT, DELETE, UPDATE e os
+        # savepoints) e o SELECT que acha a fila vazia
+        with self.assertNumQueries(2 * 5 + 1):
+            expirados = manutencao.expirar_pedidos(48, 2, timezone.now())
+
+        self.assertEqual(expirados, 3)
+        self.assertEqual(Order.objects.filter(status_pagamento="expirado").count(), 3)
+        recente.refresh_from_db()
+        aprovado.refresh_from_db()
+        self.assertEqual(recente.status_pagamento, "pendente")
+        self.assertEqual(aprovado.status_pagamento, "approved")
+        self.assertEqual(
+            list(Reserva.objects.values_list("order", flat=True)), [recente.id]
+        )
+        self.assertEqual(reservas.disponivel(self.produtos[0]), 4)
+
+    def test_pagamento_em_aberto_usa_o_prazo_longo(self):
+        boleto = self.pedido("pending", 72)
+        pix = self.pedido("in_process", 72)
+        esquecido = self.pedido("in_process", 24 * 40)
+
+        contagens = manutencao.executar()
+
+        self.assertEqual(contagens["pedidos_expirados"], 0)
+        self.assertEqual(contagens["pagamentos_em_aberto_expirados"], 1)
+        for pedido, status in (
+            (boleto, "pending"),
+            (pix, "in_process"),
+            (esquecido, "expirado"),
+        ):
+            pedido.refresh_from_db()
+            self.assertEqual(pedido.status_pagamento, status)
+
+    def test_apaga_so_os_expirados_fora_da_retencao(self):
+        velho = self.pedido("expirado", 24 * 40)
+        ItemOrder.objects.create(
+            order=velho, produto=self.produtos[0], quantidade=1, preco=10
+        )
+        novo = self.pedido("expirado", 24 * 5)
+        pago = self.pedido("approved", 24 * 40)
+
+        apagados = manutencao.apagar_pedidos_expirados(30, 100, timezone.now())
+
+        self.assertEqual(apagados, 1)
+        self.assertEqual(
+            set(Order.objects.values_list("id", flat=True)), {novo.id, pago.id}
+        )
+        self.assertFalse(ItemOrder.objects.filter(order_id=velho.id).exists())
+
+    def test_limpa_linhas_de_carrinho_abandonadas(self):
+        carrinho = Carrinho.objects.create(usuario=self.usuario)
+        for produto in self.produtos:
+            ItemCarrinho.objects.create(
+                carrinho=carrinho, produto=produto, quantidade=1
+            )
+        ItemCarrinho.objects.filter(produto__in=self.produtos[:2]).update(
+            atualizado_em=timezone.now() - timedelta(days=45)
+        )
+
+        apagados = manutencao.limpar_carrinhos(30, 1, timezone.now())
+
+        self.assertEqual(apagados, 2)
+        self.assertEqual(
+            list(carrinho.itens.values_list("produto", flat=True)),
+            [self.produtos[2].id],
+        )
+
+    def test_mexer_no_carrinho_renova_a_linha(self):
+        Carrinho.objects.create(usuario=self.usuario)
+        somar_item(self.usuario.id, self.produtos[0].id, 2)
+        ItemCarrinho.objects.update(atualizado_em=timezone.now() - timedelta(days=45))
+
+        tirar_item(self.usuario.id, self.produtos[0].id)
+
+        self.assertEqual(manutencao.limpar_carrinhos(30, 100, timezone.now()), 0)
+
+    def test_comando_reporta_as_contagens(self):
+        self.pedido("pendente", 72)
+        saida = StringIO()
+        call_command("manutencao", "--lote", "10", stdout=saida)
+        self.assertIn("pedidos_expirados=1", saida.getvalue())
+        self.assertIn("itens_carrinho_apagados=0", saida.getvalue())
+        self.assertIn("reservas_vencidas_apagadas=0", saida.getvalue())
+
+
+class LivroEstoqueTest(TestCase):
+    """Livro-razão do estoque: movimentos, fotos e conciliação."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.vendedor, _, cls.produtos = _catalogo(
+            "Livro", 3, salvar=estoque.salvar, quantidade=10
+        )
+
+    def movimentos(self, produto):
+        return list(
+            MovimentoEstoque.objects.filter(produto=produto)
+            .order_by("id")
+            .values_list("tipo", "delta")
+        )
+
+    def test_cadastro_e_edicao_entram_no_livro(self):
+        produto = self.produtos[0]
+        produto.quantidade = "15"
+        estoque.salvar(produto)
+        produto.quantidade = 12
+        estoque.salvar(produto)
+        produto.nome = "Só o nome mudou"
+        estoque.salvar(produto)
+
+        Tipo = MovimentoEstoque.Tipo
+        self.assertEqual(
+            self.movimentos(produto),
+            [(Tipo.CADASTRO, 10), (Tipo.REPOSICAO, 5), (Tipo.AJUSTE, -3)],
+        )
+        self.assertEqual(estoque.saldos([produto.id]), {produto.id: 12})
+
+    def test_venda_aprovada_sai_do_livro(self):
+        comprador = User.objects.create_user(username="comprador_livro")
+        pedido = Order.objects.create(
+            vendedor=self.vendedor, comprador=comprador, valor_total_pedido=30
+        )
+        ItemOrder.objects.create(
+            order=pedido, produto=self.produtos[1], quantidade=3, preco=10
+        )
+
+        reservas.confirmar(pedido.id)
+
+        self.assertEqual(
+            self.movimentos(self.produtos[1])[-1], (MovimentoEstoque.Tipo.VENDA, -3)
+        )
+        self.assertEqual(list(estoque.conciliar()), [(3, [])])
+
+    def test_foto_mais_movimentos_recentes(self):
+        produto = self.produtos[0]
+        depois = timezone.now() + estoque.FOLGA_FOTO * 2
+
+        self.assertEqual(estoque.fotografar(lote=2, agora=depois), 3)
+        self.assertEqual(FotoEstoque.objects.get(produto=produto).quantidade, 10)
+        # Sem movimentos novos a próxima rodada não faz nada
+        self.assertEqual(estoque.fotografar(agora=depois), 0)
+
+        produto.quantidade = 4
+        estoque.salvar(produto)
+        # O movimento novo ainda não entrou em foto nenhuma, mas conta no saldo
+        self.assertEqual(estoque.saldos([produto.id]), {produto.id: 4})
+        self.assertEqual(
+            estoque.fotografar(agora=timezone.now() + estoque.FOLGA_FOTO * 2), 1
+        )
+        self.assertEqual(FotoEstoque.objects.get(produto=produto).quantidade, 4)
+        self.assertEqual(estoque.saldos([produto.id]), {produto.id: 4})
+
+    def test_foto_espera_a_folga(self):
+        self.assertEqual(estoque.fotografar(agora=timezone.now()), 0)
+        self.assertFalse(FotoEstoque.objects.exists())
+
+    def test_conciliacao_acha_e_corrige_mudanca_por_fora(self):
+        # Alteração direta (admin, SQL à mão) não passa pelo livro
+        Produto.objects.filter(id=self.produtos[2].id).update(quantidade=7)
+
+        with self.assertNumQueries(2 * 2 + 1):
+            lotes = list(estoque.conciliar(lote=2))
+        self.assertEqual(lotes, [(2, []), (1, [(self.produtos[2].id, 7, 10)])])
+
+        saida = StringIO()
+        call_command("conciliar_estoque", "--corrigir", stdout=saida)
+        self.assertIn(
+            "Produto %d: estoque 7, livro 10 (-3)" % self.produtos[2].id,
+            saida.getvalue(),
+        )
+        self.assertIn("3 produtos conferidos", saida.getvalue())
+        self.assertEqual(
+            self.movimentos(self.produtos[2])[-1],
+            (MovimentoEstoque.Tipo.CORRECAO, -3),
+        )
+        self.assertEqual(sum(len(d) for _, d in estoque.conciliar()), 0)
+
+
+class ContadoresTest(TestCase):
+    """Visualizações e adições ao carrinho somadas em memória e gravadas em lote."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.vendedor, _, cls.produtos = _catalogo("Contador", 2)
+
+    def setUp(self):
+        # Buffer limpo: o das outras classes de teste tem ids que não valem aqui
+        buffer = mock.patch.object(contadores, "_buffer", None)
+        buffer.start()
+        self.addCleanup(buffer.stop)
+
+    def no_banco(self):
+        return dict(
+            (produto_id, (visualizacoes, adicoes))
+            for produto_id, visualizacoes, adicoes in ContadorProduto.objects.values_list(
+                "produto_id", "visualizacoes", "adicoes_carrinho"
+            )
+        )
+
+    def test_visualizacoes_somam_em_memoria_e_gravam_num_upsert(self):
+        primeiro, segundo = self.produtos
+        for _ in range(3):
+            self.client.get(reverse("pagina_produto", args=[primeiro.id]))
+        self.client.get(reverse("pagina_produto", args=[segundo.id]))
+
+        self.assertEqual(self.no_banco(), {})
+        self.assertEqual(contadores.contagens([primeiro.id])[primeiro.id], (3, 0))
+
+        # SELECT dos produtos que ainda existem e um INSERT ... ON CONFLICT
+        with self.assertNumQueries(2):
+            self.assertEqual(contadores.gravar(), 2)
+        self.client.get(reverse("pagina_produto", args=[primeiro.id]))
+        contadores.gravar()
+
+        self.assertEqual(self.no_banco(), {primeiro.id: (4, 0), segundo.id: (1, 0)})
+        with self.assertNumQueries(0):
+            self.assertEqual(contadores.gravar(), 0)
+
+    @override_settings(CONTADORES_MAX_EVENTOS=3)
+    def test_grava_ao_juntar_eventos_demais(self):
+        produto = self.produtos[0]
+        for _ in range(2):
+            self.client.get(reverse("pagina_produto", args=[produto.id]))
+        self.assertEqual(self.no_banco(), {})
+
+        self.client.get(reverse("pagina_produto", args=[produto.id]))
+
+        self.assertEqual(self.no_banco(), {produto.id: (3, 0)})
+
+    def test_adicoes_ao_carrinho(self):
+        produto = self.produtos[1]
+        self.client.post(
+            reverse("pagina_produto", args=[produto.id]), {"quantidade": 2}
+        )
+        self.client.post(
+            reverse("carrinho_api"),
+            json.dumps(
+                {
+                    "alteracoes": [
+                        {"produto": produto.id, "acao": "adicionar"},
+                        {"produto": produto.id, "acao": "remover"},
+                    ]
+                }
+            ),
+            content_type="application/json",
+        )
+        contadores.gravar()
+
+        self.assertEqual(self.no_banco(), {produto.id: (0, 2)})
+
+    def test_falha_do_banco_devolve_as_contagens_ao_buffer(self):
+        produto = self.produtos[0]
+        contadores.contar_visualizacao(produto.id)
+
+        with mock.patch.object(
+            contadores, "_sql_somar", side_effect=DatabaseError("database is locked")
+        ), self.assertLogs("Store.contadores", "ERROR") as logs:
+            self.assertEqual(contadores.gravar(), 0)
+        self.assertIn("database is locked", logs.output[0])
+        contadores.contar_visualizacao(produto.id)
+        contadores.gravar()
+
+        self.assertEqual(self.no_banco(), {produto.id: (2, 0)})
+
+    def test_erro_na_saida_vai_para_o_log(self):
+        with mock.patch.object(
+            contadores, "gravar", side_effect=RuntimeError("banco fechado")
+        ), self.assertLogs("Store.contadores", "ERROR") as logs:
+            contadores._gravar_ao_sair()
+        self.assertIn("banco fechado", logs.output[0])
+
+    def test_produto_apagado_fica_de_fora(self):
+        produto = Produto.objects.create(
+            nome="Apagado",
+            subcategoria=self.produtos[0].subcategoria,
+            vendedor=self.vendedor,
+        )
+        contadores.contar_visualizacao(produto.id)
+        contadores.contar_visualizacao(self.produtos[0].id)
+        produto.delete()
+
+        self.assertEqual(contadores.gravar(), 1)
+        self.assertEqual(self.no_banco(), {self.produtos[0].id: (1, 0)})
+
+
+class PopularidadeTest(TestCase):
+    """Rankings de mais vendidos e em alta pré-calculados."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.comprador = User.objects.create_user(username="comprador_popular")
+        cls.vendedor, _, cls.produtos = _catalogo("Ranking", 3)
+
+    def vender(self, produto, quantidade, dias_atras, status="approved"):
+        pedido = Order.objects.create(
+            vendedor=self.vendedor,
+            comprador=self.comprador,
+            valor_total_pedido=10,
+            status_pagamento=status,
+        )
+        Order.objects.filter(id=pedido.id).update(
+            data=timezone.now() - timedelta(days=dias_atras)
+        )
+        ItemOrder.objects.create(
+            order=pedido, produto=produto, quantidade=quantidade, preco=10
+        )
+
+    def test_vendas_nas_janelas_de_7_e_30_dias(self):
+        produto, so_no_mes = self.produtos[:2]
+        self.vender(produto, 2, dias_atras=3)
+        self.vender(produto, 5, dias_atras=20)
+        self.vender(produto, 9, dias_atras=40)
+        self.vender(produto, 4, dias_atras=1, status="pendente")
+        self.vender(so_no_mes, 3, dias_atras=10)
+
+        self.assertEqual(popularidade.atualizar(), 2)
+
+        self.assertEqual(
+            dict(
+                (produto_id, (semana, mes))
+                for produto_id, semana, mes in Popularidade.objects.values_list(
+                    "produto", "vendas_7d", "vendas_30d"
+                )
+            ),
+            # Produtos sem vendas nem visualizações não ganham linha
+            {produto.id: (2, 7), so_no_mes.id: (0, 3)},
+        )
+
+    def test_em_alta_decai_com_a_meia_vida(self):
+        produto = self.produtos[1]
+        contador = ContadorProduto.objects.create(produto=produto, visualizacoes=10)
+        agora = timezone.now()
+        popularidade.atualizar(agora=agora)
+        self.assertEqual(Popularidade.objects.get(produto=produto).em_alta, 10)
+
+        contador.visualizacoes = 14
+        contador.save()
+        meia_vida = timedelta(hours=settings.POPULARIDADE_MEIA_VIDA_HORAS)
+        popularidade.atualizar(agora=agora + meia_vida)
+        ranking = Popularidade.objects.get(produto=produto)
+        self.assertAlmostEqual(ranking.em_alta, 10 / 2 + 4)
+        self.assertEqual(ranking.visualizacoes_vistas, 14)
+
+        # Sem visualizações novas a pontuação cai até zerar e o produto sai
+        # das rodadas seguintes
+        popularidade.atualizar(agora=agora + meia_vida * 20)
+        self.assertEqual(Popularidade.objects.get(produto=produto).em_alta, 0)
+        self.assertEqual(popularidade.atualizar(agora=agora + meia_vida * 21), 0)
+
+    def test_home_e_categoria_ordenam_pelo_ranking(self):
+        primeiro, segundo, terceiro = self.produtos
+        agora = timezone.now()
+        Popularidade.objects.bulk_create(
+            [
+                Popularidade(
+                    produto=primeiro, vendas_30d=5, em_alta=1, atualizado_em=agora
+                ),
+                Popularidade(
+                    produto=segundo, vendas_30d=1, em_alta=50, atualizado_em=agora
+                ),
+            ]
+        )
+
+        resposta = self.client.get(reverse("home"))
+        self.assertEqual(resposta.context["ordem"], "mais_vendidos")
+        self.assertEqual(
+            list(resposta.context["produtos"])[:3], [primeiro, segundo, terceiro]
+        )
+
+        resposta = self.client.get(
+            reverse("categoria", args=["Ranking"]), {"ordem": "em_alta"}
+        )
+        self.assertEqual(
+            list(resposta.context["produtos"]), [segundo, primeiro, terceiro]
+        )
+
+        resposta = self.client.get(reverse("home"), {"ordem": "inexistente"})
+        self.assertEqual(resposta.context["ordem"], "mais_vendidos")
+
+    def test_comando_atualizar_popularidade(self):
+        self.vender(self.produtos[2], 1, dias_atras=1)
+        saida = StringIO()
+        call_command("atualizar_popularidade", stdout=saida)
+        self.assertIn("Popularidade de 1 produto(s) atualizada", saida.getvalue())
+
+
+class RecomendacoesTest(TestCase):
+    """'Comprados juntos' calculados dos pedidos aprovados."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.comprador = User.objects.create_user(username="comprador_recomendacao")
+        cls.vendedor, _, cls.produtos = _catalogo("Juntos", 4)
+
+    def pedido(self, *produtos, status="approved", dias_atras=1):
+        pedido = Order.objects.create(
+            vendedor=self.vendedor,
+            comprador=self.comprador,
+            valor_total_pedido=10,
+            status_pagamento=status,
+        )
+        Order.objects.filter(id=pedido.id).update(
+            data=timezone.now() - timedelta(days=dias_atras)
+        )
+        ItemOrder.objects.bulk_create(
+            ItemOrder(order=pedido, produto=produto, quantidade=1, preco=10)
+            for produto in produtos
+        )
+
+    def test_cosseno_da_co_ocorrencia(self):
+        juntos, pedidos = recomendacoes.co_ocorrencias(
+            [{1, 2, 3}, {1, 2}, {1, 2}, {3, 4}, {1}]
+        )
+
+        self.assertEqual(juntos[1], {2: 3, 3: 1})
+        self.assertEqual(pedidos[1], 4)
+        self.assertEqual(
+            recomendacoes.vizinhos(juntos, pedidos, k=5, minimo=2),
+            {1: [(2, 3 / math.sqrt(4 * 3))], 2: [(1, 3 / math.sqrt(3 * 4))]},
+        )
+        # k corta a lista: 1 aparece em mais pedidos que 2, então cai para trás
+        self.assertEqual(
+            [
+                outro
+                for outro, _ in recomendacoes.vizinhos(juntos, pedidos, k=2, minimo=1)[
+                    3
+                ]
+            ],
+            [4, 2],
+        )
+
+    def test_so_pedidos_aprovados_recentes_e_sem_atacado(self):
+        a, b, c, d = self.produtos
+        self.pedido(a, b)
+        self.pedido(a, c, status="pendente")
+        self.pedido(a, d, dias_atras=400)
+        with mock.patch.object(recomendacoes, "MAX_ITENS_POR_PEDIDO", 3):
+            self.pedido(a, b, c, d)
+            cestas = list(recomendacoes.cestas(timezone.now() - timedelta(days=180)))
+
+        self.assertEqual(cestas, [{a.id, b.id}])
+
+    def test_pagina_do_produto_mostra_os_comprados_juntos(self):
+        a, b, c, d = self.produtos
+        for _ in range(2):
+            self.pedido(a, b, c)
+        self.pedido(a, d)
+        Recomendacao.objects.create(
+            produto=d,
+            recomendado=a,
+            posicao=0,
+            pontuacao=1,
+            gerada_em=timezone.now() - timedelta(days=1),
+        )
+
+        self.assertEqual(recomendacoes.calcular(dias=30, k=5), (3, 6))
+
+        # d só tinha um pedido com a: a recomendação antiga foi apagada
+        self.assertFalse(Recomendacao.objects.filter(produto=d).exists())
+        Produto.objects.filter(id=c.id).update(quantidade=0)
+        resposta = self.client.get(reverse("pagina_produto", args=[a.id]))
+        # Sem estoque não aparece
+        self.assertEqual(resposta.context["recomendados"], [b])
+        self.assertContains(resposta, "Comprados juntos")
+
+    def test_comando_calcular_recomendacoes(self):
+        a, b = self.produtos[:2]
+        self.pedido(a, b)
+        saida = StringIO()
+        call_command("calcular_recomendacoes", "--minimo", "1", stdout=saida)
+        self.assertIn("Recomendações de 2 produto(s) (2 linhas)", saida.getvalue())
+
+
+class FacetasTest(TestCase):
+    """Filtros da home e das categorias com contagens pré-calculadas."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.ana = User.objects.create_user(username="ana", first_name="Ana")
+        cls.bruno = User.objects.create_user(username="bruno")
+        categoria = Categoria.objects.create(nome="Catálogo")
+        cls.livros = Subcategoria.objects.create(nome="Livros", categoria_pai=categoria)
+        discos = Subcategoria.objects.create(nome="Discos", categoria_pai=categoria)
+        _, _, (cls.barato, cls.medio) = _catalogo(
+            "Faceta",
+            2,
+            nome=lambda i: ("Barato", "Médio")[i],
+            preco=lambda i: decimal.Decimal(("20.00", "50.00")[i]),
+            vendedor=lambda i: (cls.ana, cls.bruno)[i],
+            subcategoria=cls.livros,
+        )
+        _, _, (cls.caro, cls.esgotado) = _catalogo(
+            "Faceta",
+            2,
+            nome=lambda i: ("Caro", "Esgotado")[i],
+            preco=lambda i: decimal.Decimal(("600.00", "30.00")[i]),
+            quantidade=lambda i: (5, 0)[i],
+            vendedor=cls.ana,
+            subcategoria=discos,
+        )
+        _, cls.fora, _ = _catalogo("Outros", 1, nome="Outro", vendedor=cls.bruno)
+
+    def test_atualizar_agrupa_e_contar_aplica_os_outros_filtros(self):
+        self.assertEqual(facetas.atualizar(), 5)
+        self.assertEqual(
+            FacetaProdutos.objects.get(
+                subcategoria=self.livros, vendedor=self.ana
+            ).vendedor_nome,
+            "Ana",
+        )
+
+        ids = [self.livros.id, Subcategoria.objects.get(nome="Discos").id]
+        contagens = facetas.contar(ids, facetas.filtros({}))
+        self.assertEqual(
+            contagens["vendedores"],
+            [(self.ana.id, "Ana", 2), (self.bruno.id, "bruno", 1)],
+        )
+        self.assertEqual(contagens["faixas"], [1, 1, 0, 0, 1])
+        self.assertEqual(contagens["estoque"], {True: 3, False: 1})
+
+        # Com um vendedor escolhido a lista de vendedores não muda, mas as
+        # faixas e o estoque contam só os produtos dele
+        contagens = facetas.contar(
+            ids, facetas.filtros({"vendedor": str(self.ana.id), "em_estoque": "0"})
+        )
+        self.assertEqual(
+            contagens["vendedores"],
+            [(self.ana.id, "Ana", 3), (self.bruno.id, "bruno", 1)],
+        )
+        self.assertEqual(contagens["faixas"], [2, 0, 0, 0, 1])
+        self.assertEqual(contagens["estoque"], {True: 2, False: 1})
+
+        # Parâmetros inválidos são ignorados
+        self.assertEqual(
+            facetas.filtros({"vendedor": "x", "faixa": "9"}),
+            {"vendedor": None, "faixa": None, "em_estoque": True},
+        )
+
+    def test_categoria_filtra_ordena_e_mostra_as_contagens(self):
+        facetas.atualizar()
+        url = reverse("categoria", args=["catálogo"])
+
+        resposta = self.client.get(url, {"ordem": "menor_preco"})
+        self.assertEqual(
+            list(resposta.context["produtos"]), [self.barato, self.medio, self.caro]
+        )
+        faixas = resposta.context["facetas"]["faixas"]
+        self.assertEqual([faixa["produtos"] for faixa in faixas], [1, 1, 0, 0, 1])
+        self.assertEqual(faixas[0]["url"], "?ordem=menor_preco&faixa=0")
+        self.assertContains(resposta, "Ana (2)")
+
+        resposta = self.client.get(url, {"faixa": "0", "em_estoque": "0"})
+        self.assertEqual(
+            set(resposta.context["produtos"]), {self.barato, self.esgotado}
+        )
+        self.assertContains(resposta, "Esgotado")
+        estoque = resposta.context["facetas"]["estoque"]
+        self.assertFalse(estoque["ativa"])
+        self.assertEqual(estoque["url"], "?faixa=0")
+
+        resposta = self.client.get(
+            url, {"vendedor": self.ana.id, "ordem": "maior_preco"}
+        )
+        self.assertEqual(list(resposta.context["produtos"]), [self.caro, self.barato])
+        vendedores = resposta.context["facetas"]["vendedores"]
+        self.assertTrue(vendedores[0]["ativa"])
+        # Clicar no vendedor escolhido tira o filtro
+        self.assertEqual(vendedores[0]["url"], "?ordem=maior_preco")
+
+        Produto.objects.filter(id=self.medio.id).update(
+            criado_em=timezone.now() + timedelta(minutes=1)
+        )
+        resposta = self.client.get(reverse("home"), {"ordem": "mais_recentes"})
+        self.assertEqual(list(resposta.context["produtos"])[0], self.medio)
+
+    def test_comando_atualizar_facetas(self):
+        saida = StringIO()
+        call_command("atualizar_facetas", stdout=saida)
+        self.assertIn("5 linha(s) de facetas gravada(s)", saida.getvalue())
+
+
+class AutocompletarTest(TestCase):
+    """Sugestões da busca servidas pelo índice de prefixos em memória."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.vendedor = User.objects.create_user(username="loja_do_joao")
+        cls.vendedor.perfil.vendedor = True
+        cls.vendedor.perfil.save()
+        cls.eletronicos = Categoria.objects.create(nome="Eletrônicos")
+        cls.cameras = Subcategoria.objects.create(
+            nome="Câmeras", categoria_pai=cls.eletronicos
+        )
+        cls.camiseta = cls.produto("Camiseta Azul")
+        cls.camera = cls.produto("Câmera Digital")
+
+    @classmethod
+    def produto(cls, nome):
+        _, _, (produto,) = _catalogo(
+            "Busca", 1, nome=nome, subcategoria=cls.cameras, vendedor=cls.vendedor
+        )
+        return produto
+
+    def setUp(self):
+        temporario = tempfile.TemporaryDirectory()
+        self.addCleanup(temporario.cleanup)
+        diretorio = self.settings(AUTOCOMPLETE_DIR=temporario.name)
+        diretorio.enable()
+        self.addCleanup(diretorio.disable)
+        indice = mock.patch.object(autocompletar, "_indice", None)
+        indice.start()
+        self.addCleanup(indice.stop)
+
+    def nomes(self, termo):
+        return [nome for _, _, nome in autocompletar.buscar(termo)]
+
+    def test_busca_por_prefixo_de_qualquer_palavra_sem_ir_ao_banco(self):
+        self.assertEqual(autocompletar.reconstruir(), 5)
+
+        with self.assertNumQueries(0):
+            resposta = self.client.get(reverse("autocomplete"), {"q": "CAM"})
+        self.assertEqual(
+            [(r["tipo"], r["nome"]) for r in resposta.json()["resultados"]],
+            [
+                ("produto", "Câmera Digital"),
+                ("subcategoria", "Câmeras"),
+                ("produto", "Camiseta Azul"),
+            ],
+        )
+        self.assertEqual(
+            resposta.json()["resultados"][0]["url"],
+            reverse("pagina_produto", args=[self.camera.id]),
+        )
+
+        self.assertEqual(self.nomes("azul"), ["Camiseta Azul"])
+        self.assertEqual(self.nomes("camiseta  az"), ["Camiseta Azul"])
+        self.assertEqual(self.nomes("eletro"), ["Eletrônicos"])
+        self.assertEqual(self.nomes("loja"), ["loja_do_joao"])
+        self.assertEqual(autocompletar.buscar("cam", limite=1)[0][2], "Câmera Digital")
+        self.assertEqual(self.nomes("  "), [])
+
+    def test_mudancas_chegam_aos_outros_workers_pelo_diario(self):
+        autocompletar.reconstruir()
+        outro_worker = copy.deepcopy(autocompletar._indice)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.camiseta.nome = "Regata Verde"
+            self.camiseta.save()
+            self.camera.delete()
+            self.produto("Caneca")
+        self.assertEqual(self.nomes("ca"), ["Câmeras", "Caneca"])
+
+        with mock.patch.object(autocompletar, "_indice", outro_worker):
+            self.assertEqual(self.nomes("ca"), ["Câmeras", "Caneca"])
+            self.assertEqual(self.nomes("verde"), ["Regata Verde"])
+
+    def test_diario_vira_foto_nova_sem_perder_os_workers_atrasados(self):
+        autocompletar.reconstruir()
+        atrasado = copy.deepcopy(autocompletar._indice)
+
+        with self.settings(AUTOCOMPLETE_COMPACTAR=2):
+            for nome in ("Caneta", "Caderno", "Cola"):
+                with self.captureOnCommitCallbacks(execute=True):
+                    self.produto(nome)
+        self.assertEqual(autocompletar._indice.geracao, 2)
+        self.assertEqual(autocompletar._ler_foto()["geracao"], 2)
+
+        with mock.patch.object(autocompletar, "_indice", atrasado):
+            self.assertIn("Cola", self.nomes("co"))
+            self.assertEqual(autocompletar._indice.geracao, 2)
+
+    def test_salvar_sem_mudar_o_nome_nao_escreve_no_diario(self):
+        autocompletar.reconstruir()
+        diario = autocompletar._diario(autocompletar._indice.geracao)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.camiseta.quantidade = 3
+            self.camiseta.save()
+            self.vendedor.save()  # salva o Profile junto, como no login
+        self.assertEqual(diario.stat().st_size, 0)
+
+    def test_falha_ao_publicar_vai_para_o_log_sem_desfazer_o_save(self):
+        with mock.patch.object(
+            autocompletar, "publicar", side_effect=OSError("disco cheio")
+        ), self.assertLogs("Store.signals", "ERROR") as logs:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.produto("Caneca")
+        self.assertIn("disco cheio", logs.output[0])
+        self.assertTrue(Produto.objects.filter(nome="Caneca").exists())
+
+    def test_primeira_busca_sem_foto_monta_o_indice(self):
+        self.assertEqual(self.nomes("camiseta"), ["Camiseta Azul"])
+        self.assertIsNotNone(autocompletar._ler_foto())
+
+    def test_comando_indexar_autocomplete(self):
+        saida = StringIO()
+        call_command("indexar_autocomplete", stdout=saida)
+        self.assertIn("Autocompletar: 5 item(ns) indexado(s)", saida.getvalue())
@@ -20,10 +20,13 @@ urlpatterns = [
         views.excluir_carrinho,
         name="excluir_carrinho",
     ),
+    path("carrinho/api/", views.carrinho_api, name="carrinho_api"),
     path("carrinho/pagamento/<int:vendedor_id>/", views.pagamento, name="pagamento"),
+    path("carrinho/pagamento/todos/", views.pagamento_todos, name="pagamento_todos"),
     path("carrinho/compra_realizada/", views.compra_success, name="compra_success"),
     path("carrinho/compra_falha/", views.compra_failure, name="compra_failure"),
     path("carrinho/compra_pendente/", views.compra_pending, name="compra_pending"),
     path("webhook/mercadopago/", views.mercadopago_webhook, name="mercadopago_webhook"),
     path("categoria/<str:nome_categoria>/", views.categoria, name="categoria"),
+    path("autocomplete", views.autocomplete, name="autocomplete"),
 ]
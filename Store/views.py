@@ -1,158 +1,520 @@
 from django.shortcuts import render, redirect
 from .models import Produto
-from .models import Produto, Categoria, Carrinho, ItemCarrinho, Order, ItemOrder
-from django.shortcuts import get_object_or_404
+from .models import (
+    Produto,
+    Categoria,
+    Carrinho,
+    ItemCarrinho,
+    Order,
+    ItemOrder,
+    Recomendacao,
+    Reserva,
+)
+from . import autocompletar, contadores, facetas, reservas
+from .carrinho_sql import excluir_item, somar_item, tirar_item
+from django.shortcuts import get_object_or_404, aget_object_or_404
 from django.contrib import messages
 from django.contrib.auth.models import User
 from django.contrib.auth.decorators import login_required
+from django.urls import reverse
 
 from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET, require_POST
 from django.http import JsonResponse
+from django.db import transaction
+from asgiref.sync import sync_to_async
+import asyncio
 import json
+import logging
 from collections import defaultdict
 
-from apimercadopago import realizar_pagamento
+from apimercadopago import realizar_pagamento_async, consultar_pagamento_async
 from dotenv import load_dotenv
 import os
-import mercadopago
 from decimal import Decimal
 
-from django.db.models import Q
+from django.db.models import DecimalField, F, Sum
+
+from Core import metricas
+from Core.replica import leitura_replica
+
+logger = logging.getLogger(__name__)
+
+# Ordenações da home e das categorias (?ordem=...); a primeira é a padrão.
+# Os rankings vêm pré-calculados da tabela Popularidade (Store/popularidade.py),
+# então ordenar é um LEFT JOIN e não uma soma dos ItemOrder.
+ORDENACOES = {
+    "mais_vendidos": (
+        "Mais vendidos",
+        [
+            F("popularidade__vendas_30d").desc(nulls_last=True),
+            F("popularidade__em_alta").desc(nulls_last=True),
+        ],
+    ),
+    "mais_vendidos_semana": (
+        "Mais vendidos da semana",
+        [
+            F("popularidade__vendas_7d").desc(nulls_last=True),
+            F("popularidade__vendas_30d").desc(nulls_last=True),
+        ],
+    ),
+    "em_alta": (
+        "Em alta",
+        [
+            F("popularidade__em_alta").desc(nulls_last=True),
+            F("popularidade__vendas_30d").desc(nulls_last=True),
+        ],
+    ),
+    # Pelos índices (subcategoria, preco) / (subcategoria, criado_em) do Produto
+    "menor_preco": ("Menor preço", [F("preco").asc()]),
+    "maior_preco": ("Maior preço", [F("preco").desc()]),
+    "mais_recentes": ("Mais recentes", [F("criado_em").desc()]),
+}
+# Vendedores listados no filtro (os com mais produtos)
+MAX_VENDEDORES_FACETA = 10
+
+
+def _url(request, **parametros):
+    """Query string da página atual trocando `parametros` (None remove)."""
+    query = request.GET.copy()
+    for nome, valor in parametros.items():
+        if valor is None:
+            query.pop(nome, None)
+        else:
+            query[nome] = valor
+    return f"?{query.urlencode()}"
+
+
+def _ordenar(request, produtos):
+    """Aplica a ?ordem= da requisição; devolve os produtos e o contexto."""
+    ordem = request.GET.get("ordem")
+    if ordem not in ORDENACOES:
+        ordem = next(iter(ORDENACOES))
+    produtos = produtos.order_by(*ORDENACOES[ordem][1], "id")
+    ordenacoes = [
+        {"rotulo": rotulo, "url": _url(request, ordem=chave), "ativa": chave == ordem}
+        for chave, (rotulo, _) in ORDENACOES.items()
+    ]
+    return produtos, {"ordem": ordem, "ordenacoes": ordenacoes}
+
+
+def _facetas(request, filtros, contagens):
+    """Opções de cada filtro com a contagem e o link que liga/desliga a opção."""
+
+    def opcao(rotulo, total, nome, valor, ativa):
+        return {
+            "rotulo": rotulo,
+            "produtos": total,
+            "url": _url(request, **{nome: None if ativa else valor}),
+            "ativa": ativa,
+        }
+
+    vendedores = [
+        opcao(nome, total, "vendedor", vendedor_id, vendedor_id == filtros["vendedor"])
+        for vendedor_id, nome, total in contagens["vendedores"]
+    ]
+    vendedores = [
+        vendedor
+        for posicao, vendedor in enumerate(vendedores)
+        if posicao < MAX_VENDEDORES_FACETA or vendedor["ativa"]
+    ]
+    faixas = [
+        opcao(rotulo, total, "faixa", indice, indice == filtros["faixa"])
+        for indice, ((rotulo, _, _), total) in enumerate(
+            zip(facetas.FAIXAS_PRECO, contagens["faixas"])
+        )
+    ]
+    estoque = contagens["estoque"]
+    return {
+        "vendedores": vendedores,
+        "faixas": faixas,
+        # Ligado por padrão: desligar é ?em_estoque=0
+        "estoque": {
+            "rotulo": "Só em estoque",
+            "produtos": estoque[True],
+            "url": _url(request, em_estoque=0 if filtros["em_estoque"] else None),
+            "ativa": filtros["em_estoque"],
+        },
+    }
 
 
-def home(request):
+def _catalogo(request, template, categorias, subcategoria_ids=None):
+    """Home e categorias: filtros, contagens das facetas e ordenação."""
+    filtros = facetas.filtros(request.GET)
     produtos = Produto.objects.all()
-    categorias = Categoria.objects.all()
+    if subcategoria_ids is not None:
+        produtos = produtos.filter(subcategoria_id__in=subcategoria_ids)
+    produtos, contexto = _ordenar(request, facetas.filtrar(produtos, filtros))
+    contagens = facetas.contar(subcategoria_ids, filtros)
 
     return render(
-        request, "home.html", {"produtos": produtos, "categorias": categorias}
+        request,
+        template,
+        {
+            "produtos": produtos,
+            "categorias": categorias,
+            "facetas": _facetas(request, filtros, contagens),
+            **contexto,
+        },
     )
 
 
+@leitura_replica
+def home(request):
+    categorias = Categoria.objects.prefetch_related("subcategorias")
+    return _catalogo(request, "home.html", categorias)
+
+
+@leitura_replica
 def produto(request, id_produto):
     produto = get_object_or_404(Produto, id=id_produto)
 
     if request.method == "GET":
-        return render(request, "produto.html", {"produto": produto})
+        # Só soma em memória; o banco recebe as contagens em lote
+        contadores.contar_visualizacao(produto.id)
+        return render(request, "produto.html", _contexto_produto(produto))
     elif request.method == "POST":
-        if request.user.is_authenticated:
-            quantidade = int(request.POST.get("quantidade", 1))
-            adicionar_carrinho(request, produto.id, quantidade)
-            return render(request, "produto.html", {"produto": produto})
-        else:
-            messages.error(request, ("Você deve estar logado para acessar o carrinho"))
-            return redirect("logar")
+        quantidade = int(request.POST.get("quantidade", 1))
+        adicionar_carrinho(request, produto.id, quantidade)
+        return render(request, "produto.html", _contexto_produto(produto))
+
+
+def _contexto_produto(produto):
+    # "Comprados juntos" pré-calculados (Store/recomendacoes.py): uma query
+    # pelo índice (produto, posicao), sem somar pedidos na requisição
+    recomendacoes = (
+        Recomendacao.objects.filter(produto=produto, recomendado__quantidade__gt=0)
+        .select_related("recomendado")
+        .order_by("posicao")
+    )
+    return {
+        "produto": produto,
+        # Unidades reservadas por checkouts em andamento não estão à venda
+        "disponivel": reservas.disponivel(produto),
+        "recomendados": [recomendacao.recomendado for recomendacao in recomendacoes],
+    }
 
 
+@leitura_replica
 def categoria(request, nome_categoria):
-    filtro_subcategoria = Q(subcategoria__nome__iexact=nome_categoria)
-    filtro_categoria_pai = Q(subcategoria__categoria_pai__nome__iexact=nome_categoria)
+    # O menu já carrega as categorias com as subcategorias; as que casam com
+    # o nome (a subcategoria ou a categoria pai) saem dele, sem JOIN em Produto
+    categorias = list(Categoria.objects.prefetch_related("subcategorias"))
+    nome = nome_categoria.lower()
+    subcategoria_ids = [
+        subcategoria.id
+        for categoria in categorias
+        for subcategoria in categoria.subcategorias.all()
+        if nome in (subcategoria.nome.lower(), categoria.nome.lower())
+    ]
+    return _catalogo(request, "home-category.html", categorias, subcategoria_ids)
+
+
+@require_GET
+def autocomplete(request):
+    # Sugestões do campo de busca vindas do índice em memória
+    # (Store/autocompletar.py); nenhuma query no banco
+    resultados = []
+    for tipo, id_, nome in autocompletar.buscar(request.GET.get("q", "")):
+        if tipo == autocompletar.PRODUTO:
+            url = reverse("pagina_produto", args=[id_])
+        elif tipo == autocompletar.VENDEDOR:
+            url = f"{reverse('home')}?vendedor={id_}"
+        else:
+            url = reverse("categoria", args=[nome])
+        resultados.append({"tipo": tipo, "id": id_, "nome": nome, "url": url})
+    return JsonResponse({"resultados": resultados})
 
-    produtos = Produto.objects.filter(
-        filtro_subcategoria | filtro_categoria_pai
-    ).distinct()
 
-    categorias = Categoria.objects.all()
+def _agrupar_por_vendedor(itens_do_carrinho):
+    itens_por_vendedor = defaultdict(lambda: {"itens": [], "subtotal": Decimal("0.00")})
+    for item in itens_do_carrinho:
+        vendedor = item.produto.vendedor
+        subtotal_item = item.subtotal()
 
-    return render(
-        request, "home-category.html", {"produtos": produtos, "categorias": categorias}
-    )
+        itens_por_vendedor[vendedor]["itens"].append(item)
+        itens_por_vendedor[vendedor]["subtotal"] += subtotal_item
+    return itens_por_vendedor
 
 
 def carrinho(request):
     if not request.user.is_authenticated:
-        messages.error(request, ("Você deve estar logado para acessar o carrinho"))
-        return redirect("logar")
-
-    try:
-        carrinho_usuario = request.user.carrinho
-        itens_do_carrinho = carrinho_usuario.itens.all()
-    except Carrinho.DoesNotExist:
-        itens_do_carrinho = []
+        # Carrinho do cookie: a página é a mesma, mas o pagamento pede login
+        itens_do_carrinho = request.carrinho_anonimo.itens_do_carrinho()
+    else:
+        try:
+            carrinho_usuario = request.user.carrinho
+            itens_do_carrinho = list(
+                carrinho_usuario.itens.select_related("produto__vendedor")
+            )
+        except Carrinho.DoesNotExist:
+            itens_do_carrinho = []
 
     if not itens_do_carrinho:
         return render(request, "carrinho.html", {"itens_por_vendedor": {}})
 
-    itens_por_vendedor = defaultdict(lambda: {"itens": [], "subtotal": Decimal("0.00")})
-    for item in itens_do_carrinho:
-        vendedor = item.produto.vendedor
-        subtotal_item = item.subtotal()
-
-        itens_por_vendedor[vendedor]["itens"].append(item)
-        itens_por_vendedor[vendedor]["subtotal"] += subtotal_item
+    itens_por_vendedor = _agrupar_por_vendedor(itens_do_carrinho)
 
     contexto = {
         "usuario": request.user,
         "itens_por_vendedor": dict(itens_por_vendedor),
-        "total_carrinho": carrinho_usuario.total(),
+        # Soma a partir dos itens já carregados (carrinho.total() buscaria de novo)
+        "total_carrinho": sum(info["subtotal"] for info in itens_por_vendedor.values()),
     }
 
     return render(request, "carrinho.html", contexto)
 
 
 def adicionar_carrinho(request, id_produto, quantidade):
-    produto = Produto.objects.get(id=id_produto)
-    carrinho, criou = Carrinho.objects.get_or_create(usuario=request.user)
-    item, criou = ItemCarrinho.objects.get_or_create(carrinho=carrinho, produto=produto)
-
-    if item.quantidade + quantidade <= produto.quantidade:
-        item.quantidade += quantidade
-        item.save()
-    else:
-        item.quantidade = produto.quantidade
-        item.save()
+    contadores.contar_adicao(id_produto)
+    if not request.user.is_authenticated:
+        # Sem login nada é gravado no banco: o item vai para o cookie
+        produto = Produto.objects.get(id=id_produto)
+        if not request.carrinho_anonimo.adicionar(produto, quantidade):
+            messages.error(
+                request, "Carrinho cheio. Entre na sua conta para adicionar mais itens."
+            )
+        return redirect("carrinho")
 
+    # Um INSERT ... ON CONFLICT cria ou soma a linha, limitada ao estoque
+    somar_item(request.user.id, id_produto, quantidade)
     return redirect("carrinho")
 
 
 def remover_carrinho(request, id_produto):
-    produto = Produto.objects.get(id=id_produto)
-
-    carrinho = Carrinho.objects.filter(usuario=request.user).first()
-    if not carrinho:
+    if not request.user.is_authenticated:
+        request.carrinho_anonimo.remover(id_produto)
         return redirect("carrinho")
 
-    item = ItemCarrinho.objects.filter(carrinho=carrinho, produto=produto).first()
-    if item:
-        if item.quantidade > 1:
-            item.quantidade -= 1
-            item.save()
-        else:
-            item.delete()
-
+    tirar_item(request.user.id, id_produto)
     return redirect("carrinho")
 
 
 def excluir_carrinho(request, id_produto):
-    produto = Produto.objects.get(id=id_produto)
-
-    carrinho = Carrinho.objects.filter(usuario=request.user).first()
+    if not request.user.is_authenticated:
+        request.carrinho_anonimo.excluir(id_produto)
+        return redirect("carrinho")
 
-    item = ItemCarrinho.objects.filter(carrinho=carrinho, produto=produto).first()
-    if item:
-        item.delete()
+    excluir_item(request.user.id, id_produto)
     return redirect("carrinho")
 
 
-def pagamento(request, vendedor_id):
-    vendedor = get_object_or_404(User, id=vendedor_id)
-    carrinho = get_object_or_404(Carrinho, usuario=request.user)
+# --- API JSON do carrinho ---
+#
+# POST /carrinho/api/ com {"alteracoes": [{"produto": 12, "acao": "adicionar",
+# "quantidade": 2}, ...]}. As ações são "adicionar" e "remover" (somam ou
+# tiram `quantidade`, padrão 1), "definir" (troca a quantidade; 0 tira o
+# item) e "excluir". Todas as linhas mudam numa transação, com as
+# quantidades limitadas ao estoque, e a resposta traz só as linhas
+# alteradas, o subtotal dos vendedores envolvidos e o total do carrinho:
+#
+#   {"itens": [{"produto": 12, "quantidade": 3, "subtotal": "36.00"}],
+#    "vendedores": [{"vendedor": 5, "subtotal": "80.00"}], "total": "120.00"}
+
+ACOES_CARRINHO = ("adicionar", "remover", "definir", "excluir")
+MAX_ALTERACOES = 50
+CENTAVO = Decimal("0.01")
+
+
+class _AlteracaoInvalida(Exception):
+    pass
+
+
+def _ler_alteracoes(corpo):
+    try:
+        alteracoes = json.loads(corpo)["alteracoes"]
+    except (ValueError, TypeError, KeyError):
+        raise _AlteracaoInvalida('Envie um JSON com a lista "alteracoes".')
+    if not isinstance(alteracoes, list) or not alteracoes:
+        raise _AlteracaoInvalida('"alteracoes" deve ser uma lista não vazia.')
+    if len(alteracoes) > MAX_ALTERACOES:
+        raise _AlteracaoInvalida(f"No máximo {MAX_ALTERACOES} alterações por vez.")
+
+    lidas = []
+    for alteracao in alteracoes:
+        try:
+            produto_id = int(alteracao["produto"])
+            acao = alteracao.get("acao", "adicionar")
+            quantidade = int(alteracao.get("quantidade", 1))
+        except (ValueError, TypeError, KeyError, AttributeError):
+            raise _AlteracaoInvalida("Cada alteração precisa de um produto válido.")
+        if acao not in ACOES_CARRINHO:
+            raise _AlteracaoInvalida(f'Ação "{acao}" desconhecida.')
+        if quantidade < 0:
+            raise _AlteracaoInvalida("A quantidade não pode ser negativa.")
+        lidas.append((produto_id, acao, quantidade))
+    return lidas
+
+
+def _nova_quantidade(atual, acao, quantidade, estoque):
+    if acao == "adicionar":
+        nova = atual + quantidade
+    elif acao == "remover":
+        nova = atual - quantidade
+    elif acao == "definir":
+        nova = quantidade
+    else:
+        nova = 0
+    return max(0, min(nova, estoque))
+
+
+def _alterar_carrinho_usuario(usuario, alteracoes, produtos):
+    """Aplica as alterações e devolve {produto_id: quantidade final}."""
+    with transaction.atomic():
+        carrinho, _ = Carrinho.objects.get_or_create(usuario=usuario)
+        existentes = {
+            item.produto_id: item
+            for item in carrinho.itens.select_for_update().filter(
+                produto_id__in=produtos
+            )
+        }
+
+        finais = {}
+        for produto_id, acao, quantidade in alteracoes:
+            atual = finais.get(produto_id)
+            if atual is None:
+                item = existentes.get(produto_id)
+                atual = item.quantidade if item else 0
+            finais[produto_id] = _nova_quantidade(
+                atual, acao, quantidade, produtos[produto_id].quantidade
+            )
+
+        gravar, apagar = [], []
+        for produto_id, quantidade in finais.items():
+            item = existentes.get(produto_id)
+            if quantidade == 0:
+                if item:
+                    apagar.append(item.id)
+            elif item is None or item.quantidade != quantidade:
+                gravar.append(
+                    ItemCarrinho(
+                        carrinho=carrinho, produto_id=produto_id, quantidade=quantidade
+                    )
+                )
+
+        if apagar:
+            ItemCarrinho.objects.filter(id__in=apagar).delete()
+        if gravar:
+            # Linhas novas e alteradas num INSERT ... ON CONFLICT só
+            ItemCarrinho.objects.bulk_create(
+                gravar,
+                update_conflicts=True,
+                unique_fields=["carrinho", "produto"],
+                update_fields=["quantidade", "atualizado_em"],
+            )
+
+        # Subtotal por vendedor somado no banco, numa query só
+        subtotais = {
+            # O SQLite devolve a soma sem as casas decimais
+            linha["produto__vendedor_id"]: linha["subtotal"].quantize(CENTAVO)
+            for linha in carrinho.itens.order_by()
+            .values("produto__vendedor_id")
+            .annotate(
+                subtotal=Sum(
+                    F("quantidade") * F("produto__preco"),
+                    output_field=DecimalField(max_digits=12, decimal_places=2),
+                )
+            )
+        }
+    return finais, subtotais
+
+
+def _alterar_carrinho_anonimo(carrinho_anonimo, alteracoes, produtos):
+    finais = {}
+    for produto_id, acao, quantidade in alteracoes:
+        atual = finais.get(produto_id, carrinho_anonimo.itens.get(produto_id, 0))
+        finais[produto_id] = _nova_quantidade(
+            atual, acao, quantidade, produtos[produto_id].quantidade
+        )
+    for produto_id, quantidade in finais.items():
+        if not carrinho_anonimo.definir(produto_id, quantidade):
+            raise _AlteracaoInvalida(
+                "Carrinho cheio. Entre na sua conta para adicionar mais itens."
+            )
+
+    subtotais = defaultdict(Decimal)
+    for produto_id, quantidade in carrinho_anonimo.itens.items():
+        produto = produtos.get(produto_id)
+        if produto:
+            subtotais[produto.vendedor_id] += produto.preco * quantidade
+    return finais, subtotais
 
-    # Pega o token de acesso do vendedor a partir do seu perfil
-    seller_token = vendedor.perfil.mp_access_token
 
-    # DEBUG: Para confirmar o valor e tipo do seller_token ANTES de ser usado
-    print(
-        f"--- DEBUG PAGAMENTO (Store/views.py - Seller Token Model): Para vendedor ID {vendedor_id} ({vendedor.username}), "
-        f"o valor de seller_token (vendedor.perfil.mp_access_token) é: '{seller_token}' ---"
+@require_POST
+def carrinho_api(request):
+    try:
+        alteracoes = _ler_alteracoes(request.body)
+    except _AlteracaoInvalida as erro:
+        return JsonResponse({"erro": str(erro)}, status=400)
+
+    ids = {produto_id for produto_id, _, _ in alteracoes}
+    anonimo = not request.user.is_authenticated
+    if anonimo:
+        # Os preços do resto do carrinho vêm na mesma query dos alterados
+        ids |= set(request.carrinho_anonimo.itens)
+    produtos = Produto.objects.only("preco", "quantidade", "vendedor_id").in_bulk(ids)
+    faltando = {produto_id for produto_id, _, _ in alteracoes} - set(produtos)
+    if faltando:
+        return JsonResponse(
+            {"erro": f"Produto {min(faltando)} não encontrado."}, status=404
+        )
+
+    try:
+        if anonimo:
+            finais, subtotais = _alterar_carrinho_anonimo(
+                request.carrinho_anonimo, alteracoes, produtos
+            )
+        else:
+            finais, subtotais = _alterar_carrinho_usuario(
+                request.user, alteracoes, produtos
+            )
+    except _AlteracaoInvalida as erro:
+        return JsonResponse({"erro": str(erro)}, status=400)
+
+    for produto_id, acao, _ in alteracoes:
+        if acao == "adicionar":
+            contadores.contar_adicao(produto_id)
+
+    vendedores = {produtos[produto_id].vendedor_id for produto_id in finais}
+    return JsonResponse(
+        {
+            "itens": [
+                {
+                    "produto": produto_id,
+                    "quantidade": quantidade,
+                    "subtotal": produtos[produto_id].preco * quantidade,
+                }
+                for produto_id, quantidade in finais.items()
+            ],
+            "vendedores": [
+                {
+                    "vendedor": vendedor_id,
+                    "subtotal": subtotais.get(vendedor_id, Decimal("0.00")),
+                }
+                for vendedor_id in sorted(vendedores)
+            ],
+            "total": sum(subtotais.values(), Decimal("0.00")),
+        }
     )
 
+
+async def pagamento(request, vendedor_id):
+    usuario = await request.auser()
+    vendedor = await aget_object_or_404(
+        User.objects.select_related("perfil"), id=vendedor_id
+    )
+    carrinho = await aget_object_or_404(Carrinho, usuario=usuario)
+
+    # Pega o token de acesso do vendedor a partir do seu perfil
+    seller_token = vendedor.perfil.mp_access_token
+
     # Verificação crucial: O vendedor tem um token válido?
     if not seller_token:
         messages.error(
             request,
             f"O vendedor '{vendedor.first_name}' não está configurado para receber pagamentos (token ausente).",
         )
+        metricas.incrementar("loja_checkout_total", resultado="falha")
         return redirect("carrinho")
 
     # Verificação se o vendedor conectou a conta (mp_connected)
@@ -161,51 +523,26 @@ def pagamento(request, vendedor_id):
             request,
             f"A conta Mercado Pago do vendedor '{vendedor.first_name}' não está corretamente conectada.",
         )
+        metricas.incrementar("loja_checkout_total", resultado="falha")
         return redirect("carrinho")
 
-    itens_para_pagar = carrinho.itens.filter(produto__vendedor=vendedor)
-
-    if not itens_para_pagar.exists():
-        messages.error(request, "Itens não encontrados no carrinho para este vendedor.")
+    # Cria o pedido e reserva o estoque dos itens numa transação
+    pedidos, erros = await _criar_pedidos_por_vendedor(usuario, vendedor.id)
+    if not pedidos:
+        for erro in erros or ["Itens não encontrados no carrinho para este vendedor."]:
+            messages.error(request, erro)
+        metricas.incrementar("loja_checkout_total", resultado="falha")
         return redirect("carrinho")
-
-    MARKETPLACE_FEE_PERCENTAGE = Decimal("0.10")
-    payment_items = []
-    subtotal_vendedor = Decimal("0.00")
-
-    order = Order.objects.create(vendedor=vendedor, comprador=request.user)
-
-    for item in itens_para_pagar:
-        preco_item = Decimal(
-            str(item.produto.preco)
-        )  # Boa prática converter para string antes de Decimal
-        subtotal_item = item.quantidade * preco_item
-        subtotal_vendedor += subtotal_item
-
-        ItemOrder.objects.create(
-            order=order,
-            produto=item.produto,
-            quantidade=item.quantidade,
-            preco=preco_item,
-        )
-        payment_items.append(
-            {
-                "id": str(item.produto.id),
-                "title": item.produto.nome,
-                "quantity": item.quantidade,
-                "currency_id": "BRL",
-                "unit_price": float(preco_item),
-            }
-        )
-
-    order.valor_total_pedido = subtotal_vendedor
-    order.save()
+    _, order, payment_items = pedidos[0]
+    subtotal_vendedor = order.valor_total_pedido
 
     comissao_total = round(subtotal_vendedor * MARKETPLACE_FEE_PERCENTAGE, 2)
     external_reference = str(order.id)  # Usar o ID da Order é uma boa referência
 
     try:
-        link_pagamento = realizar_pagamento(
+        # A chamada ao Mercado Pago é assíncrona: no modo ASGI o worker continua
+        # atendendo outras requisições enquanto espera a resposta.
+        link_pagamento = await realizar_pagamento_async(
             seller_token,  # Token do vendedor
             payment_items,
             external_reference,
@@ -213,48 +550,228 @@ def pagamento(request, vendedor_id):
         )
     except Exception as e:
         messages.error(request, f"Erro ao gerar link de pagamento: {e}")
-        print(
-            f"ERRO na view pagamento (Store/views.py - Seller Token Model) ao chamar realizar_pagamento: {e}"
+        logger.exception(
+            "Erro ao gerar o link de pagamento do pedido %s (vendedor %s)",
+            order.id,
+            vendedor.id,
         )
+        # Sem link o pedido não tem como ser pago: sai junto com a reserva
+        # (CASCADE), como no pagamento_todos, e os itens ficam no carrinho
+        await Order.objects.filter(id=order.id).adelete()
+        metricas.incrementar("loja_checkout_total", resultado="falha")
         return redirect("carrinho")
 
     # Remove os itens pagos do carrinho do vendedor específico
     # Esta é uma decisão de negócio se você quer limpar o carrinho inteiro ou apenas os itens pagos.
     # Se o carrinho é "por vendedor", então sim, delete os itens_para_pagar.
-    itens_para_pagar.delete()
+    await carrinho.itens.filter(produto__vendedor=vendedor).adelete()
 
+    metricas.incrementar("loja_checkout_total", resultado="sucesso")
     return redirect(link_pagamento)
 
 
+MARKETPLACE_FEE_PERCENTAGE = Decimal("0.10")
+
+
+@sync_to_async
+def _criar_pedidos_por_vendedor(usuario, vendedor_id=None):
+    """
+    Cria, numa única transação, um Order por vendedor com os itens do
+    carrinho do usuário (só os de `vendedor_id`, se informado) e reserva o
+    estoque desses itens. Vendedores sem conta Mercado Pago conectada, ou
+    com algum item sem estoque disponível, ficam de fora e voltam na lista
+    de erros.
+    """
+    itens = ItemCarrinho.objects.filter(carrinho__usuario=usuario).select_related(
+        "produto__vendedor__perfil"
+    )
+    if vendedor_id is not None:
+        itens = itens.filter(produto__vendedor_id=vendedor_id)
+
+    itens_por_vendedor = defaultdict(list)
+    for item in itens:
+        itens_por_vendedor[item.produto.vendedor].append(item)
+
+    pedidos = []
+    erros = []
+    itens_order = []
+    reservas_order = []
+    with transaction.atomic():
+        # Trava os produtos antes de conferir o disponível: outro checkout
+        # dos mesmos produtos espera esta transação terminar.
+        disponivel = reservas.travar_disponiveis(
+            [
+                item.produto_id
+                for itens_vendedor in itens_por_vendedor.values()
+                for item in itens_vendedor
+            ]
+        )
+        for vendedor, itens_vendedor in itens_por_vendedor.items():
+            nome = vendedor.first_name or vendedor.username
+            if not vendedor.perfil.mp_access_token or not vendedor.perfil.mp_connected:
+                erros.append(
+                    f"O vendedor '{nome}' não está configurado para receber pagamentos."
+                )
+                continue
+            try:
+                reservas.conferir(itens_vendedor, disponivel)
+            except reservas.EstoqueInsuficiente as erro:
+                erros.append(str(erro))
+                continue
+
+            subtotal_vendedor = sum(
+                (
+                    item.quantidade * Decimal(str(item.produto.preco))
+                    for item in itens_vendedor
+                ),
+                Decimal("0.00"),
+            )
+            # O id (UUID) é gerado aqui, então pedidos e itens podem ir em bulk_create
+            order = Order(
+                vendedor=vendedor,
+                comprador=usuario,
+                valor_total_pedido=subtotal_vendedor,
+            )
+            itens_order.extend(
+                ItemOrder(
+                    order=order,
+                    produto=item.produto,
+                    quantidade=item.quantidade,
+                    preco=Decimal(str(item.produto.preco)),
+                )
+                for item in itens_vendedor
+            )
+            reservas_order.extend(reservas.novas_reservas(order, itens_vendedor))
+            payment_items = [
+                {
+                    "id": str(item.produto.id),
+                    "title": item.produto.nome,
+                    "quantity": item.quantidade,
+                    "currency_id": "BRL",
+                    "unit_price": float(item.produto.preco),
+                }
+                for item in itens_vendedor
+            ]
+            pedidos.append((vendedor, order, payment_items))
+
+        Order.objects.bulk_create(order for _, order, _ in pedidos)
+        ItemOrder.objects.bulk_create(itens_order)
+        Reserva.objects.bulk_create(reservas_order)
+
+    return pedidos, erros
+
+
+async def pagamento_todos(request):
+    usuario = await request.auser()
+    if not usuario.is_authenticated:
+        messages.error(request, ("Você deve estar logado para acessar o carrinho"))
+        return redirect("logar")
+
+    pedidos, erros = await _criar_pedidos_por_vendedor(usuario)
+    for erro in erros:
+        messages.error(request, erro)
+        metricas.incrementar("loja_checkout_total", resultado="falha")
+
+    if not pedidos:
+        if not erros:
+            messages.error(request, "Seu carrinho está vazio.")
+        return redirect("carrinho")
+
+    # As preferências de todos os vendedores são criadas ao mesmo tempo: o
+    # tempo total fica próximo ao da chamada mais lenta, e não à soma delas.
+    resultados = await asyncio.gather(
+        *(
+            realizar_pagamento_async(
+                vendedor.perfil.mp_access_token,
+                payment_items,
+                str(order.id),
+                round(order.valor_total_pedido * MARKETPLACE_FEE_PERCENTAGE, 2),
+            )
+            for vendedor, order, payment_items in pedidos
+        ),
+        return_exceptions=True,
+    )
+
+    links = []
+    vendedores_pagos = []
+    pedidos_com_falha = []
+    for (vendedor, order, _), resultado in zip(pedidos, resultados):
+        nome = vendedor.first_name or vendedor.username
+        if isinstance(resultado, Exception):
+            logger.error(
+                "Erro ao gerar o link de pagamento do pedido %s (vendedor %s)",
+                order.id,
+                vendedor.id,
+                exc_info=resultado,
+            )
+            messages.error(
+                request, f"Erro ao gerar link de pagamento para '{nome}': {resultado}"
+            )
+            pedidos_com_falha.append(order.id)
+            metricas.incrementar("loja_checkout_total", resultado="falha")
+        else:
+            links.append({"vendedor": nome, "pedido": order, "link": resultado})
+            vendedores_pagos.append(vendedor.id)
+            metricas.incrementar("loja_checkout_total", resultado="sucesso")
+
+    # Pedidos sem link de pagamento não têm como ser pagos; os itens desses
+    # vendedores continuam no carrinho para uma nova tentativa.
+    if pedidos_com_falha:
+        await Order.objects.filter(id__in=pedidos_com_falha).adelete()
+    if vendedores_pagos:
+        await ItemCarrinho.objects.filter(
+            carrinho__usuario=usuario, produto__vendedor_id__in=vendedores_pagos
+        ).adelete()
+
+    if not links:
+        return redirect("carrinho")
+
+    # O base.html consulta request.user, que é carregado de forma síncrona
+    return await sync_to_async(render)(
+        request, "pagamento_todos.html", {"links": links}
+    )
+
+
+def _resposta_webhook(resultado, dados, status=200):
+    metricas.incrementar("loja_webhook_mercadopago_total", resultado=resultado)
+    return JsonResponse(dados, status=status)
+
+
 @csrf_exempt
-def mercadopago_webhook(request):
+async def mercadopago_webhook(request):
     if request.method != "POST":
-        return JsonResponse(
-            {"status": "error", "message": "Método não permitido"}, status=405
+        return _resposta_webhook(
+            "invalido", {"status": "error", "message": "Método não permitido"}, 405
         )
 
     data = json.loads(request.body)
 
     if data.get("type") != "payment":
-        return JsonResponse({"status": "ok", "message": "Não é um evento de pagamento"})
+        return _resposta_webhook(
+            "ignorado", {"status": "ok", "message": "Não é um evento de pagamento"}
+        )
 
     payment_id = data.get("data", {}).get("id")
     if not payment_id:
-        return JsonResponse(
-            {"status": "error", "message": "ID de pagamento não encontrado"}, status=400
+        return _resposta_webhook(
+            "invalido",
+            {"status": "error", "message": "ID de pagamento não encontrado"},
+            400,
         )
 
     try:
-        sdk = mercadopago.SDK(os.getenv("MP_ACCESS_TOKEN"))
-        payment_info = sdk.payment().get(payment_id)
+        payment_info = await consultar_pagamento_async(
+            payment_id, os.getenv("MP_ACCESS_TOKEN")
+        )
 
         if payment_info["status"] != 200:
-            return JsonResponse(
+            return _resposta_webhook(
+                "nao_encontrado",
                 {
                     "status": "error",
                     "message": "Pagamento não encontrado no Mercado Pago",
                 },
-                status=404,
+                404,
             )
 
         response_data = payment_info["response"]
@@ -262,53 +779,49 @@ def mercadopago_webhook(request):
         external_reference = response_data.get("external_reference")
 
         if not external_reference:
-            return JsonResponse(
+            return _resposta_webhook(
+                "invalido",
                 {"status": "error", "message": "Referência externa não encontrada"},
-                status=400,
+                400,
             )
 
-        pedido = Order.objects.get(id=external_reference)
+        pedido = await Order.objects.aget(id=external_reference)
 
+        resultado = "sem_alteracao"
         if payment_status == "approved" and pedido.status_pagamento != "approved":
-
-            pedido.status_pagamento = "approved"
-            pedido.save()
-
-            for item_pedido in pedido.itens.all():
-                produto = item_pedido.produto
-                if produto.quantidade >= item_pedido.quantidade:
-                    produto.quantidade -= item_pedido.quantidade
-                    produto.save()
-                else:
-                    print(
-                        f"Alerta: Estoque insuficiente para o produto {produto.id} no pedido {pedido.id}"
-                    )
-
-            carrinho_usuario = pedido.comprador.carrinho
-            ids_produtos_no_pedido = [item.produto.id for item in pedido.itens.all()]
-            ItemCarrinho.objects.filter(
-                carrinho=carrinho_usuario, produto_id__in=ids_produtos_no_pedido
-            ).delete()
+            # Aprova o pedido, baixa o estoque e converte as reservas numa
+            # transação; um webhook repetido ao mesmo tempo não baixa de novo.
+            ids_produtos_no_pedido = await sync_to_async(reservas.confirmar)(pedido.id)
+            if ids_produtos_no_pedido is not None:
+                resultado = "aprovado"
+                await ItemCarrinho.objects.filter(
+                    carrinho__usuario_id=pedido.comprador_id,
+                    produto_id__in=ids_produtos_no_pedido,
+                ).adelete()
 
         elif pedido.status_pagamento != payment_status:
+            resultado = "atualizado"
             pedido.status_pagamento = payment_status
-            pedido.save()
+            await pedido.asave()
+            if payment_status in reservas.STATUS_QUE_LIBERAM:
+                await sync_to_async(reservas.liberar)([pedido.id])
 
     except Order.DoesNotExist:
-        return JsonResponse(
+        return _resposta_webhook(
+            "nao_encontrado",
             {
                 "status": "error",
                 "message": f"Pedido com ID {external_reference} não encontrado",
             },
-            status=404,
+            404,
         )
-    except Exception as e:
-        print(f"Erro inesperado no webhook: {e}")
-        return JsonResponse(
-            {"status": "error", "message": "Erro interno do servidor"}, status=500
+    except Exception:
+        logger.exception("Erro inesperado no webhook do Mercado Pago")
+        return _resposta_webhook(
+            "erro", {"status": "error", "message": "Erro interno do servidor"}, 500
         )
 
-    return JsonResponse({"status": "ok"})
+    return _resposta_webhook(resultado, {"status": "ok"})
 
 
 def compra_success(request):
@@ -1,7 +1,7 @@
 # Usuario/tests.py
 
 import os
-from unittest.mock import patch, Mock
+from unittest.mock import patch, Mock, AsyncMock
 from django.test import TestCase, Client
 from django.urls import reverse
 from django.contrib.auth.models import User
@@ -9,8 +9,11 @@ from django.core.files.uploadedfile import (
     SimpleUploadedFile,
 )  # Necessário para mock de arquivos
 from django.conf import settings
+from django.core.files.storage import default_storage
 
 # Importando os modelos das suas apps
+from Core.orcamentos import OrcamentoTestCase, SENHA
+
 from .models import Profile
 from Store.models import (
     Solicitacao_Vendedor,
@@ -27,38 +30,39 @@ class UsuarioViewsTestCase(TestCase):
     Suite de testes para as views da aplicação Usuario.
     """
 
-    def setUp(self):
+    @classmethod
+    def setUpTestData(cls):
         """
-        Configuração inicial que é executada antes de cada teste.
+        Dados compartilhados pelos testes da classe, criados uma vez só
+        (setUpTestData); cada teste roda numa transação desfeita ao final.
         Cria usuários (normal e staff), perfis e dados básicos necessários.
         """
-        self.client = Client()
 
         # Cria um usuário comum para testes. O sinal deve criar o Profile automaticamente.
-        self.user = User.objects.create_user(
+        cls.user = User.objects.create_user(
             username="testuser", password="testpassword123", first_name="Test"
         )
 
         # Cria um usuário administrador (staff) para testar views restritas.
-        self.staff_user = User.objects.create_superuser(
+        cls.staff_user = User.objects.create_superuser(
             username="staffuser", password="staffpassword123", email="staff@test.com"
         )
 
         # Cria dados para a loja (Categoria e Subcategoria)
-        self.categoria = Categoria.objects.create(nome="Eletrônicos")
-        self.subcategoria = Subcategoria.objects.create(
-            nome="Smartphones", categoria_pai=self.categoria
+        cls.categoria = Categoria.objects.create(nome="Eletrônicos")
+        cls.subcategoria = Subcategoria.objects.create(
+            nome="Smartphones", categoria_pai=cls.categoria
         )
 
         # Define URLs comuns para reutilização
         # Certifique-se de que os 'names' nas suas URLs correspondem a estes.
-        self.cadastrar_url = reverse("cadastrar")
-        self.logar_url = reverse("logar")
-        self.deslogar_url = reverse("deslogar")
-        self.home_url = reverse("home")
-        self.perfil_url = reverse("perfil_user", args=[self.user.username])
-        self.solicitar_vendedor_url = reverse("solicitar_vendedor")
-        self.ver_solicitacao_url = reverse("ver_solicitacao")
+        cls.cadastrar_url = reverse("cadastrar")
+        cls.logar_url = reverse("logar")
+        cls.deslogar_url = reverse("deslogar")
+        cls.home_url = reverse("home")
+        cls.perfil_url = reverse("perfil_user", args=[cls.user.username])
+        cls.solicitar_vendedor_url = reverse("solicitar_vendedor")
+        cls.ver_solicitacao_url = reverse("ver_solicitacao")
 
     # --- Testes de Autenticação ---
 
@@ -336,7 +340,7 @@ class UsuarioViewsTestCase(TestCase):
         self.assertIn("client_id=TEST_APP_ID", response.url)
         self.assertIn(f"state={self.user.id}", response.url)
 
-    @patch("Usuario.views.requests.post")
+    @patch("Usuario.views.httpx.AsyncClient.post", new_callable=AsyncMock)
     @patch("Usuario.views.os.getenv")
     def test_mercado_pago_callback_success(self, mock_getenv, mock_post):
         """Testa o callback do Mercado Pago em um cenário de sucesso."""
@@ -376,35 +380,35 @@ class UsuarioViewsCoverageTests(TestCase):
     e lógicas condicionais que não foram executadas nos testes principais.
     """
 
-    def setUp(self):
-        self.client = Client()
-        self.user_a = User.objects.create_user(username="usera", password="passworda")
-        self.user_b = User.objects.create_user(username="userb", password="passwordb")
-        self.staff_user = User.objects.create_superuser(
+    @classmethod
+    def setUpTestData(cls):
+        cls.user_a = User.objects.create_user(username="usera", password="passworda")
+        cls.user_b = User.objects.create_user(username="userb", password="passwordb")
+        cls.staff_user = User.objects.create_superuser(
             "staff", "staff@test.com", "passwordstaff"
         )
 
-        self.user_b.perfil.vendedor = True
-        self.user_b.perfil.save()
+        cls.user_b.perfil.vendedor = True
+        cls.user_b.perfil.save()
 
-        self.categoria = Categoria.objects.create(nome="Roupas")
-        self.subcategoria = Subcategoria.objects.create(
-            nome="Camisetas", categoria_pai=self.categoria
+        cls.categoria = Categoria.objects.create(nome="Roupas")
+        cls.subcategoria = Subcategoria.objects.create(
+            nome="Camisetas", categoria_pai=cls.categoria
         )
 
         image_file = SimpleUploadedFile(
             "produto_b.jpg", b"content", content_type="image/jpeg"
         )
-        self.produto_b = Produto.objects.create(
-            vendedor=self.user_b,
+        cls.produto_b = Produto.objects.create(
+            vendedor=cls.user_b,
             nome="Produto do User B",
             preco=50.00,
-            subcategoria=self.subcategoria,
+            subcategoria=cls.subcategoria,
             quantidade=10,
             imagem=image_file,
         )
-        self.order = Order.objects.create(
-            vendedor=self.user_b, comprador=self.user_a, valor_total_pedido=50
+        cls.order = Order.objects.create(
+            vendedor=cls.user_b, comprador=cls.user_a, valor_total_pedido=50
         )
 
     def test_unauthorized_access_paths(self):
@@ -463,18 +467,19 @@ class UsuarioViewsCoverageTests(TestCase):
             "old_pic.jpg", SimpleUploadedFile("old_pic.jpg", b"old")
         )
         self.assertTrue("old_pic" in self.user_a.perfil.foto.name)
+        foto_antiga = self.user_a.perfil.foto.name
 
         new_image = SimpleUploadedFile(
             "new_pic.jpg", b"new_content", content_type="image/jpeg"
         )
         edit_url = reverse("editar_perfil", args=[self.user_a.username])
 
-        with patch("os.remove") as mock_remove:
-            self.client.post(edit_url, {"foto_perfil": new_image, "salvar": ""})
-            mock_remove.assert_called_once()
+        self.client.post(edit_url, {"foto_perfil": new_image, "salvar": ""})
 
+        self.assertFalse(default_storage.exists(foto_antiga))
         self.user_a.perfil.refresh_from_db()
         self.assertTrue("new_pic" in self.user_a.perfil.foto.name)
+        self.assertTrue(default_storage.exists(self.user_a.perfil.foto.name))
 
     def test_add_product_failure_paths(self):
         """
@@ -518,7 +523,9 @@ class UsuarioViewsCoverageTests(TestCase):
         response = self.client.get(callback_url_invalid_state)
         self.assertRedirects(response, reverse("home"))
 
-        with patch("Usuario.views.requests.post") as mock_post:
+        with patch(
+            "Usuario.views.httpx.AsyncClient.post", new_callable=AsyncMock
+        ) as mock_post:
             mock_response = MagicMock()
             mock_response.status_code = 400
             mock_response.json.return_value = {"message": "invalid_grant"}
@@ -534,3 +541,126 @@ class UsuarioViewsCoverageTests(TestCase):
             self.assertRedirects(
                 response, reverse("perfil_user", args=[self.user_a.username])
             )
+
+
+# Orçamentos medidos com o volume do OrcamentoTestCase (ver Store/tests.py)
+Q_CADASTRAR = 6
+Q_LOGAR = 11
+Q_DESLOGAR = 4
+Q_CONECTAR_MP = 2
+Q_SOLICITAR = 3
+Q_PERFIL = 2
+Q_EDITAR_PERFIL = 5
+Q_LISTA_PRODUTOS = 5
+Q_EDITAR_PRODUTO = 5
+Q_ADICIONAR_PRODUTO = 6
+# O CASCADE do produto apaga as linhas dele em cada tabela que aponta para
+# ele (carrinho, pedidos, reservas, livro do estoque, contadores, rankings,
+# recomendações)
+Q_EXCLUIR_PRODUTO = 12
+Q_VENDAS = 5
+Q_VENDAS_DETAILS = 6
+Q_VER_SOLICITACAO = 4
+Q_DECIDIR_SOLICITACAO = 6
+Q_MP_CALLBACK = 2
+MS_PAGINA = 500
+
+
+class UsuarioOrcamentoTest(OrcamentoTestCase):
+    """Limites de queries e de tempo das views do Usuario com volume realista."""
+
+    def test_cadastrar(self):
+        # Sem limite de tempo: o hash da senha domina
+        with self.assertOrcamento(Q_CADASTRAR):
+            self.client.post(
+                reverse("cadastrar"),
+                {"usuario": "novo", "nome": "Novo", "senha1": SENHA, "senha2": SENHA},
+            )
+
+    def test_logar(self):
+        with self.assertOrcamento(Q_LOGAR):
+            self.client.post(reverse("logar"), {"usuario": "comprador", "senha": SENHA})
+
+    def test_deslogar(self):
+        self.logar(self.comprador)
+        with self.assertOrcamento(Q_DESLOGAR):
+            self.client.get(reverse("deslogar"))
+
+    def test_conectar_mp(self):
+        self.logar(self.vendedor)
+        with self.assertOrcamento(Q_CONECTAR_MP):
+            self.client.get(reverse("conectar_mp"))
+
+    def test_solicitar_vendedor(self):
+        self.logar(self.comprador)
+        with self.assertOrcamento(Q_SOLICITAR, ms=MS_PAGINA):
+            self.client.get(reverse("solicitar_vendedor"))
+
+    def test_perfil_do_vendedor(self):
+        with self.assertOrcamento(Q_PERFIL, ms=MS_PAGINA):
+            response = self.client.get(reverse("perfil_user", args=["vendedor"]))
+        self.assertEqual(response.status_code, 200)
+
+    def test_editar_perfil(self):
+        self.logar(self.vendedor)
+        with self.assertOrcamento(Q_EDITAR_PERFIL, ms=MS_PAGINA):
+            self.client.get(reverse("editar_perfil", args=["vendedor"]))
+
+    def test_lista_produtos(self):
+        self.logar(self.vendedor)
+        with self.assertOrcamento(Q_LISTA_PRODUTOS, ms=MS_PAGINA):
+            self.client.get(reverse("lista_produtos", args=["vendedor"]))
+
+    def test_editar_produto(self):
+        self.logar(self.vendedor)
+        with self.assertOrcamento(Q_EDITAR_PRODUTO, ms=MS_PAGINA):
+            self.client.get(reverse("editar_produto", args=[self.produto.id]))
+
+    def test_adicionar_produto(self):
+        self.logar(self.vendedor)
+        with self.assertOrcamento(Q_ADICIONAR_PRODUTO, ms=MS_PAGINA):
+            response = self.client.get(reverse("adicionar_produto", args=["vendedor"]))
+        self.assertEqual(len(response.context["categorias"]), self.CATEGORIAS)
+
+    def test_excluir_produto(self):
+        self.logar(self.vendedor)
+        produto = self.produtos[-10]
+        with self.assertOrcamento(Q_EXCLUIR_PRODUTO):
+            self.client.post(reverse("excluir_produto", args=[produto.id]))
+
+    def test_vendas_com_20_pedidos(self):
+        self.logar(self.vendedor)
+        with self.assertOrcamento(Q_VENDAS, ms=MS_PAGINA):
+            response = self.client.get(reverse("vendas"))
+        self.assertEqual(len(response.context["orders"]), self.PEDIDOS)
+
+    def test_vendas_details(self):
+        self.logar(self.vendedor)
+        with self.assertOrcamento(Q_VENDAS_DETAILS, ms=MS_PAGINA):
+            self.client.get(reverse("vendas_details", args=[self.pedido.id]))
+
+    def test_ver_solicitacao(self):
+        self.logar(self.admin)
+        with self.assertOrcamento(Q_VER_SOLICITACAO, ms=MS_PAGINA):
+            response = self.client.get(reverse("ver_solicitacao"))
+        self.assertEqual(len(response.context["solicitacoes"]), self.SOLICITACOES)
+
+    def test_aceitar_e_recusar_solicitacao(self):
+        self.logar(self.admin)
+        for nome, username in (
+            ("aceitar_solicitacao", "solicitante_0"),
+            ("recusar_solicitacao", "solicitante_1"),
+        ):
+            with self.subTest(nome), self.assertOrcamento(Q_DECIDIR_SOLICITACAO):
+                self.client.get(reverse(nome, args=[username]))
+
+    @patch("Usuario.views.httpx.AsyncClient.post", new_callable=AsyncMock)
+    def test_mp_callback(self, mock_post):
+        mock_post.return_value = Mock(
+            status_code=200,
+            json=Mock(return_value={"access_token": "TOKEN", "user_id": "1"}),
+        )
+        with self.assertOrcamento(Q_MP_CALLBACK):
+            self.client.get(
+                reverse("mp_callback") + f"?code=abc&state={self.comprador.id}"
+            )
@@ -5,13 +5,24 @@ from django.contrib.auth.models import User
 from .models import Profile
 from Store.models import Categoria, Subcategoria
 from Store.models import Produto, Order, Solicitacao_Vendedor
-from django.core.files.storage import FileSystemStorage
+from Store import estoque
+from django.core.files.storage import default_storage
 import os
 from django.http import Http404
-import requests
+import httpx
 from django.urls import reverse
 from django.contrib.admin.views.decorators import staff_member_required
-from django.conf import settings
+
+from Core.instrumentacao import medir_mercado_pago
+from Core.replica import leitura_replica
+from apimercadopago import MP_API_BASE_URL, MP_TIMEOUT
+
+
+def _apagar_arquivo(nome):
+    # Pelo storage padrão (e não pelo caminho no disco) para funcionar com
+    # qualquer backend, inclusive o InMemoryStorage dos testes.
+    if nome and default_storage.exists(nome):
+        default_storage.delete(nome)
 
 
 def cadastrar(request):
@@ -94,14 +105,13 @@ def solicitar_vendedor(request):
 
 @staff_member_required
 def ver_solicitacao(request):
-    solicitacoes = Solicitacao_Vendedor.objects.all()
+    solicitacoes = Solicitacao_Vendedor.objects.select_related("usuario")
     return render(request, "ver_solicitacao.html", {"solicitacoes": solicitacoes})
 
 
 @staff_member_required
 def aceitar_solicitacao(request, username):
-    user = get_object_or_404(User, username=username)
-    user = User.objects.get(username=username)
+    user = get_object_or_404(User.objects.select_related("perfil"), username=username)
     user.perfil.vendedor = True
     user.perfil.save()
 
@@ -113,7 +123,7 @@ def aceitar_solicitacao(request, username):
 
 @staff_member_required
 def recusar_solicitacao(request, username):
-    user = User.objects.get(username=username)
+    user = User.objects.select_related("perfil").get(username=username)
     user.perfil.vendedor = False
     user.perfil.save()
 
@@ -123,7 +133,11 @@ def recusar_solicitacao(request, username):
 
 
 def perfil(request, username):
-    usuario = User.objects.get(username=username)
+    usuario = (
+        User.objects.select_related("perfil")
+        .prefetch_related("produtos")
+        .get(username=username)
+    )
 
     return render(request, "perfil_usuario.html", {"usuario": usuario})
 
@@ -155,14 +169,8 @@ def editar_perfil(request, username):
                 caminho_imagem_default = perfil._meta.get_field("foto").default
 
                 if perfil.foto and perfil.foto.name != caminho_imagem_default:
-                    if os.path.isfile(perfil.foto.path):
-                        os.remove(perfil.foto.path)
-                fs = FileSystemStorage(
-                    location="media/uploads/fotos_perfil/",
-                    base_url="/media/uploads/fotos_perfil/",
-                )
-                filename = fs.save(imagem.name, imagem)
-                usuario.perfil.foto = "uploads/fotos_perfil/" + filename
+                    _apagar_arquivo(perfil.foto.name)
+                perfil.foto.save(imagem.name, imagem, save=False)
 
             usuario.perfil.save()
 
@@ -172,8 +180,7 @@ def editar_perfil(request, username):
             caminho_imagem_default = perfil._meta.get_field("foto").default
 
             if perfil.foto and perfil.foto.name != caminho_imagem_default:
-                if os.path.isfile(perfil.foto.path):
-                    os.remove(perfil.foto.path)
+                _apagar_arquivo(perfil.foto.name)
 
             user = request.user
             user.delete()
@@ -182,7 +189,9 @@ def editar_perfil(request, username):
 
 
 def lista_produtos(request, username):
-    usuario = get_object_or_404(User, username=username)
+    usuario = get_object_or_404(
+        User.objects.select_related("perfil"), username=username
+    )
 
     if request.user.username == username:
         return render(
@@ -214,23 +223,12 @@ def editar_produto(request, id_produto):
         imagem = request.FILES.get("imagem")
 
         if imagem:
-            caminho_imagem_antiga = ""
-            if produto.imagem:
-                caminho_imagem_antiga = os.path.join(
-                    settings.MEDIA_ROOT, str(produto.imagem)
-                )
-
-            fs = FileSystemStorage(
-                location="media/uploads/produtos/", base_url="/media/uploads/produtos/"
-            )
-            filename = fs.save(imagem.name, imagem)
-
-            produto.imagem = "uploads/produtos/" + filename
+            imagem_antiga = produto.imagem.name
+            produto.imagem.save(imagem.name, imagem, save=False)
+            _apagar_arquivo(imagem_antiga)
 
-            if caminho_imagem_antiga and os.path.isfile(caminho_imagem_antiga):
-                os.remove(caminho_imagem_antiga)
-
-        produto.save()
+        # Salva e registra a mudança do estoque no livro (Store/estoque.py)
+        estoque.salvar(produto)
 
         return redirect("perfil_user", username=produto.vendedor.username)
 
@@ -270,13 +268,9 @@ def adicionar_produto(request, username):
 
         imagem = request.FILES.get("imagem")
         if imagem:
-            fs = FileSystemStorage(
-                location="media/uploads/produtos/", base_url="/media/uploads/produtos/"
-            )
-            filename = fs.save(imagem.name, imagem)
-            produto.imagem = "uploads/produtos/" + filename
+            produto.imagem.save(imagem.name, imagem, save=False)
 
-        produto.save()
+        estoque.salvar(produto)
 
         return redirect("perfil_user", username=request.user.username)
 
@@ -286,27 +280,28 @@ def excluir_produto(request, id_produto):
 
     if request.method == "POST":
 
-        if produto.imagem:
-            imagem_path = produto.imagem.path
-            if os.path.exists(imagem_path):
-                os.remove(imagem_path)
+        _apagar_arquivo(produto.imagem.name)
         produto.delete()
         return redirect("lista_produtos", username=request.user.username)
 
     return redirect("lista_produtos", username=request.user.username)
 
 
+@leitura_replica
 def vendas(request):
-    orders = request.user.order_seller.all()
+    orders = request.user.order_seller.select_related("comprador").prefetch_related(
+        "itens"
+    )
     return render(request, "vendas.html", {"orders": orders})
 
 
+@leitura_replica
 def vendas_details(request, order_id):
     order = get_object_or_404(Order, id=order_id)
     if order.vendedor != request.user:
         raise Http404
 
-    itemOrders = order.itens.all()
+    itemOrders = order.itens.select_related("produto")
     return render(request, "vendas_details.html", {"itemOrders": itemOrders})
 
 
@@ -331,12 +326,12 @@ def conectar_mercado_pago(request):
     return redirect(auth_url)
 
 
-def mercado_pago_callback(request):
+async def mercado_pago_callback(request):
     code = request.GET.get("code")
     user_id = request.GET.get("state")
 
     try:
-        user = User.objects.get(id=user_id)
+        user = await User.objects.select_related("perfil").aget(id=user_id)
     except (User.DoesNotExist, ValueError):
         messages.error(request, "Usuário inválido durante a autenticação.")
         return redirect("home")
@@ -347,7 +342,7 @@ def mercado_pago_callback(request):
         )
         return redirect("perfil_user", username=user.username)
 
-    token_url = "https://api.mercadopago.com/oauth/token"
+    token_url = f"{MP_API_BASE_URL}/oauth/token"
     payload = {
         "client_secret": os.getenv("MP_CLIENT_SECRET"),
         "client_id": os.getenv("MP_APP_ID"),
@@ -357,7 +352,9 @@ def mercado_pago_callback(request):
     }
     headers = {"Content-Type": "application/x-www-form-urlencoded"}
 
-    response = requests.post(token_url, data=payload, headers=headers)
+    async with httpx.AsyncClient(timeout=MP_TIMEOUT) as client:
+        with medir_mercado_pago():
+            response = await client.post(token_url, data=payload, headers=headers)
 
     if response.status_code == 200:
         data = response.json()
@@ -365,7 +362,7 @@ def mercado_pago_callback(request):
         user.perfil.mp_refresh_token = data.get("refresh_token")
         user.perfil.mp_user_id = data.get("user_id")
         user.perfil.mp_connected = True
-        user.perfil.save()
+        await user.perfil.asave()
         messages.success(request, "Sua conta Mercado Pago foi conectada com sucesso!")
         return redirect("perfil_user", username=user.username)
     else:
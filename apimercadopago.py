@@ -1,23 +1,25 @@
 # apimercadopago.py
+import asyncio
+import logging
+import weakref
 import mercadopago
+import httpx
 import os
 from dotenv import (
     load_dotenv,
 )  # Adicionado para garantir carregamento do .env, se usado localmente
 
+load_dotenv()
 
-def realizar_pagamento(
-    seller_access_token, items, external_reference, fee_amount
-):  # Nome do parâmetro da taxa alterado para clareza
-    load_dotenv()  # Carrega variáveis do .env se estiver testando localmente
+logger = logging.getLogger(__name__)
 
-    if not seller_access_token:
-        raise Exception("seller_access_token não fornecido para realizar_pagamento.")
+# Permite apontar as chamadas assíncronas para um stub local (benchmarks/testes)
+MP_API_BASE_URL = os.getenv("MP_API_BASE_URL", "https://api.mercadopago.com")
+MP_TIMEOUT = float(os.getenv("MP_TIMEOUT", "10"))
 
-    # IMPORTANTE: O SDK é iniciado com o token do VENDEDOR
-    sdk = mercadopago.SDK(seller_access_token)
 
-    preference_data = {
+def _dados_preferencia(items, external_reference, fee_amount):
+    return {
         "items": items,
         "back_urls": {
             "success": "https://unimarprojects.pythonanywhere.com/carrinho/compra_realizada/",
@@ -31,17 +33,11 @@ def realizar_pagamento(
         "marketplace_fee": float(fee_amount),
     }
 
-    # DEBUG: Para ver o que está sendo enviado
-    print(
-        "--- DEBUG API MP (Seller Token Model): Enviando Preference Data:",
-        preference_data,
-    )
-
-    preference_response = sdk.preference().create(preference_data)
 
+def _extrair_init_point(preference_response):
     if "response" not in preference_response:
-        print(
-            "--- DEBUG API MP (Seller Token Model): Erro Completo:", preference_response
+        logger.warning(
+            "Mercado Pago sem resposta da preferência: %s", preference_response
         )
         error_details = preference_response.get(
             "message", "Erro desconhecido ao criar preferência."
@@ -49,17 +45,99 @@ def realizar_pagamento(
         raise Exception(f"Erro ao criar link de pagamento: {error_details}")
 
     if "init_point" in preference_response["response"]:
-        print(
-            "--- DEBUG API MP (Seller Token Model): Sucesso, init_point:",
+        logger.debug(
+            "Mercado Pago criou a preferência: %s",
             preference_response["response"]["init_point"],
         )
         return preference_response["response"]["init_point"]
     else:
-        print(
-            "--- DEBUG API MP (Seller Token Model): Erro na Resposta:",
-            preference_response["response"],
+        logger.warning(
+            "Mercado Pago recusou a preferência: %s", preference_response["response"]
         )
         error_details = preference_response["response"].get(
             "message", "init_point não encontrado na resposta"
         )
         raise Exception(f"Erro ao criar link de pagamento: {error_details}")
+
+
+def realizar_pagamento(
+    seller_access_token, items, external_reference, fee_amount
+):  # Nome do parâmetro da taxa alterado para clareza
+    load_dotenv()  # Carrega variáveis do .env se estiver testando localmente
+
+    if not seller_access_token:
+        raise Exception("seller_access_token não fornecido para realizar_pagamento.")
+
+    # IMPORTANTE: O SDK é iniciado com o token do VENDEDOR
+    sdk = mercadopago.SDK(seller_access_token)
+
+    preference_data = _dados_preferencia(items, external_reference, fee_amount)
+
+    logger.debug("Enviando preferência ao Mercado Pago: %s", preference_data)
+
+    # Import aqui: o módulo continua utilizável fora do Django (scripts, testes)
+    from Core.instrumentacao import medir_mercado_pago
+
+    with medir_mercado_pago():
+        preference_response = sdk.preference().create(preference_data)
+
+    return _extrair_init_point(preference_response)
+
+
+# Versões assíncronas usadas pelas views async (modo ASGI). Falam direto com a
+# API REST via httpx para não ocupar uma thread enquanto o Mercado Pago responde,
+# e devolvem o mesmo formato {"status": ..., "response": ...} do SDK.
+#
+# Um cliente httpx por event loop, reaproveitado entre as requisições: as
+# conexões (e o handshake TLS) com o Mercado Pago ficam abertas no pool. No
+# ASGI cada worker tem um loop só; no WSGI o Django roda cada view async num
+# loop novo, e o cliente vai embora junto com ele.
+_clientes = weakref.WeakKeyDictionary()
+
+
+def _cliente():
+    loop = asyncio.get_running_loop()
+    cliente = _clientes.get(loop)
+    if cliente is None or cliente.is_closed:
+        cliente = _clientes[loop] = httpx.AsyncClient(
+            base_url=MP_API_BASE_URL, timeout=MP_TIMEOUT
+        )
+    return cliente
+
+
+async def _requisicao_mp(metodo, caminho, access_token, **kwargs):
+    from Core.instrumentacao import medir_mercado_pago
+
+    with medir_mercado_pago():
+        resposta = await _cliente().request(
+            metodo,
+            caminho,
+            headers={"Authorization": f"Bearer {access_token}"},
+            **kwargs,
+        )
+
+    try:
+        dados = resposta.json()
+    except ValueError:
+        dados = {}
+    return {"status": resposta.status_code, "response": dados}
+
+
+async def realizar_pagamento_async(
+    seller_access_token, items, external_reference, fee_amount
+):
+    if not seller_access_token:
+        raise Exception("seller_access_token não fornecido para realizar_pagamento.")
+
+    preference_data = _dados_preferencia(items, external_reference, fee_amount)
+    logger.debug("Enviando preferência ao Mercado Pago: %s", preference_data)
+
+    preference_response = await _requisicao_mp(
+        "POST", "/checkout/preferences", seller_access_token, json=preference_data
+    )
+
+    return _extrair_init_point(preference_response)
+
+
+async def consultar_pagamento_async(payment_id, access_token):
+    return await _requisicao_mp("GET", f"/v1/payments/{payment_id}", access_token)
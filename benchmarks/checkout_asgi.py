@@ -0,0 +1,166 @@
+# benchmarks/checkout_asgi.py
+#
+# Teste de carga do checkout: compara a vazão de /carrinho/pagamento/ entre
+# o modo WSGI (gunicorn com workers síncronos) e o modo ASGI (gunicorn com
+# workers do uvicorn), com o Mercado Pago substituído pelo stub local.
+#
+#   python -m benchmarks.checkout_asgi --compradores 90 --concorrencia 30
+#
+# Cada comprador tem um item no carrinho e faz um checkout; o resultado sai
+# em JSON com vazão e latências p50/p95/p99 de cada modo.
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from benchmarks.comum import BASE_DIR, MODOS, resumo_latencias, servidor
+from benchmarks.mp_stub import StubMercadoPago
+
+
+def preparar_banco(total_compradores):
+    import django
+
+    django.setup()
+
+    from django.contrib.auth.models import User
+    from django.core.management import call_command
+    from django.test import Client
+
+    from Store.models import Categoria, Subcategoria, Produto
+
+    call_command("migrate", verbosity=0)
+
+    vendedor = User.objects.create(username="vendedor_bench", first_name="Vendedor")
+    vendedor.perfil.vendedor = True
+    vendedor.perfil.mp_connected = True
+    vendedor.perfil.mp_access_token = "STUB-SELLER-TOKEN"
+    vendedor.perfil.save()
+
+    categoria = Categoria.objects.create(nome="Benchmark")
+    subcategoria = Subcategoria.objects.create(nome="Checkout", categoria_pai=categoria)
+    produto = Produto.objects.create(
+        nome="Produto Benchmark",
+        preco=10,
+        quantidade=1_000_000,
+        subcategoria=subcategoria,
+        vendedor=vendedor,
+        imagem="uploads/produtos/benchmark.jpg",
+    )
+
+    sessoes = []
+    for i in range(total_compradores):
+        comprador = User.objects.create(username=f"comprador_bench_{i}")
+        # Um Client por comprador: logar outro usuário no mesmo Client
+        # descarta a sessão anterior.
+        client = Client()
+        client.force_login(comprador)
+        sessoes.append((comprador.id, client.cookies["sessionid"].value))
+
+    return vendedor.id, produto.id, sessoes
+
+
+def preencher_carrinhos(produto_id, sessoes):
+    from Store.models import Carrinho, ItemCarrinho, Order
+
+    Order.objects.all().delete()
+    ItemCarrinho.objects.all().delete()
+    for usuario_id, _ in sessoes:
+        carrinho, _ = Carrinho.objects.get_or_create(usuario_id=usuario_id)
+        ItemCarrinho.objects.create(
+            carrinho=carrinho, produto_id=produto_id, quantidade=1
+        )
+
+
+def executar_modo(modo, vendedor_id, sessoes, concorrencia, workers, env):
+    def checkout(sessao):
+        inicio = time.perf_counter()
+        resposta = requests.get(
+            url, cookies={"sessionid": sessao}, allow_redirects=False, timeout=120
+        )
+        sucesso = resposta.status_code == 302 and "/checkout/" in resposta.headers.get(
+            "Location", ""
+        )
+        return time.perf_counter() - inicio, sucesso
+
+    with servidor(modo, workers, env) as base_url:
+        url = f"{base_url}/carrinho/pagamento/{vendedor_id}/"
+        inicio = time.perf_counter()
+        with ThreadPoolExecutor(concorrencia) as pool:
+            resultados = list(pool.map(checkout, [sessao for _, sessao in sessoes]))
+        duracao = time.perf_counter() - inicio
+
+    latencias = [latencia for latencia, _ in resultados]
+    return {
+        "modo": modo,
+        "requisicoes": len(resultados),
+        "sucesso": sum(1 for _, ok in resultados if ok),
+        "duracao_s": round(duracao, 3),
+        "vazao_rps": round(len(resultados) / duracao, 2),
+        "latencia_ms": resumo_latencias(latencias),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Compara a vazão do checkout entre WSGI e ASGI."
+    )
+    parser.add_argument("--compradores", type=int, default=90)
+    parser.add_argument("--concorrencia", type=int, default=30)
+    parser.add_argument("--workers", type=int, default=3)
+    parser.add_argument("--latencia-mp", type=float, default=0.2)
+    parser.add_argument("--modos", nargs="+", default=list(MODOS), choices=MODOS)
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as diretorio, StubMercadoPago(
+        latencia=args.latencia_mp
+    ) as stub:
+        os.environ.update(
+            {
+                "DJANGO_SETTINGS_MODULE": "Core.settings",
+                "DATABASE_URL": f"sqlite:///{diretorio}/benchmark.sqlite3",
+                "CACHE_URL": f"sqlite:///{diretorio}/cache.sqlite3",
+                "SQLITE_TUNED": "1",
+                "MP_API_BASE_URL": stub.url,
+                "MP_ACCESS_TOKEN": "STUB-MARKETPLACE-TOKEN",
+            }
+        )
+        sys.path.insert(0, str(BASE_DIR))
+
+        vendedor_id, produto_id, sessoes = preparar_banco(args.compradores)
+
+        resultados = []
+        for modo in args.modos:
+            preencher_carrinhos(produto_id, sessoes)
+            resultados.append(
+                executar_modo(
+                    modo,
+                    vendedor_id,
+                    sessoes,
+                    args.concorrencia,
+                    args.workers,
+                    dict(os.environ),
+                )
+            )
+
+    print(
+        json.dumps(
+            {
+                "compradores": args.compradores,
+                "concorrencia": args.concorrencia,
+                "workers": args.workers,
+                "latencia_mp_s": args.latencia_mp,
+                "resultados": resultados,
+            },
+            indent=2,
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+# benchmarks/comum.py
+#
+# Peças compartilhadas pelos benchmarks: subir o gunicorn numa porta livre,
+# esperar ele responder e resumir latências em percentis.
+
+import math
+import socket
+import subprocess
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+import requests
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+MODOS = {
+    "wsgi": ["Core.wsgi:application"],
+    "asgi": [
+        "Core.asgi:application",
+        "--worker-class",
+        "uvicorn_worker.UvicornWorker",
+    ],
+}
+
+
+def porta_livre():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def aguardar_servidor(url, timeout=30):
+    limite = time.monotonic() + timeout
+    while time.monotonic() < limite:
+        try:
+            requests.get(url, timeout=5)
+            return
+        except requests.RequestException:
+            time.sleep(0.1)
+    raise RuntimeError(f"Servidor não respondeu em {url}")
+
+
+@contextmanager
+def servidor(modo, workers, env):
+    """Sobe o gunicorn no modo pedido e devolve a URL base."""
+    porta = porta_livre()
+    base_url = f"http://127.0.0.1:{porta}"
+    processo = subprocess.Popen(
+        ["gunicorn", *MODOS[modo], "--bind", f"127.0.0.1:{porta}"]
+        + ["--workers", str(workers)],
+        cwd=BASE_DIR,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        aguardar_servidor(base_url + "/")
+        yield base_url
+    finally:
+        processo.terminate()
+        processo.wait()
+
+
+def percentil(valores, p):
+    ordenados = sorted(valores)
+    indice = max(0, math.ceil(p / 100 * len(ordenados)) - 1)
+    return ordenados[indice]
+
+
+def resumo_latencias(latencias):
+    return {
+        "p50": round(percentil(latencias, 50) * 1000, 1),
+        "p95": round(percentil(latencias, 95) * 1000, 1),
+        "p99": round(percentil(latencias, 99) * 1000, 1),
+    }
+
+
+def commit_atual():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=BASE_DIR,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
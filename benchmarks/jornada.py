@@ -0,0 +1,326 @@
+# benchmarks/jornada.py
+#
+# Teste de carga da jornada de compra completa, contra um banco populado e o
+# stub local do Mercado Pago:
+#
+#   home → categoria → produto → adicionar ao carrinho → carrinho
+#        → checkout → webhook aprovando o pagamento
+#
+#   python manage.py benchmark --compradores 60 --concorrencia 20
+#   python -m benchmarks.jornada --modos wsgi asgi --saida resultado.json
+#
+# Cada comprador faz a jornada uma vez, com produtos sorteados a partir de
+# --semente (duas execuções com os mesmos parâmetros fazem as mesmas
+# requisições). O resultado sai em JSON com a vazão e as latências
+# p50/p95/p99 de cada etapa, junto do commit medido, para comparar commits.
+
+import argparse
+import json
+import os
+import random
+import re
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import requests
+
+from benchmarks.comum import (
+    BASE_DIR,
+    MODOS,
+    commit_atual,
+    resumo_latencias,
+    servidor,
+)
+from benchmarks.mp_stub import StubMercadoPago
+
+ETAPAS = (
+    "home",
+    "categoria",
+    "produto",
+    "adicionar",
+    "carrinho",
+    "checkout",
+    "webhook",
+)
+
+_CHECKOUT = re.compile(r"/checkout/([0-9a-f-]+)$")
+
+
+def argumentos(parser):
+    parser.add_argument("--compradores", type=int, default=60)
+    parser.add_argument("--concorrencia", type=int, default=20)
+    parser.add_argument("--workers", type=int, default=3)
+    parser.add_argument("--modos", nargs="+", default=["asgi"], choices=MODOS)
+    parser.add_argument("--vendedores", type=int, default=20)
+    parser.add_argument("--categorias", type=int, default=10)
+    parser.add_argument("--produtos", type=int, default=2000)
+    parser.add_argument(
+        "--itens", type=int, default=2, help="Produtos colocados no carrinho."
+    )
+    parser.add_argument("--latencia-mp", type=float, default=0.2)
+    parser.add_argument("--semente", type=int, default=42)
+    parser.add_argument("--saida", help="Também grava o JSON neste arquivo.")
+
+
+def _padroes():
+    parser = argparse.ArgumentParser()
+    argumentos(parser)
+    return vars(parser.parse_args([]))
+
+
+def argv_de(opcoes):
+    """Converte as opções já lidas (ex: do manage.py) de volta em argv."""
+    argv = []
+    for nome in _padroes():
+        valor = opcoes.get(nome)
+        if valor is None:
+            continue
+        opcao = "--" + nome.replace("_", "-")
+        if isinstance(valor, (list, tuple)):
+            argv += [opcao, *map(str, valor)]
+        else:
+            argv += [opcao, str(valor)]
+    return argv
+
+
+def preparar_banco(args):
+    """
+    Popula o banco e devolve uma jornada por comprador: cookie de sessão,
+    categoria, produtos (todos do mesmo vendedor) e o vendedor do checkout.
+    """
+    import django
+
+    django.setup()
+
+    from django.conf import settings
+    from django.contrib.auth.models import User
+    from django.core.management import call_command
+    from django.test import Client
+
+    from Store.models import Categoria, Produto, Subcategoria
+    from Usuario.models import Profile
+
+    call_command("migrate", verbosity=0)
+    sorteio = random.Random(args.semente)
+
+    def criar_usuarios(prefixo, quantidade, **perfil):
+        usuarios = User.objects.bulk_create(
+            User(username=f"{prefixo}_{i}", first_name=f"{prefixo.title()} {i}")
+            for i in range(quantidade)
+        )
+        # bulk_create não dispara o post_save que cria o perfil
+        Profile.objects.bulk_create(Profile(usuario=u, **perfil) for u in usuarios)
+        return usuarios
+
+    vendedores = criar_usuarios(
+        "vendedor_bench",
+        args.vendedores,
+        vendedor=True,
+        mp_connected=True,
+        mp_access_token="STUB-SELLER-TOKEN",
+    )
+    categorias = Categoria.objects.bulk_create(
+        Categoria(nome=f"Categoria {i}") for i in range(args.categorias)
+    )
+    subcategorias = Subcategoria.objects.bulk_create(
+        Subcategoria(nome=f"Sub {i}-{j}", categoria_pai=categoria)
+        for i, categoria in enumerate(categorias)
+        for j in range(3)
+    )
+    produtos = Produto.objects.bulk_create(
+        (
+            Produto(
+                nome=f"Produto {i}",
+                preco=sorteio.randint(5, 500),
+                quantidade=1_000_000,
+                subcategoria=sorteio.choice(subcategorias),
+                vendedor=sorteio.choice(vendedores),
+                imagem=f"uploads/produtos/bench_{i}.jpg",
+            )
+            for i in range(args.produtos)
+        ),
+        batch_size=1000,
+    )
+
+    por_vendedor = {}
+    for produto in produtos:
+        por_vendedor.setdefault(produto.vendedor_id, []).append(produto)
+    nomes_categoria = {s.id: s.categoria_pai.nome for s in subcategorias}
+
+    jornadas = []
+    for comprador in criar_usuarios("comprador_bench", args.compradores):
+        vendedor_id = sorteio.choice(list(por_vendedor))
+        escolhidos = sorteio.sample(
+            por_vendedor[vendedor_id], min(args.itens, len(por_vendedor[vendedor_id]))
+        )
+        # Um Client por comprador: logar outro usuário no mesmo Client
+        # descarta a sessão anterior.
+        client = Client()
+        client.force_login(comprador)
+        jornadas.append(
+            {
+                "cookie": settings.SESSION_COOKIE_NAME,
+                "sessao": client.cookies[settings.SESSION_COOKIE_NAME].value,
+                "categoria": nomes_categoria[escolhidos[0].subcategoria_id],
+                "produtos": [produto.id for produto in escolhidos],
+                "vendedor": vendedor_id,
+            }
+        )
+    return jornadas
+
+
+class _EtapaFalhou(Exception):
+    pass
+
+
+def percorrer(base_url, jornada):
+    """
+    Faz a jornada de um comprador. Devolve [(etapa, segundos, ok)]; se uma
+    etapa falha, as seguintes não são feitas.
+    """
+    medidas = []
+    with requests.Session() as sessao:
+        sessao.cookies.set(jornada["cookie"], jornada["sessao"])
+
+        def etapa(nome, metodo, caminho, status, **kwargs):
+            inicio = time.perf_counter()
+            try:
+                resposta = sessao.request(
+                    metodo,
+                    base_url + caminho,
+                    allow_redirects=False,
+                    timeout=120,
+                    **kwargs,
+                )
+            except requests.RequestException:
+                resposta = None
+            ok = resposta is not None and resposta.status_code == status
+            medidas.append((nome, time.perf_counter() - inicio, ok))
+            if not ok:
+                raise _EtapaFalhou
+            return resposta
+
+        try:
+            etapa("home", "GET", "/", 200)
+            etapa("categoria", "GET", f"/categoria/{jornada['categoria']}/", 200)
+            for produto_id in jornada["produtos"]:
+                etapa("produto", "GET", f"/produto/{produto_id}", 200)
+                etapa("adicionar", "GET", f"/carrinho/adicionar/{produto_id}/1", 302)
+            etapa("carrinho", "GET", "/carrinho/", 200)
+
+            resposta = etapa(
+                "checkout", "GET", f"/carrinho/pagamento/{jornada['vendedor']}/", 302
+            )
+            # O stub usa o external_reference (id do pedido) no init_point e
+            # como id do pagamento, então o webhook aprova o pedido criado.
+            pedido = _CHECKOUT.search(resposta.headers.get("Location", ""))
+            if pedido is None:
+                medidas[-1] = ("checkout", medidas[-1][1], False)
+                raise _EtapaFalhou
+            etapa(
+                "webhook",
+                "POST",
+                "/webhook/mercadopago/",
+                200,
+                json={"type": "payment", "data": {"id": pedido.group(1)}},
+            )
+        except _EtapaFalhou:
+            pass
+    return medidas
+
+
+def resumir(medidas, duracao):
+    etapas = {}
+    for nome in ETAPAS:
+        latencias = [segundos for etapa, segundos, _ in medidas if etapa == nome]
+        if not latencias:
+            continue
+        etapas[nome] = {
+            "requisicoes": len(latencias),
+            "falhas": sum(1 for etapa, _, ok in medidas if etapa == nome and not ok),
+            "vazao_rps": round(len(latencias) / duracao, 2),
+            "latencia_ms": resumo_latencias(latencias),
+        }
+    return etapas
+
+
+def executar_modo(modo, jornadas, args, env):
+    with servidor(modo, args.workers, env) as base_url:
+        inicio = time.perf_counter()
+        with ThreadPoolExecutor(args.concorrencia) as pool:
+            resultados = list(pool.map(lambda j: percorrer(base_url, j), jornadas))
+        duracao = time.perf_counter() - inicio
+
+    medidas = [medida for resultado in resultados for medida in resultado]
+    completas = sum(
+        1 for resultado in resultados if resultado and resultado[-1][0] == "webhook"
+    )
+    return {
+        "modo": modo,
+        "jornadas": len(resultados),
+        "jornadas_completas": completas,
+        "duracao_s": round(duracao, 3),
+        "vazao_jornadas_s": round(len(resultados) / duracao, 2),
+        "requisicoes": len(medidas),
+        "vazao_rps": round(len(medidas) / duracao, 2),
+        "etapas": resumir(medidas, duracao),
+    }
+
+
+def limpar_pedidos_e_carrinhos():
+    from Store.models import ItemCarrinho, Order
+
+    Order.objects.all().delete()
+    ItemCarrinho.objects.all().delete()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Teste de carga da jornada de compra completa."
+    )
+    argumentos(parser)
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as diretorio, StubMercadoPago(
+        latencia=args.latencia_mp
+    ) as stub:
+        os.environ.update(
+            {
+                "DJANGO_SETTINGS_MODULE": "Core.settings",
+                "DATABASE_URL": f"sqlite:///{diretorio}/benchmark.sqlite3",
+                "CACHE_URL": f"sqlite:///{diretorio}/cache.sqlite3",
+                "METRICS_DIR": f"{diretorio}/metricas",
+                "SQLITE_TUNED": "1",
+                "MP_API_BASE_URL": stub.url,
+                "MP_ACCESS_TOKEN": "STUB-MARKETPLACE-TOKEN",
+            }
+        )
+        sys.path.insert(0, str(BASE_DIR))
+
+        jornadas = preparar_banco(args)
+
+        resultados = []
+        for modo in args.modos:
+            limpar_pedidos_e_carrinhos()
+            resultados.append(executar_modo(modo, jornadas, args, dict(os.environ)))
+
+    relatorio = json.dumps(
+        {
+            "commit": commit_atual(),
+            "parametros": {
+                nome: valor for nome, valor in vars(args).items() if nome != "saida"
+            },
+            "resultados": resultados,
+        },
+        indent=2,
+    )
+    print(relatorio)
+    if args.saida:
+        Path(args.saida).write_text(relatorio + "\n")
+
+
+if __name__ == "__main__":
+    main()
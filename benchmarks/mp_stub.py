@@ -0,0 +1,117 @@
+# benchmarks/mp_stub.py
+#
+# Stub local da API REST do Mercado Pago para testes de carga. Responde aos
+# mesmos caminhos usados por apimercadopago.py com uma latência configurável,
+# simulando a ida e volta até o Mercado Pago sem depender da rede.
+
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def _responder(self, status, dados):
+        corpo = json.dumps(dados).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(corpo)))
+        self.end_headers()
+        self.wfile.write(corpo)
+
+    def _ler_corpo(self):
+        tamanho = int(self.headers.get("Content-Length") or 0)
+        return self.rfile.read(tamanho) if tamanho else b""
+
+    def do_POST(self):
+        corpo = self._ler_corpo()
+        time.sleep(self.server.latencia)
+        self.server.registrar(self.path)
+
+        if self.path == "/checkout/preferences":
+            referencia = json.loads(corpo or b"{}").get("external_reference")
+            self._responder(
+                201,
+                {
+                    "id": f"pref-{referencia}",
+                    "init_point": f"{self.server.url}/checkout/{referencia}",
+                },
+            )
+        elif self.path == "/oauth/token":
+            self._responder(
+                200,
+                {
+                    "access_token": "STUB-ACCESS-TOKEN",
+                    "refresh_token": "STUB-REFRESH-TOKEN",
+                    "user_id": "stub-user",
+                },
+            )
+        else:
+            self._responder(404, {"message": "not_found"})
+
+    def do_GET(self):
+        time.sleep(self.server.latencia)
+        self.server.registrar(self.path)
+
+        if self.path.startswith("/v1/payments/"):
+            # No stub o id do pagamento é o próprio external_reference
+            referencia = self.path.rsplit("/", 1)[-1]
+            self._responder(
+                200,
+                {
+                    "id": referencia,
+                    "status": "approved",
+                    "external_reference": referencia,
+                },
+            )
+        else:
+            self._responder(404, {"message": "not_found"})
+
+    def log_message(self, format, *args):
+        pass
+
+
+class _Servidor(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, endereco, latencia):
+        super().__init__(endereco, _Handler)
+        self.latencia = latencia
+        self.url = f"http://{self.server_address[0]}:{self.server_address[1]}"
+        self.chamadas = 0
+        self._lock = threading.Lock()
+
+    def registrar(self, caminho):
+        with self._lock:
+            self.chamadas += 1
+
+
+class StubMercadoPago:
+    """
+    Uso:
+        with StubMercadoPago(latencia=0.2) as stub:
+            os.environ["MP_API_BASE_URL"] = stub.url
+    """
+
+    def __init__(self, latencia=0.2, host="127.0.0.1", porta=0):
+        self._servidor = _Servidor((host, porta), latencia)
+        self._thread = threading.Thread(target=self._servidor.serve_forever)
+        self._thread.daemon = True
+
+    @property
+    def url(self):
+        return self._servidor.url
+
+    @property
+    def chamadas(self):
+        return self._servidor.chamadas
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._servidor.shutdown()
+        self._servidor.server_close()
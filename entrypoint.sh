@@ -7,7 +7,58 @@ export PYTHONPATH="/app:$PYTHONPATH"
 echo "Applying database migrations..."
 python manage.py migrate --noinput || { echo "Database migrations failed!" && exit 1; }
 
+WORKERS="${GUNICORN_WORKERS:-3}"
+
+# As métricas de /metrics são somadas a partir de um arquivo por processo;
+# começa cada deploy com os contadores zerados, antes de qualquer processo
+# (inclusive as rodadas abaixo) gravar o seu.
+rm -rf "${METRICS_DIR:-.cache/metricas}"
+
+# Foto do índice do autocompletar a partir do banco; depois os workers só
+# aplicam as mudanças do diário (Store/autocompletar.py)
+python manage.py indexar_autocomplete || echo "Autocomplete index build failed; workers will build it on the first search."
+
+# Roda uma rodada periódica em segundo plano e a reinicia se ela sair (erro,
+# banco fora do ar): cada linha da saída vai para o log do contêiner com o
+# nome da rodada, e a saída com o status fica registrada.
+supervisionar() {
+    local nome="$1"
+    shift
+    (
+        while true; do
+            "$@" 2>&1 | sed -u "s/^/[$nome] /"
+            status=${PIPESTATUS[0]}
+            echo "[$nome] saiu com status $status; reiniciando em ${REINICIO_SEGUNDOS:-10}s" >&2
+            sleep "${REINICIO_SEGUNDOS:-10}"
+        done
+    ) &
+}
+
+# Limpeza periódica de pedidos pendentes abandonados, carrinhos parados e
+# reservas de estoque vencidas (Store/manutencao.py)
+supervisionar manutencao python manage.py manutencao --intervalo "${MANUTENCAO_INTERVALO:-60}"
+
+# Rankings de mais vendidos e em alta da home e das categorias
+# (Store/popularidade.py)
+supervisionar popularidade python manage.py atualizar_popularidade --intervalo "${POPULARIDADE_INTERVALO:-300}"
+
+# Contagens dos filtros (preço, vendedor, estoque) da home e das categorias
+# (Store/facetas.py)
+supervisionar facetas python manage.py atualizar_facetas --intervalo "${FACETAS_INTERVALO:-300}"
+
+# "Comprados juntos" da página do produto (Store/recomendacoes.py)
+supervisionar recomendacoes python manage.py calcular_recomendacoes --intervalo "${RECOMENDACOES_INTERVALO:-3600}"
+
+# SERVER_MODE=asgi roda o Core.asgi com workers do uvicorn: as views async
+# (pagamento, webhook e callback do Mercado Pago) não prendem o worker
+# enquanto esperam a resposta da API. O padrão continua sendo WSGI.
+if [ "$SERVER_MODE" = "asgi" ]; then
+    echo "Starting Gunicorn server (ASGI/uvicorn workers)..."
+    exec gunicorn Core.asgi:application --bind 0.0.0.0:8000 --workers "$WORKERS" \
+        --worker-class uvicorn_worker.UvicornWorker
+fi
+
 # Inicia o servidor Gunicorn
 echo "Starting Gunicorn server..."
 # A última parte do comando do Gunicorn deve ser 'Core.wsgi:application'
-exec gunicorn Core.wsgi:application --bind 0.0.0.0:8000 --workers 3
+exec gunicorn Core.wsgi:application --bind 0.0.0.0:8000 --workers "$WORKERS"
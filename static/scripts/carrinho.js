@@ -0,0 +1,81 @@
+// static/scripts/carrinho.js
+//
+// Os botões +, - e Excluir do carrinho chamam a API JSON (/carrinho/api/)
+// e atualizam só a linha, o subtotal do vendedor e o total, sem recarregar a
+// página. Sem JavaScript os links continuam funcionando como antes.
+
+(function () {
+    const carrinho = document.querySelector(".cart-main[data-api]");
+    if (!carrinho) {
+        return;
+    }
+
+    function atualizar(resposta) {
+        resposta.itens.forEach(function (item) {
+            const linha = carrinho.querySelector(`[data-produto="${item.produto}"]`);
+            if (!linha) {
+                return;
+            }
+            if (item.quantidade === 0) {
+                linha.remove();
+                return;
+            }
+            linha.querySelector(".js-quantidade").textContent = item.quantidade;
+            linha.querySelector(".js-subtotal").textContent = item.subtotal;
+        });
+
+        resposta.vendedores.forEach(function (vendedor) {
+            const secao = carrinho.querySelector(`[data-vendedor="${vendedor.vendedor}"]`);
+            if (!secao) {
+                return;
+            }
+            if (!secao.querySelector("[data-produto]")) {
+                secao.remove();
+                return;
+            }
+            secao.querySelector(".js-subtotal-vendedor").textContent = vendedor.subtotal;
+        });
+
+        const total = carrinho.querySelector(".js-total");
+        if (total) {
+            total.textContent = resposta.total;
+        }
+        if (!carrinho.querySelector("[data-produto]")) {
+            // Carrinho vazio: a página mostra a mensagem e o link para a loja
+            window.location.reload();
+        }
+    }
+
+    carrinho.addEventListener("click", function (evento) {
+        const botao = evento.target.closest("[data-acao]");
+        const linha = botao && botao.closest("[data-produto]");
+        if (!linha) {
+            return;
+        }
+        evento.preventDefault();
+
+        fetch(carrinho.dataset.api, {
+            method: "POST",
+            headers: {
+                "Content-Type": "application/json",
+                "X-CSRFToken": carrinho.dataset.csrf,
+            },
+            body: JSON.stringify({
+                alteracoes: [
+                    { produto: Number(linha.dataset.produto), acao: botao.dataset.acao },
+                ],
+            }),
+        })
+            .then(function (resposta) {
+                if (!resposta.ok) {
+                    throw new Error(resposta.status);
+                }
+                return resposta.json();
+            })
+            .then(atualizar)
+            .catch(function () {
+                // Se a API falhar, segue o link normal
+                window.location.href = botao.href;
+            });
+    });
+})();
@@ -1,6 +1,24 @@
+import os
 import unittest
-from unittest.mock import patch, MagicMock
-from apimercadopago import realizar_pagamento
+from unittest.mock import patch, MagicMock, AsyncMock
+
+import django
+import httpx
+from django.conf import settings
+from django.test import SimpleTestCase
+
+# Rodando só este arquivo (python -m unittest test_apimercadopago) o Django
+# ainda não foi configurado; o SimpleTestCase precisa das settings.
+if not settings.configured:
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "Core.settings_test")
+    django.setup()
+
+import apimercadopago
+from apimercadopago import (
+    realizar_pagamento,
+    realizar_pagamento_async,
+    consultar_pagamento_async,
+)
 
 
 class TestMercadoPago(unittest.TestCase):
@@ -102,3 +120,83 @@ class TestMercadoPago(unittest.TestCase):
             str(context.exception),
             "seller_access_token não fornecido para realizar_pagamento.",
         )
+
+
+# SimpleTestCase roda os testes async e, ao contrário do
+# IsolatedAsyncioTestCase, funciona com "manage.py test --parallel".
+class TestMercadoPagoAsync(SimpleTestCase):
+
+    @patch("apimercadopago.httpx.AsyncClient.request", new_callable=AsyncMock)
+    async def test_realizar_pagamento_async_sucesso(self, mock_request):
+        """
+        Testa se a versão assíncrona envia a preferência com o token do vendedor
+        e devolve o 'init_point'.
+        """
+        mock_request.return_value = httpx.Response(
+            201, json={"init_point": "https://www.mercadopago.com.br/pagar"}
+        )
+
+        init_point = await realizar_pagamento_async("TEST-TOKEN", [], "REF-ASYNC", 10.0)
+
+        self.assertEqual(init_point, "https://www.mercadopago.com.br/pagar")
+        metodo, caminho = mock_request.call_args.args
+        self.assertEqual((metodo, caminho), ("POST", "/checkout/preferences"))
+        kwargs = mock_request.call_args.kwargs
+        self.assertEqual(kwargs["headers"], {"Authorization": "Bearer TEST-TOKEN"})
+        self.assertEqual(kwargs["json"]["external_reference"], "REF-ASYNC")
+        self.assertEqual(kwargs["json"]["marketplace_fee"], 10.0)
+
+    @patch("apimercadopago.httpx.AsyncClient.request", new_callable=AsyncMock)
+    async def test_realizar_pagamento_async_falha_api(self, mock_request):
+        mock_request.return_value = httpx.Response(
+            401, json={"message": "Invalid seller access token"}
+        )
+
+        with self.assertRaises(Exception) as context:
+            await realizar_pagamento_async("TOKEN-INVALIDO", [], "REF-FALHA", 5.0)
+
+        self.assertEqual(
+            str(context.exception),
+            "Erro ao criar link de pagamento: Invalid seller access token",
+        )
+
+    async def test_realizar_pagamento_async_sem_token(self):
+        with self.assertRaises(Exception) as context:
+            await realizar_pagamento_async(None, [], "REF-SEM-TOKEN", 0)
+
+        self.assertEqual(
+            str(context.exception),
+            "seller_access_token não fornecido para realizar_pagamento.",
+        )
+
+    @patch("apimercadopago.httpx.AsyncClient.request", new_callable=AsyncMock)
+    async def test_consultar_pagamento_async(self, mock_request):
+        mock_request.return_value = httpx.Response(
+            200, json={"status": "approved", "external_reference": "REF-1"}
+        )
+
+        payment_info = await consultar_pagamento_async("123", "TOKEN")
+
+        self.assertEqual(
+            payment_info,
+            {
+                "status": 200,
+                "response": {"status": "approved", "external_reference": "REF-1"},
+            },
+        )
+        self.assertEqual(mock_request.call_args.args, ("GET", "/v1/payments/123"))
+
+    # autospec: o mock recebe o self, isto é, o cliente usado em cada chamada
+    @patch("apimercadopago.httpx.AsyncClient.request", autospec=True)
+    async def test_chamadas_reaproveitam_o_cliente_do_loop(self, mock_request):
+        mock_request.return_value = httpx.Response(200, json={})
+
+        await consultar_pagamento_async("1", "TOKEN")
+        await consultar_pagamento_async("2", "TOKEN")
+
+        clientes = {id(chamada.args[0]) for chamada in mock_request.call_args_list}
+        self.assertEqual(len(clientes), 1)
+        self.assertIs(mock_request.call_args.args[0], apimercadopago._cliente())
+
+        await apimercadopago._cliente().aclose()
+        self.assertIsNot(apimercadopago._cliente(), mock_request.call_args.args[0])